@@ -14,6 +14,8 @@ Endpoints:
            able to redirect to /saved-graphs
     /saved-graphs
         -- Not implemented
+    /graph/<name>.png
+        -- A graph rendered by the calculator, which never changes
 
 Cookies:
     height -- The height of the graph in pixels
@@ -30,6 +32,8 @@ Functions:
         -- For '/calculator' endpoint
     saved_graphs() -> None
         -- Not implemented
+    graph(name: str) -> None
+        -- For '/graph/<name>.png' endpoint
 
 Global variables:
     app: flask.Flask
@@ -40,6 +44,10 @@ Global variables:
         -- The range of x-values on the graph
     Y_range: tuple[int, int]
         -- The range of y-values on the graph
+    t_range: tuple[int, int]
+        -- The range of t-values parametric curves are plotted over
+    IMAGE_MAX_AGE: int
+        -- How long in seconds browsers may keep graphs
 """
 
 # Import flask for the server
@@ -47,6 +55,7 @@ import flask
 
 # Import the local module 'evaluator' for evaluating the graphing statement
 import evaluator
+import evaluator.graphical_processor
 
 import client_cloud_storage
 
@@ -63,9 +72,14 @@ PORT = 5000
 # The range of X and Y values on the graph
 x_range = (-5, 5)
 y_range = (-5, 5)
+# The range of t values parametric curves are plotted over
+t_range = evaluator.graphical_processor.PARAMETRIC_RANGE
 
 MIN_PASSWORD_LENGTH = 3
 
+# Graphs are named by what they show, so browsers may keep them for a year
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
 
 @app.route('/')
 def root():
@@ -188,6 +202,8 @@ def calculator(filepath=""):
     maxx = x_range[1]
     miny = y_range[0]
     maxy = y_range[1]
+    mint = t_range[0]
+    maxt = t_range[1]
 
     calculator_path = filepath
     if filepath:
@@ -218,7 +234,9 @@ def calculator(filepath=""):
                 minx=minx,
                 maxx=maxx,
                 miny=miny,
-                maxy=maxy)
+                maxy=maxy,
+                mint=mint,
+                maxt=maxt)
 
         if filepath == "":
             filepath = cloud_storage.create_file(filename, description)
@@ -244,6 +262,8 @@ def calculator(filepath=""):
         maxx = flask.request.form['max-x']
         miny = flask.request.form['min-y']
         maxy = flask.request.form['max-y']
+        mint = flask.request.form['min-t']
+        maxt = flask.request.form['max-t']
 
         # Get the height and width of the graph in pixels.
         # If they are not valid integers Default to a height of 0 and a width
@@ -266,15 +286,24 @@ def calculator(filepath=""):
             miny = y_range[0]
             maxy = y_range[1]
 
+        # The t range is separate, so a bad t range does not reset the others
+        try:
+            mint = float(mint)
+            maxt = float(maxt)
+        except ValueError:
+            mint = t_range[0]
+            maxt = t_range[1]
+
         # If, somehow, the height and width are negative, make them positive
         if height < 0:
             height = 0
         if width < 0:
             width = 0
 
-        # Evaluate these and get the path of the file where they are stored
-        path, error_message = evaluator.evaluate(raw_text, width, height,
-                                                 (minx, maxx), (miny, maxy))
+        # Evaluate these and get the location the graph is served from
+        path, error_message = evaluator.render(raw_text, width, height,
+                                               (minx, maxx), (miny, maxy),
+                                               (mint, maxt))
 
     # Finally render the 'calculator.html' template substituting in raw_text
     # for the raw text on the form and path for the imate location
@@ -289,7 +318,9 @@ def calculator(filepath=""):
         minx=minx,
         maxx=maxx,
         miny=miny,
-        maxy=maxy)
+        maxy=maxy,
+        mint=mint,
+        maxt=maxt)
 
 
 # Not implemented
@@ -304,6 +335,33 @@ def saved_graphs():
         return flask.redirect('/login')
 
 
+@app.route(f'/{evaluator.IMAGE_ROUTE}/<name>.png')
+def graph(name):
+    """The function that serves a graph rendered by the calculator
+
+    The name of a graph is a hash of what it shows, so it is its own strong
+    ETag and browsers can keep it without asking again.
+
+    Arguments:
+        name: str
+            -- The name of the graph
+
+    Returns:
+        response: flask.Response
+            -- The PNG, or that the browser's copy is still valid
+    """
+    image = evaluator.get_image(name)
+    if image is None:
+        flask.abort(404)
+    response = flask.Response(image, mimetype='image/png')
+    response.set_etag(name)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    # A browser that already has the graph is told its copy is still valid
+    return response.make_conditional(flask.request)
+
+
 # If running the file directly, host the flask server locally on the default
 # port. It is currently in debug mode as that allows for easy debugging.
 if __name__ == '__main__':
@@ -0,0 +1,1324 @@
+"""Benchmarks for the evaluator.
+
+It is not used by the app, but can be run to check how changes to the
+evaluator affect its speed.
+
+Usage:
+    python benchmark.py [name ...]
+        -- Runs the named benchmarks, or every benchmark if none are given
+
+Functions:
+    generate_script(lines: int) -> str
+        -- Generates a script with the given number of lines
+    time_call(function: Callable, repeats: int) -> float
+        -- Gets the best time taken to call function out of some repeats
+    tokenise() -> None
+        -- Times tokenising and parsing large generated scripts
+    vectorise() -> None
+        -- Compares the vector engine with evaluating point by point
+    scalar() -> None
+        -- Times compiling trees and evaluating them point by point
+    threads() -> None
+        -- Checks shared trees give the same results from many threads
+    memory() -> None
+        -- Measures the memory used by parsed trees
+    fold() -> None
+        -- Times scripts with constant and repeated subexpressions
+    integrate() -> None
+        -- Compares adaptive quadrature with the old trapezium rule
+    derivative() -> None
+        -- Compares dual numbers with the old one-sided differences
+    symbolic() -> None
+        -- Compares plotting symbolic derivatives with differentiating at
+           every point
+    allocations() -> None
+        -- Counts the values made by calls of builtins taking several
+           arguments
+    tuples() -> None
+        -- Compares flat tuples with the old chains of pairs
+    series() -> None
+        -- Compares evaluating sums over a grid with summing term by term
+    roots() -> None
+        -- Compares finding every intersection with the old Newton's method
+    contours() -> None
+        -- Times marching squares for implicit curves on finer grids
+    quadtree() -> None
+        -- Counts the points a quadtree evaluates on larger canvases
+    adaptive() -> None
+        -- Compares sampling curves adaptively with sampling every pixel
+    parametric() -> None
+        -- Compares sampling parametric curves by their length on the screen
+           with the old fixed steps of t
+    get_rss() -> int
+        -- Gets the memory the process is using
+    figures() -> None
+        -- Checks the memory used stays flat while rendering thousands of
+           graphs
+    images() -> None
+        -- Compares rendering graphs to memory by name with writing every
+           one to a file
+    render_cache() -> None
+        -- Measures the render cache on repeated requests and after a
+           restart
+    check_reference() -> None
+        -- Checks the parser and both engines against reference outputs
+    main() -> None
+        -- Runs the benchmarks named on the command line
+
+Global variables:
+    REFERENCE_TREES: list[tuple[str, str]]
+        -- Lines and the trees they parse to
+    REFERENCE_POINTS: tuple[float, ...]
+        -- The values of x the reference scripts are evaluated at
+    REFERENCE_VALUES: list[tuple[str, list]]
+        -- Scripts and their values at the reference points
+    BENCHMARKS: dict[str, Callable]
+        -- The benchmarks that can be run, by name
+"""
+
+import collections
+import concurrent.futures
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import evaluator
+import evaluator.builtins.functions
+import evaluator.curves
+import evaluator.executor
+import evaluator.graphical_processor
+import evaluator.parse_cache
+import evaluator.parser
+import evaluator.render_cache
+
+
+# Lines and the trees they parse to, as the precedence climbing parser gives
+# them once prefix operators are parsed by their scores. They differ from the
+# original parser only where it was wrong: postfix operators were applied
+# twice, multi-character operators and numbers such as 2e were split, and
+# "-a_b" applied the subscript to -a rather than a.
+REFERENCE_TREES = [
+    (r"y = x^2", "((= y) ((^ x) 2))"),
+    (r"\let f(x) = 1 + x", "((let f) λx.((+ 1) x))"),
+    (r"\let k = (1/2) (0^2)", "((let k) (((/ 1) 2) ((^ 0) 2)))"),
+    (r"y = -x + 2*x - 3", "((= y) ((- ((+ (negate x)) ((* 2) x))) 3))"),
+    (r"x^2 + y^2 = 4", "((= ((+ ((^ x) 2)) ((^ y) 2))) 4)"),
+    (r"\intersect(x^2, x+1)", "(intersect ((, ((^ x) 2)) ((+ x) 1)))"),
+    (r"\let g(x, y) = x*y", "((let g) λ((, x) y).((* x) y))"),
+    (r"y = 2x!", "((= y) (! (2 x)))"),
+    (r"y = f'", "((= y) (' f))"),
+    (r"y = \log_2 x", "((= y) ((_ log) (2 x)))"),
+    (r"y = 1.5e3 x + 2e", "((= y) ((+ (1.5e3 x)) (2 e)))"),
+    (r"y = 3e-2 * x", "((= y) ((* 3e-2) x))"),
+    (r"a => b -> c", "((-> ((=> a) b)) c)"),
+    (r"y = x != 2", "((= y) ((!= x) 2))"),
+    (r"y = - - x", "((= y) (negate (negate x)))"),
+    (r"y = +x", "((= y) (ignore x))"),
+    (r"y = -x^2", "((= y) ((^ (negate x)) 2))"),
+    (r"y = -a_b", "((= y) (negate ((_ a) b)))"),
+    (r"y = 2^3^x", "((= y) ((^ ((^ 2) 3)) x))"),
+    (r"y = a / b * c", "((= y) ((* ((/ a) b)) c))"),
+    (r"y = [x + 1] * {2}", "((= y) ((* ((+ x) 1)) 2))"),
+    (r"y = x, y, z", "((, ((, ((= y) x)) y)) z)"),
+    (r"y = .5x", "((= y) (.5 x))"),
+    (r"y = x_1 + x.y", "((= y) ((+ ((_ x) 1)) ((. x) y)))"),
+    (r"y = \sin(2x)^2", "((= y) ((^ (sin (2 x))) 2))"),
+]
+
+# The values of x the reference scripts are evaluated at
+REFERENCE_POINTS = (-1.5, 0.0, 0.5, 2.0)
+
+# Scripts and the value of their last line at each reference point, or None
+# where it could not be evaluated, as the scalar engine gives them since
+# derivatives were taken with dual numbers. They differ from the original
+# engine only where it was wrong: \atanh was the arctangent,
+# "(\lambda x)(x^2) 3" used the outer x, integrate used the trapezium rule
+# and could not take a \lambda, and differentiate used one-sided
+# differences.
+REFERENCE_VALUES = [
+    (r"y = x^2", [2.25, 0, 0.25, 4]),
+    (r"y = \sin(x)^2 + x^3/10 - \cos(2x)",
+     [1.647488744900668, -1, -0.2979534588022096, 2.280465431295418]),
+    (r"\let h(t) = t^2 + 1 \\ y = h(x) / h(2x)",
+     [0.325, 1, 0.625, 0.29411764705882354]),
+    (r"\let a = 3 \\ y = a x + \pi",
+     [-1.3584073464102069, 3.141592653589793, 4.641592653589793,
+      9.141592653589793]),
+    (r"y = \sqrt(x)", [np.nan, 0, 0.7071067811865476, 1.4142135623730951]),
+    (r"y = 1/x", [-0.6666666666666666, np.inf, 2, 0.5]),
+    (r"y = \atanh(x/6)",
+     [-0.25541281188299536, 0, 0.08352704233158309, 0.34657359027997264]),
+    (r"y = 2 x \ln x", [np.nan, np.nan, -0.6931471805599453,
+                        2.772588722239781]),
+    (r"y = -x^2", [2.25, 0, 0.25, 4]),
+    (r"y = \e^x", [0.22313016014842985, 1, 1.6487212707001282,
+                   7.3890560989306495]),
+    (r"\let g(t) = t^2 \\ y = \integrate(g, \"t, 0, x)",
+     [-1.125, 0, 0.041666666666666664, 2.6666666666666665]),
+    (r"y = 3", [3, 3, 3, 3]),
+    (r"\let m(x) = \sin x \\ \let n(x) = m(m(x)) \\ y = n(x)",
+     [-0.8401148815567654, 0, 0.4612695550331807, 0.7890723435728884]),
+    (r"y = x y", [None, None, None, None]),
+    (r"\let f(x) = f(x) \\ y = f(x)", [None, None, None, None]),
+    (r"y = \differentiate((\lambda t)(t^3), \"t, x)", [6.75, 0, 0.75, 12]),
+    (r"y = \integrate((\lambda t)(t x), \"t, 0, 1)", [-0.75, 0, 0.25, 1]),
+    (r"y = \integrate(t, \"t, 0, x)", [1.125, 0, 0.125, 2]),
+    (r"\let k(u) = u + x \\ y = k(1)", [None, None, None, None]),
+    (r"y = (\lambda x)(x^2) 3", [9, 9, 9, 9]),
+    (r"y = \log_2 x", [None, None, None, None]),
+    (r"y = (\log_2)(x)", [np.nan, -np.inf, -1, 1]),
+    (r"y = \i x", [-1.5j, 0, 0.5j, 2j]),
+    (r"\let c = \integrate((\lambda t)(t), \"t, 0, 1) \\ y = c x",
+     [-0.75, 0, 0.25, 1]),
+    (r"y = \sin", [None, None, None, None]),
+    (r"y = x!", [None, None, None, None]),
+    (r"\let p(x) = x + 1 \\ \let q(x) = p(p(p(x))) \\ y = q(x) q(x)",
+     [2.25, 9, 12.25, 25]),
+]
+
+
+def generate_script(lines):
+    """Generates a script with the given number of lines
+
+    The lines are a mix of function definitions and curves using them, so
+    they contain every kind of token.
+
+    Arguments:
+        lines: int
+            -- The number of lines in the script
+
+    Returns:
+        script: str
+            -- The generated script
+    """
+    generator = random.Random(lines)
+    statements = []
+    for i in range(lines):
+        a = generator.randint(1, 9)
+        b = round(generator.uniform(0, 10), 3)
+        if i % 2 == 0:
+            statements.append(rf"\let \f{i}(x) = {a} \sin(x)^2 - {b}e-2 x "
+                              rf"/ (x + {a}.5) + \cos({b} x)")
+        else:
+            statements.append(rf"y = \f{i - 1}(x) * {a} - \sqrt(x^2 + {b})")
+    return r" \\ ".join(statements)
+
+
+def time_call(function, repeats=3):
+    """Gets the best time taken to call function out of some repeats
+
+    Arguments:
+        function: Callable[[], Any]
+            -- The function to time
+        repeats: int (default 3)
+            -- The number of times to call it
+
+    Returns:
+        seconds: float
+            -- The shortest time taken by a call
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def tokenise():
+    """Times tokenising and parsing large generated scripts
+
+    Tokenising should scale linearly with the length of the script.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    print(f"{'lines':>8} {'chars':>9} {'tokens':>9} "
+          f"{'tokenise (s)':>13} {'tokens/s':>11} {'parse (s)':>10}")
+    for lines in (100, 1000, 10000):
+        script = generate_script(lines)
+        tokens = sum(1 for _ in evaluator.parser.tokenise(script))
+        tokenise_time = time_call(
+            lambda: sum(1 for _ in evaluator.parser.tokenise(script)))
+        parse_time = time_call(
+            lambda: evaluator.parser.Parser(script).parse())
+        print(f"{lines:>8} {len(script):>9} {tokens:>9} "
+              f"{tokenise_time:>13.4f} {tokens / tokenise_time:>11.0f} "
+              f"{parse_time:>10.4f}")
+
+
+def vectorise():
+    """Compares the vector engine with evaluating point by point
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    scripts = [r"y = \sin(x)^2 + x^3/10 - \cos(2x)",
+               r"\let h(t) = t^2 + 1 \\ \let a = 3 \\ y = a h(x) / h(2x)"]
+    print(f"{'samples':>8} {'loop (s)':>10} {'vector (s)':>11} "
+          f"{'speed up':>9}  script")
+    for script in scripts:
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        for samples in (800, 4000, 20000):
+            x_values = np.linspace(-5, 5, samples)
+            loop_time = time_call(lambda: [
+                executor.evaluate_function(node, x) for x in x_values], 1)
+            vector_time = time_call(
+                lambda: executor.vector_executor.evaluate(node, x_values))
+            print(f"{samples:>8} {loop_time:>10.4f} {vector_time:>11.6f} "
+                  f"{loop_time / vector_time:>8.0f}x  {script}")
+
+
+def scalar():
+    """Times compiling trees and evaluating them point by point
+
+    The first evaluation includes compiling the tree, which every later
+    evaluation reuses. The last script is a line long enough that compiling
+    it recursively would reach the recursion limit.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    scripts = [r"y = \sin(x)^2 + x^3/10 - \cos(2x)",
+               r"\let h(t) = t^2 + 1 \\ \let a = 3 \\ y = a h(x) / h(2x)",
+               r"\let p(x) = x + 1 \\ \let q(x) = p(p(p(x))) \\ y = q(x) q(x)",
+               "y = " + " + ".join(["x"] * 2000)]
+    print(f"{'first (ms)':>11} {'per point (us)':>15} {'points/s':>10}  script")
+    for script in scripts:
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        first_time = time_call(lambda: executor.evaluate_function(node, 0.5), 1)
+        x_values = np.linspace(-5, 5, 4000)
+        loop_time = time_call(lambda: [
+            executor.evaluate_function(node, x) for x in x_values])
+        print(f"{first_time * 1e3:>11.3f} "
+              f"{loop_time / len(x_values) * 1e6:>15.2f} "
+              f"{len(x_values) / loop_time:>10.0f}  "
+              f"{script if len(script) <= 70 else script[:66] + ' ...'}")
+
+
+def threads():
+    """Checks shared trees give the same results from many threads
+
+    Each script is parsed once and every thread evaluates the same trees,
+    either with a shared executor or with a new one. The scripts define g
+    differently, so results from a thread using another script's executor
+    would be wrong.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError
+            -- If any thread gets a different result from evaluating serially
+    """
+    scripts = [r"\let g(t) = t^2 \\ y = \integrate(g, \"t, 0, x)",
+               r"\let g(t) = 3 t \\ y = \integrate(g, \"t, 0, x)",
+               r"\let g(t) = t + 1 \\ y = \differentiate(g, \"t, x) g(x)",
+               r"\let h(t) = t^2 + 1 \\ y = h(x) / h(2x) + \sin(x)"]
+    x_values = np.linspace(-2, 2, 9)
+
+    def evaluate(trees, executor=None):
+        if executor is None:
+            executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        scalar = [executor.evaluate_function(node, x) for x in x_values]
+        array, _ = executor.evaluate_array(node, x_values)
+        return scalar, array.tolist()
+
+    shared = []
+    for script in scripts:
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        shared.append((trees, executor, evaluate(trees, executor)))
+
+    tasks = 240
+    mismatches = 0
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(16) as pool:
+        futures = []
+        for task in range(tasks):
+            trees, executor, expected = shared[task % len(shared)]
+            if task % 3 == 0:
+                executor = None
+            futures.append((pool.submit(evaluate, trees, executor), expected))
+        for future, expected in futures:
+            if future.result() != expected:
+                mismatches += 1
+    seconds = time.perf_counter() - start
+    print(f"{tasks} tasks on 16 threads in {seconds:.3f}s, "
+          f"{mismatches} mismatches")
+    assert mismatches == 0, 'Threads gave different results'
+
+
+def memory():
+    """Measures the memory used by parsed trees
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    print(f"{'lines':>8} {'nodes':>9} {'memory (MB)':>12} {'bytes/node':>11}")
+    for lines in (100, 1000, 5000):
+        script = generate_script(lines)
+        tracemalloc.start()
+        trees = evaluator.parser.Parser(script).parse()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        nodes = sum(1 for tree in trees for _ in tree)
+        print(f"{lines:>8} {nodes:>9} {size / 1e6:>12.2f} "
+              f"{size / nodes:>11.0f}")
+
+
+def fold():
+    """Times scripts with constant and repeated subexpressions
+
+    The constants are computed once per executor, so the first evaluation
+    includes them and later evaluations only use their values.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    scripts = [r"\let a = \integrate((\lambda t)(t^2), \"t, 0, 1) \\ y = a x",
+               r"y = \sin(\pi/4) x + \sin(\pi/4)",
+               r"y = \integrate((\lambda t)(\sin t), \"t, 0, 2) x "
+               r"+ \sin(x)^2 / (\sin(x)^2 + 1)"]
+    x_values = np.linspace(-5, 5, 800)
+    print(f"{'first (s)':>10} {'again (s)':>10} {'engine':>7}  script")
+    for script in scripts:
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        first_time = time_call(
+            lambda: executor.evaluate_array(node, x_values), 1)
+        again_time = time_call(
+            lambda: executor.evaluate_array(node, x_values))
+        _, engine = executor.evaluate_array(node, x_values)
+        print(f"{first_time:>10.4f} {again_time:>10.4f} {engine:>7}  {script}")
+
+
+def integrate():
+    """Compares adaptive quadrature with the old trapezium rule
+
+    The old rule always evaluated the integrand at 302 points, one at a
+    time. The adaptive rule evaluates its nodes in batches and stops once
+    its error estimate is within the tolerance.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    integrands = [(r"t^2", 0, 1, 1 / 3),
+                  (r"\sin t", 0, np.pi, 2),
+                  (r"\e^(-(t^2))", -3, 3, 1.7724146965190428),
+                  (r"1 / (1 + 100 (t^2))", -1, 1, 0.2 * np.arctan(10)),
+                  (r"\sqrt t", 0, 1, 2 / 3),
+                  (r"\sin(20 t)", 0, 1, (1 - np.cos(20)) / 20)]
+    print(f"{'old evals':>9} {'old error':>10} {'new evals':>9} "
+          f"{'new error':>10} {'old (s)':>8} {'new (s)':>8}  integrand")
+    for integrand, low, high, exact in integrands:
+        trees = evaluator.parse_cache.CACHE.parse(f"y = {integrand}")
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+
+        def trapezium():
+            # The rule integrate used before, kept here for comparison
+            total = 0
+            dx = (high - low) / 300
+            for t in np.linspace(low, high, 300):
+                total += executor.evaluate_function(node, t, 't')
+            total *= 2
+            total -= executor.evaluate_function(node, low, 't')
+            total -= executor.evaluate_function(node, high, 't')
+            return total * dx / 2
+
+        def adaptive():
+            return evaluator.builtins.functions.gauss_kronrod(
+                lambda t: executor.evaluate_array(node, t, 't')[0],
+                low, high)
+
+        old_time = time_call(trapezium)
+        new_time = time_call(adaptive)
+        old_error = abs(trapezium() - exact)
+        new, evaluations = adaptive()
+        print(f"{302:>9} {old_error:>10.2e} {evaluations:>9} "
+              f"{abs(new - exact):>10.2e} {old_time:>8.4f} {new_time:>8.4f}"
+              f"  {integrand}")
+
+
+def derivative():
+    """Compares dual numbers with the old one-sided differences
+
+    The old differences needed two evaluations of the function for each
+    point, and lost about half the digits. Dual numbers find the value and
+    the exact derivative of every point in one evaluation.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    functions = [(r"x^3", lambda x: 3 * x**2),
+                 (r"(\sin x) * (\cos x)", lambda x: np.cos(2 * x)),
+                 (r"\e^(-(x^2))", lambda x: -2 * x * np.exp(-x**2)),
+                 (r"\ln(1 + x^2)", lambda x: 2 * x / (1 + x**2)),
+                 (r"\atan(x) / (2 + \sin x)",
+                  lambda x: (1 / (1 + x**2) * (2 + np.sin(x))
+                             - np.arctan(x) * np.cos(x)) / (2 + np.sin(x))**2)]
+    points = np.linspace(-3, 3, 10000)
+    print(f"{'old passes':>10} {'old error':>10} {'new passes':>10} "
+          f"{'new error':>10} {'old (s)':>8} {'new (s)':>8}  function")
+    for function, exact in functions:
+        trees = evaluator.parse_cache.CACHE.parse(f"y = {function}")
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+
+        def difference():
+            # The rule differentiate used before, kept here for comparison
+            dx = 0.0000001
+            return [(executor.evaluate_function(node, x)
+                     - executor.evaluate_function(node, x - dx)) / dx
+                    for x in points]
+
+        def dual():
+            return executor.evaluate_derivative(node, points)[1]
+
+        old_time = time_call(difference, 1)
+        new_time = time_call(dual)
+        old_error = np.max(np.abs(np.array(difference()) - exact(points)))
+        new_error = np.max(np.abs(dual() - exact(points)))
+        print(f"{2 * points.size:>10} {old_error:>10.2e} {1:>10} "
+              f"{new_error:>10.2e} {old_time:>8.4f} {new_time:>8.4f}"
+              f"  {function}")
+
+
+def symbolic():
+    """Compares plotting symbolic derivatives with differentiating at every
+    point
+
+    Differentiating at a point goes through the scalar engine for each
+    pixel. A symbolic derivative is built once and is evaluated over the
+    whole array by the vector engine.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    functions = [r"x^3 + (\sin x) * x",
+                 r"\e^(-(x^2)) * (\cos(3 x))",
+                 r"\ln(1 + x^2) / (2 + \atan x)",
+                 r"\sqrt(1 + x^2)^x"]
+    points = np.linspace(-3, 3, 800)
+    print(f"{'point (s)':>9} {'tree (s)':>9} {'build (s)':>9} {'engine':>7} "
+          f"{'difference':>10}  function")
+    for function in functions:
+        script = (rf"\let f(x) = {function} \\ "
+                  rf"\let g = \differentiate(f, \"x) \\ "
+                  rf"y = \differentiate(f, \"x, x) \\ y = g(x)")
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        pointwise = trees[2].get_root().parameter
+        derivative = trees[3].get_root().parameter
+
+        start = time.perf_counter()
+        executor.evaluate_constant(trees[1].get_root().parameter)
+        build_time = time.perf_counter() - start
+
+        point_time = time_call(
+            lambda: executor.evaluate_array(pointwise, points), 1)
+        tree_time = time_call(lambda: executor.evaluate_array(derivative,
+                                                              points))
+        expected, _ = executor.evaluate_array(pointwise, points)
+        values, engine = executor.evaluate_array(derivative, points)
+        print(f"{point_time:>9.4f} {tree_time:>9.4f} {build_time:>9.4f} "
+              f"{engine:>7} {np.max(np.abs(values - expected)):>10.2e}"
+              f"  {function}")
+
+
+def allocations():
+    """Counts the values made by calls of builtins taking several arguments
+
+    A call such as x*x used to apply the builtin to each argument in turn,
+    making a partially applied builtin for every call, and every number was
+    boxed in an object of its own. Saturated calls are now given all of
+    their arguments at once and numbers are not boxed. The values made for
+    each point are counted, and how many of them are builtins.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    expressions = [r"x*x + 1",
+                   r"(x + 1) * (x - 1) / (x^2 + 2)",
+                   r"\sin(x) * \cos(x) + x^3 - 2 x",
+                   r"(\lambda t)(t * t - t) (x + 1)"]
+    points = [float(x) for x in np.linspace(-3, 3, 1000)]
+    types = evaluator.builtins.types
+    print(f"{'old values':>10} {'old builtins':>12} {'new values':>10} "
+          f"{'new builtins':>12} {'old (s)':>8} {'new (s)':>8}  expression")
+    for expression in expressions:
+        trees = evaluator.parse_cache.CACHE.parse(f"y = {expression}")
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        compiled = executor.compiler.compile(node, ('x',))
+        boxed = collections.Counter()
+
+        def curried(node, frame):
+            # Evaluates the way calls were evaluated before builtins declared
+            # their arity, applying one argument at a time. Each number it
+            # gives would have been boxed.
+            if node.is_identifier():
+                name = node.name.item
+                if name in frame:
+                    return frame[name]
+                value = executor.globals.get_var(name)
+                return float(name) if value is None else value
+            if node.is_funcdef():
+                function = types.Function()
+                function.apply = lambda value: curried(
+                    node.expr, {**frame, node.identifier.name.item: value})
+                return function
+            function = curried(node.function, frame)
+            parameter = curried(node.parameter, frame)
+            if isinstance(function, types.NUMBERS):
+                result = function * parameter
+            else:
+                result = function.apply(parameter)
+            if isinstance(result, types.NUMBERS):
+                boxed['numbers'] += 1
+            return result
+
+        def old():
+            return [curried(node, {'x': x}) for x in points]
+
+        def new():
+            return [compiled((x,)) for x in points]
+
+        counts = []
+        for run in (old, new):
+            made = collections.Counter()
+            boxed.clear()
+            initialiser = types.Function.__init__
+
+            def counted(self):
+                made[isinstance(self, types.Builtin)] += 1
+            types.Function.__init__ = counted
+            try:
+                run()
+            finally:
+                types.Function.__init__ = initialiser
+            counts.append(((sum(made.values()) + boxed['numbers'])
+                           / len(points), made[True] / len(points)))
+        (old_values, old_builtins), (new_values, new_builtins) = counts
+        print(f"{old_values:>10.1f} {old_builtins:>12.1f} {new_values:>10.1f} "
+              f"{new_builtins:>12.1f} {time_call(old):>8.4f} "
+              f"{time_call(new):>8.4f}  {expression}")
+
+
+def tuples():
+    """Compares flat tuples with the old chains of pairs
+
+    Tuples used to be pairs whose first item was the rest of the tuple, so
+    finding the length or an item walked the chain, and every item found
+    the length again at each step, so reading one item of a tuple of n items
+    took O(n^2) steps. Flat tuples are made in one step for a whole chain
+    of the , operator and read in O(1).
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    class Pair:
+        # The old tuple, as made by the , operator
+        def __init__(self, item1, item2):
+            self.item1 = item1
+            self.item2 = item2
+
+        def get_item(self, index):
+            length = self.get_length()
+            if index >= length or index <= -1:
+                return None
+            elif length <= 2 and index == 1:
+                return self.item2
+            elif length <= 2 and index == 0:
+                return self.item1
+            elif index == length - 1:
+                return self.item2
+            else:
+                return self.item1.get_item(index)
+
+        def get_length(self):
+            if isinstance(self.item1, Pair):
+                return 1 + self.item1.get_length()
+            return 2
+
+    print(f"{'items':>6} {'old (s)':>9} {'new (s)':>9} {'speed-up':>9}")
+    for count in (4, 16, 32, 64):
+        source = ', '.join(f"{i} x" for i in range(count))
+        trees = evaluator.parse_cache.CACHE.parse(f"y = ({source})")
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        compiled = executor.compiler.compile(node, ('x',))
+
+        def old():
+            for x in range(10):
+                value = float(x)
+                for i in range(1, count):
+                    value = Pair(value, i * float(x))
+                [value.get_item(i) for i in range(value.get_length())]
+
+        def new():
+            for x in range(10):
+                value = compiled((float(x),))
+                [value.get_item(i) for i in range(value.get_length())]
+
+        old_time = time_call(old)
+        new_time = time_call(new)
+        print(f"{count:>6} {old_time:>9.4f} {new_time:>9.4f} "
+              f"{old_time / new_time:>9.1f}")
+
+
+def series():
+    """Compares evaluating sums over a grid with summing term by term
+
+    A Fourier partial sum of a square wave is plotted with increasing
+    numbers of terms. The vector engine evaluates the summand over an x by
+    n grid in one pass. The scalar engine evaluates every term of the
+    series at once for each point, and adding the terms one at a time is
+    how such a series had to be plotted before sum existed. A summand
+    written as an expression in x and the quoted variable is then checked
+    against the same summand written as a function, in both engines.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    points = np.linspace(-np.pi, np.pi, 200)
+    print(f"{'terms':>6} {'grid (s)':>9} {'point (s)':>9} {'term (s)':>9} "
+          f"{'difference':>10}")
+    for terms in (10, 100, 1000):
+        summand = r"(4 / (\pi (2k - 1))) * \sin((2k - 1) x)"
+        trees = evaluator.parse_cache.CACHE.parse(
+            rf"y = {summand} \\ "
+            rf"y = \sum((\lambda k)({summand}), \"k, 1, {terms})")
+        executor = evaluator.executor.Executor(trees)
+        term = trees[0].get_root().parameter
+        node = trees[1].get_root().parameter
+
+        def by_term():
+            return [sum(executor.evaluate_function(term, (x, float(k)),
+                                                   ('x', 'k'))
+                        for k in range(1, terms + 1)) for x in points]
+
+        grid_time = time_call(lambda: executor.evaluate_array(node, points))
+        point_time = time_call(lambda: [
+            executor.evaluate_function(node, x) for x in points], 1)
+        term_time = time_call(by_term, 1)
+        values, _ = executor.evaluate_array(node, points)
+        print(f"{terms:>6} {grid_time:>9.4f} {point_time:>9.4f} "
+              f"{term_time:>9.4f} "
+              f"{np.max(np.abs(values - by_term())):>10.2e}")
+
+    # The summand may also be an expression in the quoted variable, using the
+    # variables around the series as a function would
+    trees = evaluator.parse_cache.CACHE.parse(
+        r"y = \sum(\sin(n x) / n, \"n, 1, 100) \\ "
+        r"y = \sum((\lambda n)(\sin(n x) / n), \"n, 1, 100)")
+    executor = evaluator.executor.Executor(trees)
+    plain, function = (tree.get_root().parameter for tree in trees)
+    expected, _ = executor.evaluate_array(function, points)
+    for name, values in (
+            ('grid', executor.evaluate_array(plain, points)[0]),
+            ('point', [executor.evaluate_function(plain, x) for x in points])):
+        print(f"expression {name}: "
+              f"{np.max(np.abs(np.array(values) - expected)):.2e} from the "
+              f"function")
+
+
+def roots():
+    """Compares finding every intersection with the old Newton's method
+
+    The old intersect took 100 Newton steps from x = 0, each evaluating the
+    two functions twice point by point, and found at most one intersection.
+    Every sign change of the difference across the pixels is now refined at
+    once with Brent's method.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    pairs = [(r"\sin x", r"x / 3"),
+             (r"x^3 - 4 x", r"1"),
+             (r"\cos(3 x)", r"x / 5"),
+             (r"\tan x", r"x")]
+    print(f"{'old roots':>9} {'new roots':>9} {'old (s)':>8} {'new (s)':>8} "
+          f"{'residual':>9}  functions")
+    for function1, function2 in pairs:
+        trees = evaluator.parse_cache.CACHE.parse(
+            f"\\intersect({function1}, {function2})")
+        executor = evaluator.executor.Executor(trees)
+        grapher = evaluator.graphical_processor.Grapher(executor, 800, 800)
+        root = trees[-1].get_root()
+        node1 = root.parameter.function.parameter
+        node2 = root.parameter.parameter
+
+        def newton():
+            # The intersect used before, kept here for comparison
+            x = 0
+            dx = 0.0001
+            height = 1
+            for _ in range(100):
+                height = (executor.evaluate_function(node1, x)
+                          - executor.evaluate_function(node2, x))
+                slope = (height - executor.evaluate_function(node1, x - dx)
+                         + executor.evaluate_function(node2, x - dx)) / dx
+                x -= height / slope
+            return [x] if height**2 < 0.001 else []
+
+        old_time = time_call(newton)
+        new_time = time_call(lambda: grapher.intersect(node1, node2))
+        points, _ = grapher.intersect(node1, node2)
+        x_values = np.array([x for _, x, _ in points])
+        residual = np.max(np.abs(
+            executor.evaluate_array(node1, x_values)[0]
+            - executor.evaluate_array(node2, x_values)[0]), initial=0)
+        print(f"{len(newton()):>9} {len(points):>9} {old_time:>8.4f} "
+              f"{new_time:>8.4f} {residual:>9.2e}  {function1}, {function2}")
+
+
+def contours():
+    """Times marching squares for implicit curves on finer grids
+
+    Implicit curves used to be traced 100 steps both ways from every point
+    found next to a sign change, evaluating the tree several times for each
+    step. On a grid, it is evaluated in one pass and marching squares finds
+    the curve, so the time taken grows with the size of the grid. The
+    residual is the largest difference between the two sides at the points
+    found, with and without refining them along the edges of the grid.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    curves = [r"x^2 + y^2 = 4",
+              r"y^2 = x^3 - x",
+              r"\sin(x y) = 0.3"]
+    print(f"{'cell':>4} {'grid':>6} {'linear (s)':>10} {'refined (s)':>11} "
+          f"{'linear':>9} {'refined':>9}  curve")
+    for curve in curves:
+        trees = evaluator.parse_cache.CACHE.parse(curve)
+        executor = evaluator.executor.Executor(trees)
+        root = trees[-1].get_root()
+        grapher = evaluator.graphical_processor.Grapher(executor, 800, 800)
+        grapher.adaptive_implicit = False
+        for cell_size in (16, 8, 4, 2):
+            evaluator.graphical_processor.IMPLICIT_CELL_SIZE = cell_size
+            times = []
+            residuals = []
+            for refine in (False, True):
+                grapher.refine_implicit = refine
+                times.append(time_call(lambda: grapher.implicit(
+                    root.parameter, root.function.parameter)))
+                (_, x, y), = grapher.implicit(root.parameter,
+                                              root.function.parameter)[0]
+                points = (x[np.isfinite(x)], y[np.isfinite(y)])
+                residuals.append(np.max(np.abs(
+                    executor.evaluate_array(root.parameter, points,
+                                            ('x', 'y'))[0]
+                    - executor.evaluate_array(root.function.parameter,
+                                              points, ('x', 'y'))[0]),
+                    initial=0))
+            print(f"{cell_size:>4} {(800 // cell_size)**2:>6} "
+                  f"{times[0]:>10.4f} {times[1]:>11.4f} "
+                  f"{residuals[0]:>9.2e} {residuals[1]:>9.2e}  {curve}")
+    evaluator.graphical_processor.IMPLICIT_CELL_SIZE = 4
+
+
+def quadtree():
+    """Counts the points a quadtree evaluates on larger canvases
+
+    A grid of cells a pixel across evaluates every pixel of the canvas. The
+    quadtree only splits cells near the curve, so the points it evaluates
+    grow with the length of the curve, which grows with the width of the
+    canvas rather than its area.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    curves = [r"x^2 + y^2 = 4",
+              r"\sin(x y) = 0.3"]
+    print(f"{'canvas':>6} {'pixels':>8} {'evaluated':>9} {'time (s)':>8} "
+          f"{'vertices':>8}  curve")
+    for curve in curves:
+        trees = evaluator.parse_cache.CACHE.parse(curve)
+        executor = evaluator.executor.Executor(trees)
+        root = trees[-1].get_root()
+        evaluate_array = executor.evaluate_array
+        evaluated = collections.Counter()
+
+        def counted(node, values, identifier='x'):
+            evaluated['points'] += np.size(values[0])
+            return evaluate_array(node, values, identifier)
+        executor.evaluate_array = counted
+
+        for size in (400, 800, 1600, 3200):
+            grapher = evaluator.graphical_processor.Grapher(executor, size,
+                                                            size)
+            grapher.implicit_cell_budget = 1 << 20
+            start = time.perf_counter()
+            (_, x, _), = grapher.implicit(root.parameter,
+                                          root.function.parameter)[0]
+            seconds = time.perf_counter() - start
+            evaluated.clear()
+            grapher.implicit(root.parameter, root.function.parameter)
+            # Both sides are evaluated at each point
+            print(f"{size:>6} {(size + 1)**2:>8} "
+                  f"{evaluated['points'] // 2:>9} {seconds:>8.4f} "
+                  f"{np.count_nonzero(np.isfinite(x)):>8}  {curve}")
+
+
+def adaptive():
+    """Compares sampling curves adaptively with sampling every pixel
+
+    Curves used to be sampled once a pixel, which is more than straight
+    lines need, too few for tight bends, and joins the two sides of a pole
+    with a line. The error is the furthest in pixels the line drawn is from
+    the curve, found from samples 64 times a pixel apart, ignoring where the
+    line is broken and clipping both to the view.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    curves = [r"y = x",
+              r"y = x^2",
+              r"y = \sqrt((x - 0.3)^2)/(x - 0.3)",
+              r"y = \tan x",
+              r"y = \sin(1/x)",
+              r"y = (\sin(20 x)) / (1 + x^2)"]
+    width, height = 800, 600
+    print(f"{'uniform':>7} {'error':>7} {'adaptive':>8} {'error':>7} "
+          f"{'breaks':>6} {'time (s)':>8}  curve")
+    for curve in curves:
+        trees = evaluator.parse_cache.CACHE.parse(curve)
+        executor = evaluator.executor.Executor(trees)
+        grapher = evaluator.graphical_processor.Grapher(executor, width,
+                                                        height)
+        function = grapher.get_function(trees[-1])
+        view = (grapher.xrange, grapher.yrange, width, height)
+
+        def curve_at(x_values):
+            y_values = executor.evaluate_array(function, x_values)[0]
+            return x_values, np.broadcast_to(np.real(y_values),
+                                             x_values.shape)
+
+        def get_error(x, y, breaks):
+            # The line drawn between samples, against the curve between them
+            x_values, y_values = curve_at(np.linspace(*grapher.xrange,
+                                                      64 * width))
+            index = np.clip(np.searchsorted(x, x_values) - 1, 0, x.size - 2)
+            fraction = (x_values - x[index]) / (x[index + 1] - x[index])
+            with np.errstate(invalid='ignore'):
+                drawn = y[index] + fraction * (y[index + 1] - y[index])
+            kept = ~breaks[index] & np.isfinite(drawn) \
+                & np.isfinite(y_values)
+            scale = height / (grapher.yrange[1] - grapher.yrange[0])
+            return np.max(np.abs(np.clip(drawn[kept], *grapher.yrange)
+                                 - np.clip(y_values[kept], *grapher.yrange))
+                          * scale, initial=0)
+
+        x, y = curve_at(np.linspace(*grapher.xrange, width))
+        uniform = get_error(x, y, np.zeros(width - 1, dtype=bool))
+        seconds = time_call(lambda: grapher.y_fx(function))
+        _, x, y, breaks = evaluator.curves.sample(
+            curve_at, *grapher.xrange, view,
+            width // evaluator.graphical_processor.CURVE_INITIAL_SPACING + 1,
+            evaluator.graphical_processor.CURVE_SAMPLE_BUDGET,
+            (grapher.xrange[1] - grapher.xrange[0]) / width
+            * evaluator.graphical_processor.CURVE_RESOLUTION)
+        print(f"{width:>7} {uniform:>7.2f} {x.size:>8} "
+              f"{get_error(x, y, breaks):>7.2f} "
+              f"{np.count_nonzero(breaks):>6} {seconds:>8.4f}  {curve}")
+
+
+def parametric():
+    """Compares sampling parametric curves by their length on the screen
+    with the old fixed steps of t
+
+    Parametric curves used to be sampled every 0.01 from -10 to 10, with x
+    and y evaluated separately, whatever the view. They are now sampled
+    over any range of t, evaluating both together, with samples spread by
+    the length of the curve on the screen and parts off the view left
+    coarse. The gap is the longest chord in pixels between samples with an
+    end on the view, which is where the old steps drew visible corners.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    curves = [(r"(\cos t), (\sin t)", (-10, 10)),
+              (r"(3 \cos(5 t)), (3 \sin(7 t))", (-10, 10)),
+              (r"(4 \cos(40 t)), (4 \sin(41 t))", (-10, 10)),
+              (r"t, 1/t", (-10, 10)),
+              (r"(t/100), (\sin t)", (-1000, 1000))]
+    width, height = 800, 800
+    print(f"{'old':>5} {'time (s)':>8} {'gap':>6} {'new':>5} {'time (s)':>8} "
+          f"{'gap':>6}  t        curve")
+    for curve, trange in curves:
+        trees = evaluator.parse_cache.CACHE.parse(curve)
+        executor = evaluator.executor.Executor(trees)
+        root = trees[-1].get_root()
+        grapher = evaluator.graphical_processor.Grapher(executor, width,
+                                                        height)
+        grapher.trange = trange
+        view = (grapher.xrange, grapher.yrange, width, height)
+
+        def get_gap(x, y):
+            screen = evaluator.curves.to_screen(x, y, view)
+            shown = ((screen >= 0) & (screen <= width)).all(axis=-1)
+            with np.errstate(invalid='ignore'):
+                chords = np.hypot(*(screen[1:] - screen[:-1]).T)
+            return np.max(np.nan_to_num(chords[shown[1:] | shown[:-1]]),
+                          initial=0)
+
+        def old():
+            t_values = np.arange(-10, 10, 0.01)
+            return (executor.evaluate_array(root.function.parameter,
+                                            t_values, 't')[0],
+                    executor.evaluate_array(root.parameter, t_values,
+                                            't')[0])
+
+        old_time = time_call(old)
+        old_x, old_y = old()
+        new_time = time_call(lambda: grapher.parametric(root))
+        (_, x, y), = grapher.parametric(root)[0]
+        print(f"{old_x.size:>5} {old_time:>8.4f} "
+              f"{get_gap(old_x, old_y):>6.1f} "
+              f"{np.count_nonzero(np.isfinite(x)):>5} {new_time:>8.4f} "
+              f"{get_gap(x, y):>6.1f}  {str(trange):<8} {curve}")
+
+
+def get_rss():
+    """Gets the memory the process is using
+
+    Arguments:
+        None
+
+    Returns:
+        size: int
+            -- The resident set size in bytes, or the largest it has been if
+               it cannot be found
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Only on Unix
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def figures():
+    """Checks the memory used stays flat while rendering thousands of graphs
+
+    Graphs used to be drawn on pyplot figures which were never closed, so
+    pyplot kept every one and the memory used grew with every render. Each
+    render now has its own figure which is freed after it, so once the
+    caches have filled the memory used should stay the same. The graphs
+    are rendered from several threads, which pyplot's shared state did not
+    allow.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError
+            -- If the memory used grows by more than a few megabytes
+    """
+    scripts = [r"y = \sin x \\ y = x^2",
+               r"(\cos t), (\sin t) \\ x^2 + y^2 = 9",
+               r"y = \tan x \\ \intersect(x^2, 2 - x)"]
+    renders = 2000
+    warm = 200
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('static/images')
+
+        def render(index):
+            path, _ = evaluator.evaluate(scripts[index % len(scripts)],
+                                         200 + index % 4 * 50, 200,
+                                         (-5, 5), (-5, 5))
+            os.remove(path)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(4) as pool:
+                list(pool.map(render, range(warm)))
+                before = get_rss()
+                start = time.perf_counter()
+                list(pool.map(render, range(warm, renders)))
+                seconds = time.perf_counter() - start
+                after = get_rss()
+        finally:
+            os.chdir(cwd)
+    growth = (after - before) / 1e6
+    print(f"{renders - warm} renders on 4 threads in {seconds:.1f}s, "
+          f"{before / 1e6:.1f} MB to {after / 1e6:.1f} MB "
+          f"({growth:+.1f} MB)")
+    assert growth < 16, 'Memory grew while rendering'
+
+
+def images():
+    """Compares rendering graphs to memory by name with writing every one to
+    a file
+
+    Every graph used to be written to a new file with a random name, even if
+    the same graph had just been drawn. Graphs rendered to memory are named
+    by what they show, so drawing one again costs only parsing and hashing.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    scripts = [r"y = \sin x \\ y = x^2",
+               r"(\cos t), (\sin t) \\ x^2 + y^2 = 9"]
+    repeats = 10
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('static/images')
+        # Graphs rendered to memory are also kept in the render cache
+        render_cache = evaluator.render_cache.CACHE
+        evaluator.render_cache.CACHE = evaluator.render_cache.RenderCache()
+        try:
+            print(f"{'files (s)':>9} {'written':>7} {'memory (s)':>10} "
+                  f"{'rendered':>8} {'bytes':>6}  script")
+            for script in scripts:
+                start = time.perf_counter()
+                paths = [evaluator.evaluate(script, 400, 400, (-5, 5),
+                                            (-5, 5))[0]
+                         for _ in range(repeats)]
+                files = time.perf_counter() - start
+                for path in paths:
+                    os.remove(path)
+
+                misses = evaluator.IMAGES.misses
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    path, _ = evaluator.render(script, 400, 400, (-5, 5),
+                                               (-5, 5))
+                memory = time.perf_counter() - start
+                name = path.rsplit('/', 1)[-1].removesuffix('.png')
+                print(f"{files:>9.3f} {len(set(paths)):>7} {memory:>10.3f} "
+                      f"{evaluator.IMAGES.misses - misses:>8} "
+                      f"{len(evaluator.get_image(name)):>6}  {script}")
+        finally:
+            evaluator.render_cache.CACHE = render_cache
+            os.chdir(cwd)
+
+
+def render_cache():
+    """Measures the render cache on repeated requests and after a restart
+
+    Requests for a few graphs, some far more often than others, are served
+    with and without the cache, with a quota too small for all of them. A
+    new cache then reads the index left by the first, as after a restart,
+    and is asked for every graph again.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    scripts = [r"y = \sin x", r"y = x^2", r"y = \tan x",
+               r"(\cos t), (\sin t)", r"x^2 + y^2 = 9", r"y = 1/x",
+               r"y = \sqrt x", r"y = x^3 - x"]
+    rng = random.Random(0)
+    requests = [scripts[min(int(rng.expovariate(0.5)), len(scripts) - 1)]
+                for _ in range(40)]
+
+    def serve(cache, script):
+        # Renders the graph only if it is not in the cache
+        key = evaluator.render_cache.get_key(script, 400, 400, (-5, 5),
+                                             (-5, 5))
+        if cache.get(key) is None:
+            path, error_message = evaluator.evaluate(script, 400, 400,
+                                                     (-5, 5), (-5, 5))
+            with open(path, 'rb') as file:
+                image = file.read()
+            os.remove(path)
+            cache.put(key, (image, error_message))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('static/images')
+        try:
+            start = time.perf_counter()
+            for script in requests:
+                path, _ = evaluator.evaluate(script, 400, 400, (-5, 5),
+                                             (-5, 5))
+                os.remove(path)
+            uncached = time.perf_counter() - start
+
+            cache = evaluator.render_cache.RenderCache(quota=1 << 16)
+            start = time.perf_counter()
+            for script in requests:
+                serve(cache, script)
+            cached = time.perf_counter() - start
+            # As when the server exits
+            cache.save()
+            print(f"{len(requests)} requests: {uncached:.2f}s uncached, "
+                  f"{cached:.2f}s cached, hit rate "
+                  f"{cache.get_hit_rate():.0%}, "
+                  f"{cache.bytes_saved / 1e3:.0f} kB saved, "
+                  f"{cache.evictions} evicted, {len(cache)} kept in "
+                  f"{cache.size / 1e3:.0f} kB")
+
+            restarted = evaluator.render_cache.RenderCache(quota=1 << 16)
+            restarted.load()
+            kept = len(restarted)
+            hits = restarted.hits
+            for script in scripts:
+                serve(restarted, script)
+            print(f"after a restart: {kept} graphs kept, "
+                  f"{restarted.hits - hits} of {len(scripts)} found")
+        finally:
+            os.chdir(cwd)
+
+
+def check_reference():
+    """Checks the parser and both engines against reference outputs
+
+    Every line of REFERENCE_TREES must parse to the same tree, and every
+    script of REFERENCE_VALUES must have the same values at the reference
+    points, point by point and, where every value is defined, over an
+    array at once.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    failures = 0
+    for line, expected in REFERENCE_TREES:
+        tree, = evaluator.parser.Parser(line).parse()
+        if repr(tree.get_root()) != expected:
+            print(f"tree: {line} gave {tree.get_root()}, not {expected}")
+            failures += 1
+
+    for script, expected in REFERENCE_VALUES:
+        trees = evaluator.parse_cache.CACHE.parse(script)
+        executor = evaluator.executor.Executor(trees)
+        node = trees[-1].get_root().parameter
+        values = []
+        with np.errstate(all='ignore'):
+            for x in np.array(REFERENCE_POINTS):
+                try:
+                    values.append(complex(executor.evaluate_function(node,
+                                                                     x)))
+                except Exception:
+                    values.append(None)
+            results = [('point', values)]
+            if None not in expected:
+                array, _ = executor.evaluate_array(node,
+                                                   np.array(REFERENCE_POINTS))
+                results.append(('array', list(np.broadcast_to(
+                    array, len(REFERENCE_POINTS)))))
+        for name, values in results:
+            if not all(
+                    value is None if reference is None else
+                    value is not None and np.isclose(value, reference,
+                                                     rtol=1e-9,
+                                                     equal_nan=True)
+                    for value, reference in zip(values, expected)):
+                print(f"{name}: {script} gave {values}, not {expected}")
+                failures += 1
+
+    print(f"{len(REFERENCE_TREES)} trees and {len(REFERENCE_VALUES)} "
+          f"scripts, {failures} failures")
+    assert not failures, 'The outputs differ from the reference'
+
+
+BENCHMARKS = {'tokenise': tokenise, 'vectorise': vectorise, 'scalar': scalar,
+              'threads': threads, 'memory': memory, 'fold': fold,
+              'integrate': integrate, 'derivative': derivative,
+              'symbolic': symbolic, 'allocations': allocations,
+              'tuples': tuples, 'series': series, 'roots': roots,
+              'contours': contours, 'quadtree': quadtree,
+              'adaptive': adaptive, 'parametric': parametric,
+              'figures': figures, 'images': images,
+              'render_cache': render_cache, 'reference': check_reference}
+
+
+def main():
+    """Runs the benchmarks named on the command line
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
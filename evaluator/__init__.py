@@ -1,23 +1,48 @@
 """The Evaluator for the graphical calculator.
 
-It contains the only function in the evaluator subdirectory that should be used
-externally.
+It contains the only functions in the evaluator subdirectory that should be
+used externally.
 
 Functions:
     evaluate(raw_text: str,
              width: int,
              height: int,
              x_range: tuple[int, int],
-             y_range: tuple[int, int]) -> str:
+             y_range: tuple[int, int],
+             t_range: tuple[int, int]) -> str:
         -- Returns the path of the graph created using those inputs
+    render(raw_text: str,
+           width: int,
+           height: int,
+           x_range: tuple[int, int],
+           y_range: tuple[int, int],
+           t_range: tuple[int, int]) -> str:
+        -- Returns the location of the graph created using those inputs,
+           kept in memory and in the render cache
+    get_image(name: str) -> bytes | None
+        -- Returns the PNG of a graph made by render
 
+Global variables:
+    IMAGES: evaluator.cache.LRUCache
+        -- The PNGs made by render and their error messages, by name
+    IMAGE_ROUTE: str
+        -- The location graphs made by render are served from
 """
 
-import evaluator.parser
+import io
+
+import evaluator.cache
+import evaluator.parse_cache
 import evaluator.executor
+import evaluator.render_cache
+
+# Each image is named by what it is a graph of, so one with the same name
+# never needs to be rendered again
+IMAGES = evaluator.cache.LRUCache(256)
+IMAGE_ROUTE = "graph"
 
 
-def evaluate(raw_text, width, height, x_range, y_range):
+def evaluate(raw_text, width, height, x_range, y_range, t_range=None):
     """Evaluates the raw_text and produces a graph
 
     Arguments:
@@ -31,19 +56,107 @@ def evaluate(raw_text, width, height, x_range, y_range):
             -- The range of x-values plotted
         y_range: tuple[float, float]
             -- The range of y-values plotted
+        t_range: tuple[float, float] | None (default None)
+            -- The range of t-values parametric curves are plotted over, or
+               None for the default
 
     Returns:
         path: str
             -- The location of the graph produced
     """
-    # Create a parser for the raw text and parse it
+    # Parse the raw text, reusing any lines that have been parsed before
     try:
-        parser = evaluator.parser.Parser(raw_text)
-        execution_trees = parser.parse()
+        execution_trees = evaluator.parse_cache.CACHE.parse(raw_text)
     except Exception:
         return "static/default.png", "Something went wrong in parsing"
     # Creates an executor from the parsed statements
     executor = evaluator.executor.Executor(execution_trees)
 
     # Returns the location of the graph produced when this is executed
-    return executor.graph(width, height, x_range, y_range)
+    return executor.graph(width, height, x_range, y_range, t_range)
+
+
+def render(raw_text, width, height, x_range, y_range, t_range=None):
+    """Evaluates the raw_text and produces a graph, kept in memory
+
+    The graph is named by a hash of the source, the size and the ranges, so
+    a graph which has already been rendered is not rendered again and the
+    name can be cached by the browser for as long as it likes. Graphs are
+    also kept in the render cache on disk, so they are still found after a
+    restart.
+
+    Arguments:
+        raw_text: str
+            -- The raw text to be parsed
+        width: int
+            -- The width of the graph in pixels
+        height: int
+            -- The height of the graph in pixels
+        x_range: tuple[float, float]
+            -- The range of x-values plotted
+        y_range: tuple[float, float]
+            -- The range of y-values plotted
+        t_range: tuple[float, float] | None (default None)
+            -- The range of t-values parametric curves are plotted over, or
+               None for the default
+
+    Returns:
+        path: str
+            -- The location of the graph produced
+        error_message: str
+            -- What went wrong, if anything
+    """
+    name = evaluator.render_cache.get_key(raw_text, width, height, x_range,
+                                          y_range, t_range)
+    cached = _get_cached(name)
+    if cached is None:
+        try:
+            execution_trees = evaluator.parse_cache.CACHE.parse(raw_text)
+        except Exception:
+            return "static/default.png", "Something went wrong in parsing"
+        executor = evaluator.executor.Executor(execution_trees)
+        buffer = io.BytesIO()
+        _, error_message = executor.graph(width, height, x_range, y_range,
+                                          t_range, buffer)
+        cached = (buffer.getvalue(), error_message)
+        IMAGES.put(name, cached)
+        evaluator.render_cache.CACHE.put(name, cached)
+    return f"{IMAGE_ROUTE}/{name}.png", cached[1]
+
+
+def get_image(name):
+    """Gets the PNG of a graph made by render
+
+    Arguments:
+        name: str
+            -- The name of the graph, without its extension
+
+    Returns:
+        image: bytes | None
+            -- The PNG, or None if there is no graph with that name
+    """
+    cached = _get_cached(name)
+    if cached is None:
+        return None
+    return cached[0]
+
+
+def _get_cached(name):
+    """Gets a graph made by render from memory, or from the render cache
+
+    Arguments:
+        name: str
+            -- The name of the graph
+
+    Returns:
+        graph: tuple[bytes, str] | None
+            -- The PNG and the error message from rendering it, or None if
+               it is in neither
+    """
+    cached = IMAGES.get(name)
+    if cached is None:
+        cached = evaluator.render_cache.CACHE.get(name)
+        if cached is None:
+            return None
+        IMAGES.put(name, cached)
+    return cached
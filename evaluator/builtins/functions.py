@@ -1,30 +1,33 @@
 import builtins
+import contextvars
 
 import evaluator.builtins.types
+import evaluator.dual
 import evaluator.execution_tree
 
 import numpy as np
 
-OPERATORS = {'i': evaluator.builtins.types.Number(1j),
-             'pi': evaluator.builtins.types.Number(np.pi),
-             'e': evaluator.builtins.types.Number(np.e)}
+OPERATORS = {'i': 1j, 'pi': np.pi, 'e': np.e}
 
-executor = None
+# The executor evaluating the current statement
+EXECUTOR = contextvars.ContextVar('executor')
 
 def validate_type(input_type):
+    # Every argument must be of the type
     def _validate(function):
-        def validated_function(var_in):
-            if isinstance(var_in, input_type):
-                return function(var_in)
-            else:
-                raise ValueError
+        def validated_function(*var_in):
+            for var in var_in:
+                if not isinstance(var, input_type):
+                    raise ValueError
+            return function(*var_in)
         return validated_function
     return _validate
 
 
-def builtin_func(name, operator=None):
+def builtin_func(name, operator=None, vectorised=None, arity=1):
     def _builtin(function):
-        out = evaluator.builtins.types.Builtin(function, name)
+        out = evaluator.builtins.types.Builtin(function, name, vectorised,
+                                               arity)
         if operator is None:
             OPERATORS[name] = out
         else:
@@ -34,262 +37,586 @@ def builtin_func(name, operator=None):
     return _builtin
 
 
-@builtin_func("add", '+')
-@validate_type(evaluator.builtins.types.Number)
-def add(x):
-    @validate_type(evaluator.builtins.types.Number)
-    def partial_add(y):
-        return evaluator.builtins.types.Number(x.value + y.value)
+@builtin_func("add", '+', vectorised=np.add, arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def add(x, y):
+    return x + y
 
-    return evaluator.builtins.types.Builtin(partial_add)
 
+@builtin_func("sub", '-', vectorised=np.subtract, arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def sub(x, y):
+    return x - y
 
-@builtin_func("sub", '-')
-@validate_type(evaluator.builtins.types.Number)
-def sub(x):
-    @validate_type(evaluator.builtins.types.Number)
-    def partial_sub(y):
-        return evaluator.builtins.types.Number(x.value - y.value)
 
-    return evaluator.builtins.types.Builtin(partial_sub)
+@builtin_func("mul", '*', vectorised=np.multiply, arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def mul(x, y):
+    return x * y
 
 
-@builtin_func("mul", '*')
-@validate_type(evaluator.builtins.types.Number)
-def mul(x):
-    @validate_type(evaluator.builtins.types.Number)
-    def partial_mul(y):
-        return evaluator.builtins.types.Number(x.value * y.value)
+@builtin_func("div", '/', vectorised=np.divide, arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def div(x, y):
+    return x / y
 
-    return evaluator.builtins.types.Builtin(partial_mul)
 
-
-@builtin_func("div", '/')
-@validate_type(evaluator.builtins.types.Number)
-def div(x):
-    @validate_type(evaluator.builtins.types.Number)
-    def partial_div(y):
-        return evaluator.builtins.types.Number(x.value / y.value)
-
-    return evaluator.builtins.types.Builtin(partial_div)
-
-
-@builtin_func("neg", 'negate')
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("neg", 'negate', vectorised=np.negative)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def neg(x):
-    return evaluator.builtins.types.Number(-x.value)
+    return -x
 
 
-@builtin_func("pow", '^')
-@validate_type(evaluator.builtins.types.Number)
-def pow_(x):
-    @validate_type(evaluator.builtins.types.Number)
-    def partial_pow(y):
-        return evaluator.builtins.types.Number(x.value ** y.value)
-    return evaluator.builtins.types.Builtin(partial_pow)
+@builtin_func("pow", '^', vectorised=np.power, arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def pow_(x, y):
+    return x ** y
 
 
-@builtin_func("ignore")
+@builtin_func("ignore", vectorised=lambda x: x)
 def ignore(x):
     return x
 
 
-@builtin_func("cos")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("cos", vectorised=np.cos)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def cos(x):
-    return evaluator.builtins.types.Number(np.cos(x.value))
+    return np.cos(x)
 
 
-@builtin_func("sin")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("sin", vectorised=np.sin)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def sin(x):
-    return evaluator.builtins.types.Number(np.sin(x.value))
+    return np.sin(x)
 
 
-@builtin_func("tan")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("tan", vectorised=np.tan)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def tan(x):
-    return evaluator.builtins.types.Number(np.tan(x.value))
+    return np.tan(x)
 
 
-@builtin_func("acos")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("acos", vectorised=np.arccos)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def acos(x):
-    return evaluator.builtins.types.Number(np.arccos(x.value))
+    return np.arccos(x)
 
 
-@builtin_func("asin")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("asin", vectorised=np.arcsin)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def asin(x):
-    return evaluator.builtins.types.Number(np.arcsin(x.value))
+    return np.arcsin(x)
 
 
-@builtin_func("atan")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("atan", vectorised=np.arctan)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def atan(x):
-    return evaluator.builtins.types.Number(np.arctan(x.value))
+    return np.arctan(x)
 
 
-@builtin_func("cosh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("cosh", vectorised=np.cosh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def cosh(x):
-    return evaluator.builtins.types.Number(np.cosh(x.value))
+    return np.cosh(x)
 
 
-@builtin_func("sinh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("sinh", vectorised=np.sinh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def sinh(x):
-    return evaluator.builtins.types.Number(np.sinh(x.value))
+    return np.sinh(x)
 
 
-@builtin_func("tanh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("tanh", vectorised=np.tanh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def tanh(x):
-    return evaluator.builtins.types.Number(np.tanh(x.value))
+    return np.tanh(x)
 
 
-@builtin_func("acosh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("acosh", vectorised=np.arccosh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def acosh(x):
-    return evaluator.builtins.types.Number(np.arccosh(x.value))
+    return np.arccosh(x)
 
 
-@builtin_func("asinh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("asinh", vectorised=np.arcsinh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def asinh(x):
-    return evaluator.builtins.types.Number(np.arcsinh(x.value))
+    return np.arcsinh(x)
 
 
-@builtin_func("atanh")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("atanh", vectorised=np.arctanh)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def atanh(x):
-    return evaluator.builtins.types.Number(np.arctan(x.value))
+    return np.arctanh(x)
 
 
-@builtin_func("ln")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("ln", vectorised=np.log)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def ln(x):
-    return evaluator.builtins.types.Number(np.log(x.value))
+    return np.log(x)
 
 
-@builtin_func("log10", "log")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("log10", "log", vectorised=np.log10)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def log10(x):
-    return evaluator.builtins.types.Number(np.log10(x.value))
-
-
-@builtin_func("log", "_log")
-@validate_type(evaluator.builtins.types.Number)
-def loga(a):
-    @validate_type(evaluator.builtins.types.Number)
-    def log_ab(x):
-        return evaluator.builtins.types.Number(np.log(x.value)/np.log(a.value))
+    return np.log10(x)
 
-    return evaluator.builtins.types.Builtin(log_ab)
 
+@builtin_func("log", "_log", vectorised=lambda a, x: np.log(x) / np.log(a),
+              arity=2)
+@validate_type(evaluator.builtins.types.NUMBERS)
+def loga(a, x):
+    return np.log(x)/np.log(a)
 
-@builtin_func("underscore", "_")
-def underscore(a):
-    def _underscore(b):
-        if a.name == 'log10' and isinstance(b, evaluator.builtins.types.Number):
-            return loga.apply(b)
-        else:
-            raise ValueError
-
-    return evaluator.builtins.types.Builtin(_underscore)
 
+@builtin_func("underscore", "_", arity=2)
+def underscore(a, b):
+    if (isinstance(a, evaluator.builtins.types.Builtin) and a.name == 'log10'
+            and isinstance(b, evaluator.builtins.types.NUMBERS)):
+        return loga.apply(b)
+    else:
+        raise ValueError
 
-@builtin_func("tuple", ',')
-def tuple_(x):
-    def partial_tuple(y):
-        return evaluator.builtins.types.Tuple(x, y)
 
-    return evaluator.builtins.types.Builtin(partial_tuple)
+@builtin_func("tuple", ',', vectorised=evaluator.builtins.types.join, arity=2)
+def tuple_(x, y):
+    return evaluator.builtins.types.join(x, y)
 
 
-@builtin_func("sqrt")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("sqrt", vectorised=np.sqrt)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def sqrt(x):
-    return evaluator.builtins.types.Number(np.sqrt(x.value))
+    return np.sqrt(x)
+
+
+# The positive nodes of the 15 point Kronrod rule on [-1, 1] with their
+# weights, and the weights of the 7 point Gauss rule sharing every other node
+_KRONROD_HALF_NODES = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.0])
+_KRONROD_HALF_WEIGHTS = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+_GAUSS_HALF_WEIGHTS = np.array([
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327])
+
+KRONROD_NODES = np.concatenate((-_KRONROD_HALF_NODES,
+                                _KRONROD_HALF_NODES[-2::-1]))
+KRONROD_WEIGHTS = np.concatenate((_KRONROD_HALF_WEIGHTS,
+                                  _KRONROD_HALF_WEIGHTS[-2::-1]))
+GAUSS_WEIGHTS = np.zeros(15)
+GAUSS_WEIGHTS[1::2] = np.concatenate((_GAUSS_HALF_WEIGHTS,
+                                      _GAUSS_HALF_WEIGHTS[-2::-1]))
+
+INTEGRATE_TOLERANCE = 1e-10
+INTEGRATE_MAX_EVALUATIONS = 15 * 2000
+
+
+def gauss_kronrod(function, low, high, tolerance=INTEGRATE_TOLERANCE):
+    # Adaptive 7-15 point Gauss-Kronrod quadrature. Every interval still to
+    # be refined is halved at once and all of their nodes are evaluated in a
+    # single call of function, which takes and returns an array. An interval
+    # is accepted once the difference between its Gauss and Kronrod
+    # estimates is within its share of the tolerance, so smooth integrands
+    # stop after the first 15 evaluations. Returns the integral and the
+    # number of evaluations made.
+    length = abs(high - low)
+    if length == 0:
+        return 0.0, 0
+
+    lows = np.array([low])
+    highs = np.array([high])
+    accepted = 0
+    evaluations = 0
+    while lows.size:
+        centres = (lows + highs) / 2
+        half_widths = (highs - lows) / 2
+        points = centres[:, None] + half_widths[:, None] * KRONROD_NODES
+        values = np.reshape(function(points.ravel()), points.shape)
+        evaluations += points.size
+
+        kronrod = half_widths * (values @ KRONROD_WEIGHTS)
+        errors = np.abs(kronrod - half_widths * (values @ GAUSS_WEIGHTS))
+
+        total = accepted + np.sum(kronrod)
+        allowed = (tolerance * max(1.0, abs(total))
+                   * np.abs(highs - lows) / length)
+        # Non-finite errors cannot be improved by refining
+        refine = errors > allowed
+        if (evaluations + 2 * np.count_nonzero(refine) * 15
+                > INTEGRATE_MAX_EVALUATIONS):
+            refine[:] = False
+        # Intervals too small to split are accepted as they are
+        refine &= centres + half_widths / 2 != centres
+
+        accepted += np.sum(kronrod[~refine])
+        lows, highs = (np.concatenate((lows[refine], centres[refine])),
+                       np.concatenate((centres[refine], highs[refine])))
+    return accepted, evaluations
 
 
 @builtin_func("integrate")
 @validate_type(evaluator.builtins.types.Tuple)
 def integrate(params):
-    if params.get_length()  != 4:
+    if params.get_length() not in (4, 5):
         raise ValueError
     expression = params.get_item(0)
     identifier = params.get_item(1)
     low = params.get_item(2)
     high = params.get_item(3)
+    if params.get_length() == 5:
+        tolerance = params.get_item(4)
+        if (not isinstance(tolerance, evaluator.builtins.types.NUMBERS)
+                or isinstance(tolerance, evaluator.dual.Dual)
+                or not np.isreal(tolerance)):
+            raise ValueError
+        # A complex number with no imaginary part cannot be compared itself
+        tolerance = float(np.real(tolerance))
+        if not tolerance > 0:
+            raise ValueError
+    else:
+        tolerance = INTEGRATE_TOLERANCE
+
+    if not isinstance(expression,
+                      (evaluator.execution_tree.ExecutionTree._ExecutionTree__Node,
+                       evaluator.builtins.types.UserFunction)):
+        raise ValueError
+    if not isinstance(identifier, evaluator.builtins.types.IdentifierName):
+        raise ValueError
+    if not isinstance(low, evaluator.builtins.types.NUMBERS):
+        raise ValueError
+    if not isinstance(high, evaluator.builtins.types.NUMBERS):
+        raise ValueError
+
+    if _captures_dual(expression):
+        raise ValueError
+
+    executor = EXECUTOR.get()
+
+    def function(points):
+        values, _ = executor.evaluate_array(expression, points,
+                                            identifier.name.item)
+        return values
+
+    limits = [limit.value if isinstance(limit, evaluator.dual.Dual) else limit
+              for limit in (low, high)]
+    integral, _ = gauss_kronrod(function, *limits, tolerance)
+
+    if isinstance(low, evaluator.dual.Dual) or isinstance(high,
+                                                          evaluator.dual.Dual):
+        # The limits depend on the variable of an enclosing derivative, so by
+        # the fundamental theorem of calculus
+        ends = function(np.array(limits))
+        derivative = 0
+        if isinstance(high, evaluator.dual.Dual):
+            derivative = derivative + ends[1] * high.derivative
+        if isinstance(low, evaluator.dual.Dual):
+            derivative = derivative - ends[0] * low.derivative
+        integral = evaluator.dual.Dual(integral, derivative)
+    return integral
+
+
+# The most values of a summand evaluated in one pass, to bound the memory used
+# by long series
+SERIES_CHUNK = 1 << 20
+# The most terms a series may have, so one cannot take hours to evaluate
+SERIES_MAX_TERMS = 1 << 20
+
+
+def _series(params, ufunc):
+    # Reduces a function over a range of integers with ufunc, evaluating it
+    # over the whole range at once
+    if params.get_length() != 4:
+        raise ValueError
+    expression, identifier, low, high = params.items
 
     if not isinstance(expression,
-                      evaluator.execution_tree.ExecutionTree._ExecutionTree__Node):
+                      (evaluator.execution_tree.ExecutionTree._ExecutionTree__Node,
+                       evaluator.builtins.types.UserFunction)):
         raise ValueError
     if not isinstance(identifier, evaluator.builtins.types.IdentifierName):
         raise ValueError
-    if not isinstance(low, evaluator.builtins.types.Number):
+    low, high = get_range(low, high)
+    if high - low + 1 > SERIES_MAX_TERMS:
         raise ValueError
-    if not isinstance(high, evaluator.builtins.types.Number):
+
+    if _captures_dual(expression):
         raise ValueError
 
-    total = 0
+    executor = EXECUTOR.get()
+    result = float(ufunc.identity)
+    for start in range(low, high + 1, SERIES_CHUNK):
+        terms = np.arange(start, min(start + SERIES_CHUNK, high + 1),
+                          dtype=float)
+        values, _ = executor.evaluate_array(expression, terms,
+                                            identifier.name.item)
+        result = ufunc(result, ufunc.reduce(values))
+    return result
+
+
+def get_range(low, high):
+    # The limits of a series must be integers
+    limits = []
+    for limit in (low, high):
+        if (not isinstance(limit, evaluator.builtins.types.NUMBERS)
+                or isinstance(limit, evaluator.dual.Dual)
+                or not np.isreal(limit)
+                or not float(np.real(limit)).is_integer()):
+            raise ValueError
+        limits.append(int(np.real(limit)))
+    return limits
+
 
-    dx = (high.value - low.value)/300
+@builtin_func("sum")
+@validate_type(evaluator.builtins.types.Tuple)
+def sum_(params):
+    return _series(params, np.add)
 
-    for x in np.linspace(low.value, high.value, 300):
-        result = executor.evaluate_function(expression, x, identifier.name.item)
-        total += result
 
-    total *= 2
-    total -= executor.evaluate_function(expression, low.value,
-                                        identifier.name.item)
-    total -= executor.evaluate_function(expression, high.value,
-                                        identifier.name.item)
-    integral = total * dx/2
-    return evaluator.builtins.types.Number(integral)
+@builtin_func("prod")
+@validate_type(evaluator.builtins.types.Tuple)
+def prod(params):
+    return _series(params, np.multiply)
+
+
+# The builtins reducing a function over a range of integers, by the ufunc
+# they reduce with
+SERIES = {sum_: np.add, prod: np.multiply}
+
+
+SOLVE_SAMPLES = 1000
+SOLVE_TOLERANCE = 1e-12
+SOLVE_MAX_ITERATIONS = 100
+
+
+def brent(function, lows, highs, tolerance=SOLVE_TOLERANCE, values=None):
+    # Brent's method, refining every bracket at once. Each bracket's ends
+    # must have values of opposite signs, which are evaluated unless they
+    # are given as values. Each iteration takes an inverse quadratic or
+    # secant step where it is safe to and a bisection step otherwise,
+    # evaluating one point for every bracket still being refined in a single
+    # call of function. It takes an array of points and the indices of the
+    # brackets they are in, and returns an array. Returns the roots and the
+    # values at them.
+    a = np.array(lows, dtype=float)
+    b = np.array(highs, dtype=float)
+    if values is None:
+        indices = np.arange(b.size)
+        values = function(a, indices), function(b, indices)
+    fa, fb = (np.real(value).astype(float) for value in values)
+    c, fc = b.copy(), fb.copy()
+    d = e = np.zeros(b.shape)
+    active = np.ones(b.shape, dtype=bool)
+    with np.errstate(all='ignore'):
+        for _ in range(SOLVE_MAX_ITERATIONS):
+            # c is kept on the other side of the root from b
+            moved = np.sign(fb) == np.sign(fc)
+            c = np.where(moved, a, c)
+            fc = np.where(moved, fa, fc)
+            d = np.where(moved, b - a, d)
+            e = np.where(moved, b - a, e)
+            # and b is the better estimate
+            swap = np.abs(fc) < np.abs(fb)
+            a, b, c = np.where(swap, b, a), np.where(swap, c, b), np.where(
+                swap, b, c)
+            fa, fb, fc = np.where(swap, fb, fa), np.where(swap, fc, fb), \
+                np.where(swap, fb, fc)
+
+            bound = 2 * np.finfo(float).eps * np.abs(b) + tolerance / 2
+            middle = (c - b) / 2
+            active &= (np.abs(middle) > bound) & (fb != 0)
+            if not active.any():
+                break
+
+            s = fb / fa
+            secant = a == c
+            q, r = fa / fc, fb / fc
+            p = np.where(secant, 2 * middle * s,
+                         s * (2 * middle * q * (q - r) - (b - a) * (r - 1)))
+            q = np.where(secant, 1 - s, (q - 1) * (r - 1) * (s - 1))
+            q = np.where(p > 0, -q, q)
+            p = np.abs(p)
+            interpolate = ((np.abs(e) >= bound) & (np.abs(fa) > np.abs(fb))
+                           & (2 * p < np.minimum(3 * middle * q
+                                                 - np.abs(bound * q),
+                                                 np.abs(e * q))))
+            e = np.where(interpolate, d, middle)
+            d = np.where(interpolate, p / q, middle)
+
+            a, fa = b.copy(), fb.copy()
+            b = np.where(active, b + np.where(np.abs(d) > bound, d,
+                                              np.copysign(bound, middle)), b)
+            fb[active] = np.real(function(b[active], np.nonzero(active)[0]))
+    return b, fb
+
+
+def find_roots(function, low, high, samples=SOLVE_SAMPLES,
+               tolerance=SOLVE_TOLERANCE):
+    # Every root of function between low and high, found by evaluating it
+    # at evenly spaced samples in one call and refining each change of sign
+    # with brent. Sign changes across poles are refined too, but the value
+    # grows rather than shrinks towards a pole so they are left out.
+    points = np.linspace(low, high, samples)
+    values = np.real(function(points))
+    exact = points[values == 0]
+    changes = np.nonzero(np.sign(values[:-1]) * np.sign(values[1:]) < 0)[0]
+    if changes.size == 0:
+        return exact
+    roots, ends = brent(lambda points, _: function(points), points[changes],
+                        points[changes + 1],
+                        tolerance * max(1.0, abs(high - low)),
+                        (values[changes], values[changes + 1]))
+    roots = roots[np.abs(ends) <= np.maximum(np.abs(values[changes]),
+                                             np.abs(values[changes + 1]))]
+    return np.sort(np.concatenate((exact, roots)))
+
+
+@builtin_func("solve")
+@validate_type(evaluator.builtins.types.Tuple)
+def solve(params):
+    # The smallest root of the expression between the limits
+    if params.get_length() != 4:
+        raise ValueError
+    expression, identifier, low, high = params.items
 
+    if not isinstance(expression,
+                      (evaluator.execution_tree.ExecutionTree._ExecutionTree__Node,
+                       evaluator.builtins.types.UserFunction)):
+        raise ValueError
+    if not isinstance(identifier, evaluator.builtins.types.IdentifierName):
+        raise ValueError
+    for limit in (low, high):
+        if (not isinstance(limit, evaluator.builtins.types.NUMBERS)
+                or isinstance(limit, evaluator.dual.Dual)
+                or not np.isreal(limit)):
+            raise ValueError
 
-@builtin_func("re")
-@validate_type(evaluator.builtins.types.Number)
+    if _captures_dual(expression):
+        raise ValueError
+
+    executor = EXECUTOR.get()
+
+    def function(points):
+        values, _ = executor.evaluate_array(expression, points,
+                                            identifier.name.item)
+        return values
+
+    roots = find_roots(function, float(np.real(low)), float(np.real(high)))
+    if roots.size == 0:
+        raise ValueError
+    return roots[0]
+
+
+@builtin_func("re", vectorised=np.real)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def real(x):
-    return evaluator.builtins.types.Number(np.real(x.value))
+    return np.real(x)
 
 
-@builtin_func("im")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("im", vectorised=np.imag)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def imag(x):
-    return evaluator.builtins.types.Number(np.imag(x.value))
+    return np.imag(x)
 
 
-@builtin_func("conj")
-@validate_type(evaluator.builtins.types.Number)
+@builtin_func("conj", vectorised=np.conj)
+@validate_type(evaluator.builtins.types.NUMBERS)
 def conj(x):
-    return evaluator.builtins.types.Number(np.conj(x.value))
+    return np.conj(x)
 
 
 @builtin_func("differentiate")
 @validate_type(evaluator.builtins.types.Tuple)
 def differentiate(params):
-    if params.get_length() != 3:
+    if params.get_length() not in (2, 3):
         raise ValueError
 
     expression = params.get_item(0)
     identifier = params.get_item(1)
-    value = params.get_item(2)
     if not isinstance(expression,
-                      evaluator.execution_tree.ExecutionTree._ExecutionTree__Node):
+                      (evaluator.execution_tree.ExecutionTree._ExecutionTree__Node,
+                       evaluator.builtins.types.UserFunction)):
         raise ValueError
     if not isinstance(identifier, evaluator.builtins.types.IdentifierName):
         raise ValueError
-    if not isinstance(value, evaluator.builtins.types.Number):
+    if params.get_length() == 2:
+        return _derivative(expression, identifier)
+
+    value = params.get_item(2)
+    if not isinstance(value, evaluator.builtins.types.NUMBERS):
+        raise ValueError
+    return _differentiate_at(expression, identifier, value)
+
+
+def _derivative(expression, identifier):
+    # The derivative as a function, built symbolically so it can be
+    # evaluated like any other function. Anything that cannot be
+    # differentiated symbolically is differentiated at each point instead.
+    executor = EXECUTOR.get()
+    if isinstance(expression, evaluator.builtins.types.UserFunction):
+        definition = expression.definition
+        node, variable = definition.expr, definition.identifier.name.item
+        scope, frame = expression.scope, expression.frame
+    elif expression.is_funcdef() and expression.identifier.is_identifier():
+        node, variable = expression.expr, expression.identifier.name.item
+        scope, frame = (), ()
+    else:
+        node, variable = expression, identifier.name.item
+        scope, frame = (), ()
+
+    try:
+        tree = executor.differentiator.differentiate(node, variable, scope,
+                                                     frame)
+    except ValueError:
+        @validate_type(evaluator.builtins.types.NUMBERS)
+        def derivative(value):
+            return _differentiate_at(expression, identifier, value)
+        return evaluator.builtins.types.Builtin(derivative)
+    return executor.compiler.compile(tree.get_root(), scope)(frame)
+
+
+def _differentiate_at(expression, identifier, value):
+    # The derivative at a single point, found with dual numbers
+    if _captures_dual(expression):
+        # The expression depends on the variable of an enclosing derivative
+        # in a way that cannot be followed, so that derivative is found
+        # numerically instead
         raise ValueError
 
-    dx = 0.0000001
-    result = (executor.evaluate_function(expression,
-                                         value.value,
-                                         identifier.name.item) -
-              executor.evaluate_function(expression,
-                                         value.value - dx,
-                                         identifier.name.item)) / dx
-    return evaluator.builtins.types.Number(result)
\ No newline at end of file
+    executor = EXECUTOR.get()
+    point = value
+    if isinstance(point, evaluator.dual.Dual):
+        point = point.value
+    _, derivative = executor.evaluate_derivative(
+        expression, np.array([point]), identifier.name.item)
+    result = derivative[0]
+
+    if isinstance(value, evaluator.dual.Dual):
+        # The point itself depends on the variable of an enclosing
+        # derivative, which needs the second derivative by the chain rule
+        step = np.cbrt(np.finfo(float).eps) * max(1, abs(point))
+        _, derivatives = executor.evaluate_derivative(
+            expression, np.array([point - step, point + step]),
+            identifier.name.item)
+        second = (derivatives[1] - derivatives[0]) / (2 * step)
+        result = evaluator.dual.Dual(result, second * value.derivative)
+    return result
+
+
+def _captures_dual(expression):
+    # Whether a function captured a dual number, directly or through the
+    # functions it captured
+    stack = [expression]
+    while stack:
+        function = stack.pop()
+        if isinstance(function, evaluator.builtins.types.UserFunction):
+            for value in function.frame:
+                if isinstance(value, evaluator.dual.Dual):
+                    return True
+                stack.append(value)
+    return False
@@ -1,3 +1,14 @@
+import functools
+
+import numpy as np
+
+import evaluator.dual
+
+# Numbers are not boxed, so a value of any of these types is a number. Other
+# values are told apart by their classes below.
+NUMBERS = (int, float, complex, np.number, evaluator.dual.Dual)
+
+
 class Function:
     def __init__(self):
         pass
@@ -6,33 +17,46 @@ class Function:
         return Function()
 
 
-class Number(Function):
-    def __init__(self, value):
-        self.value = value
+class Builtin(Function):
+    def __init__(self, func, name=None, vectorised=None, arity=1):
+        # func takes all arity arguments at once. Applying fewer gives a
+        # builtin waiting for the rest.
+        self.func = func
+        self.name = name
+        # The NumPy equivalent taking every argument at once, if there is one
+        self.vectorised = vectorised
+        self.arity = arity
         super().__init__()
 
     def apply(self, parameter):
-        if isinstance(parameter, Number):
-            return Number(self.value * parameter.value)
+        if self.arity == 1:
+            return self.func(parameter)
+        return Builtin(functools.partial(self.func, parameter),
+                       arity=self.arity - 1)
 
     def __repr__(self):
-        return f"{self.value}"
+        if self.name is None:
+            return f"<Builtin {getattr(self.func, '__name__', 'partial')}>"
+        else:
+            return f"<Builtin {self.name}>"
 
 
-class Builtin(Function):
-    def __init__(self, func, name=None):
-        self.func = func
-        self.name = name
+class UserFunction(Function):
+    def __init__(self, definition, body, frame, scope=()):
+        # body is the compiled expression of the definition, and frame holds
+        # the variables bound where the function was defined, named by scope
+        self.definition = definition
+        self.body = body
+        self.frame = frame
+        self.scope = scope
         super().__init__()
 
     def apply(self, parameter):
-        return self.func(parameter)
+        # The parameter takes the next slot after the captured variables
+        return self.body(self.frame + (parameter,))
 
     def __repr__(self):
-        if self.name is None:
-            return f"<Builtin {self.func.__name__}>"
-        else:
-            return f"<Builtin {self.name}>"
+        return f"<Function {self.definition}>"
 
 
 class IdentifierName(Function):
@@ -45,60 +69,31 @@ class IdentifierName(Function):
 
 
 class Tuple(Function):
-    def __init__(self, item1=None, item2=None):
-        self.item1 = item1
-        self.item2 = item2
+    def __init__(self, *items):
+        # The items are held flat, so the length and any item are found
+        # without walking a chain of pairs
+        self.items = items
         super().__init__()
 
-    def pre_add_item(self, item):
-        if self.item2 is None:
-            self.item2 = self.item1
-            self.item1 = item
-        else:
-            self.item2 = Tuple(self.item1, self.item2)
-            self.item1 = item
-
-    def add_item(self, item):
-        if isinstance(item, Tuple):
-            if self.item1 is None:
-                self.item1 = item.item1
-                self.item2 = item.item2
-            elif self.item2 is None:
-                self.item2 = item
-            elif isinstance(self.item2, Tuple):
-                self.item2.add_item(item)
-            else:
-                self.item2 = Tuple(self.item2, item)
-
-        if self.item1 is None:
-            self.item1 = item
-        elif self.item2 is None:
-            self.item2 = item
-        elif isinstance(self.item2, Tuple):
-            self.item2.add_item(item)
-        else:
-            self.item2 = Tuple(self.item2, item)
-
     def get_item(self, index):
-        length = self.get_length()
-        if index >= length or index <= -1:
+        if index >= len(self.items) or index <= -1:
             return None
-        elif length <= 2 and index == 1:
-            return self.item2
-        elif length <= 2 and index == 0:
-            return self.item1
-        elif index == length - 1:
-            return self.item2
-        else:
-            return self.item1.get_item(index)
+        return self.items[index]
 
     def get_length(self):
-        if self.item1 is None:
-            if self.item2 is None:
-                return 0
-            else:
-                return 1
-        elif isinstance(self.item1, Tuple):
-            return 1 + self.item1.get_length()
-        else:
-            return 2
+        return len(self.items)
+
+    def __repr__(self):
+        return f"<Tuple {self.items}>"
+
+
+def join(first, second):
+    # The , operator chains to the left, so a tuple on the left is added to
+    # rather than nested
+    if isinstance(first, Tuple):
+        return Tuple(*first.items, second)
+    return Tuple(first, second)
+
+
+# The values a global can have, rather than a definition still to evaluate
+VALUES = NUMBERS + (Function,)
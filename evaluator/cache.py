@@ -0,0 +1,128 @@
+"""A bounded least recently used cache shared by the evaluator's caches
+
+Classes:
+    LRUCache(object)
+        -- A thread safe least recently used cache with hit/miss counters
+"""
+
+import collections
+import threading
+
+
+class LRUCache:
+    """A thread safe least recently used cache with hit/miss counters
+
+    Attributes:
+        max_size: int
+            -- The maximum number of items stored
+        hits: int
+            -- The number of lookups that found an item
+        misses: int
+            -- The number of lookups that did not find an item
+        evictions: int
+            -- The number of items removed to make space for others
+        _items: collections.OrderedDict
+            -- The items, from least to most recently used
+        _lock: threading.RLock
+            -- Held while _items or the counters are changed
+
+    Methods:
+        __init__(max_size: int)
+            -- The initialiser for the class
+
+        get(key: Hashable) -> Any | None
+            -- Gets an item, or None if it is not in the cache
+
+        put(key: Hashable, value: Any) -> None
+            -- Adds an item, evicting the least recently used if full
+
+        clear() -> None
+            -- Removes every item from the cache and resets the counters
+
+        __len__() -> int
+            -- Gets the number of items in the cache
+    """
+    def __init__(self, max_size):
+        """The initialiser for the class
+
+        Arguments:
+            max_size: int
+                -- The maximum number of items stored
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Gets an item, or None if it is not in the cache
+
+        Arguments:
+            key: Hashable
+                -- The key of the item
+
+        Returns:
+            value: Any | None
+                -- The item, or None if it is not in the cache
+        """
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._items.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Adds an item, evicting the least recently used if full
+
+        Arguments:
+            key: Hashable
+                -- The key of the item
+            value: Any
+                -- The item, which must not be None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Removes every item from the cache and resets the counters
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        """Gets the number of items in the cache
+
+        Arguments:
+            None
+
+        Returns:
+            length: int
+                -- The number of items in the cache
+        """
+        return len(self._items)
+
+    def __repr__(self):
+        return (f"<{type(self).__name__} {len(self)}/{self.max_size}, "
+                f"{self.hits} hits, {self.misses} misses, "
+                f"{self.evictions} evictions>")
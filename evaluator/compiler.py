@@ -0,0 +1,556 @@
+"""Compiles execution trees into nested Python closures
+
+Each node becomes a closure taking the variables bound by enclosing
+functions. Literals are parsed, globals are looked up and builtins are bound
+when the closure is made, so evaluating it never has to inspect the tree.
+
+Scopes are resolved as the tree is compiled. The variables bound around a
+node are a flat frame, a tuple holding the variables given to
+Compiler.compile followed by the parameter of each enclosing function from
+the outermost inwards, so every local variable is read from a slot in the
+frame fixed at compile time.
+
+Any call using none of the variables in its frame is folded: it is computed
+the first time it is needed and its value is reused from then on. Identical
+subtrees share one folded value, so a constant that appears in several
+places or statements is only computed once per executor.
+
+Classes:
+    Compiler(object)
+        -- Compiles the nodes of an executor's trees into closures
+"""
+
+import re
+
+import evaluator.operators
+import evaluator.builtins.functions
+import evaluator.builtins.types
+import evaluator.execution_tree
+
+
+class Compiler:
+    """Compiles the nodes of an executor's trees into closures
+
+    A compiled node is a function taking the frame of variables in scope
+    and returning the value of the node, exactly as the node would be
+    evaluated by walking the tree. As the globals cannot change once the
+    executor is made, each node is only compiled once.
+
+    Attributes:
+        executor: evaluator.executor.Executor
+            -- The executor whose globals are used
+        __compiled: dict[tuple[evaluator.execution_tree.ExecutionTree.__Node,
+                               tuple[str, ...]], Callable]
+            -- The compiled nodes, by node and the variables in scope
+        __folded: dict[int, Callable[[tuple], Any]]
+            -- The compiled constant subtrees, by their optimiser key
+        __constants: dict[int, Any]
+            -- The values of the constant subtrees computed so far
+
+    Methods:
+        __init__(executor: evaluator.executor.Executor)
+            -- The initialiser for the class
+
+        compile(node: evaluator.execution_tree.ExecutionTree.__Node,
+                variables: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Gets the compiled form of a node
+
+        evaluate_constant(
+                node: evaluator.execution_tree.ExecutionTree.__Node) -> Any
+            -- Gets the value of a node which uses no variables
+
+        __compile_node(node: evaluator.execution_tree.ExecutionTree.__Node,
+                       scope: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Compiles a node with the given variables in scope
+
+        __compile_constant(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall)
+                -> Callable[[tuple], Any]
+            -- Compiles a call which uses no variables so is computed once
+
+        __compile_identifier(
+                node: evaluator.execution_tree.ExecutionTree.__Identifier,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Compiles a literal or variable
+
+        __compile_call(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Compiles applying a function to a parameter
+
+        __compile_saturated(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any] | None
+            -- Compiles a call giving a builtin all of its arguments
+
+        __compile_chain(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Compiles a chain of calls of builtins taking two arguments
+
+        __compile_series(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any] | None
+            -- Compiles a sum or product of an expression in a quoted variable
+
+        __compile_tuple(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any] | None
+            -- Compiles a chain of the , operator into one tuple
+
+        __compile_definition(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionDef,
+                scope: tuple[str, ...]) -> Callable[[tuple], Any]
+            -- Compiles an anonymous function
+    """
+    def __init__(self, executor):
+        """The initialiser for the class
+
+        Arguments:
+            executor: evaluator.executor.Executor
+                -- The executor whose globals are used
+        """
+        self.executor = executor
+        self.__compiled = {}
+        self.__folded = {}
+        self.__constants = {}
+
+    def compile(self, node, variables=()):
+        """Gets the compiled form of a node
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node to compile
+            variables: tuple[str, ...] (default ())
+                -- The variables that will be bound when it is evaluated
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- A function taking the values of the variables, in the same
+                   order, and returning the value of the node
+        """
+        key = (node, variables)
+        compiled = self.__compiled.get(key)
+        if compiled is None:
+            compiled = self.__compile_node(node, variables)
+            self.__compiled[key] = compiled
+        return compiled
+
+    def evaluate_constant(self, node):
+        """Gets the value of a node which uses no variables
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node, which must use none of the variables around it
+
+        Returns:
+            value: Any
+                -- The value of the node
+        """
+        if node.is_function_call():
+            return self.__compile_constant(node)(())
+        return self.compile(node)(())
+
+    def __compile_node(self, node, scope):
+        """Compiles a node with the given variables in scope
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node
+        """
+        if node.is_function_call():
+            if self.executor.optimiser.is_constant(node, scope):
+                return self.__compile_constant(node)
+            return self.__compile_call(node, scope)
+        elif node.is_identifier():
+            return self.__compile_identifier(node, scope)
+        else:
+            return self.__compile_definition(node, scope)
+
+    def __compile_constant(self, node):
+        """Compiles a call which uses no variables so is computed once
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node, which ignores the frame it is given
+        """
+        key = self.executor.optimiser.get_key(node)
+        constant = self.__folded.get(key)
+        if constant is not None:
+            return constant
+
+        # Identical subtrees share the key, so only one of them is compiled
+        call = self.__compile_call(node, ())
+
+        def constant(frame):
+            try:
+                return self.__constants[key]
+            except KeyError:
+                value = self.__constants[key] = call(())
+                return value
+
+        self.__folded[key] = constant
+        return constant
+
+    def __compile_identifier(self, node, scope):
+        """Compiles a literal or variable
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Identifier
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node
+        """
+        name = node.name.item
+        if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX, name):
+            value = float(name)
+            return lambda frame: value
+
+        if name in scope:
+            # The innermost variable with the name shadows any others
+            slot = len(scope) - 1 - scope[::-1].index(name)
+            return lambda frame: frame[slot]
+
+        value = self.executor.globals.get_var(name)
+        if value is None or isinstance(value, evaluator.builtins.types.VALUES):
+            # Unbound identifiers evaluate to themselves
+            if value is None:
+                value = node
+            return lambda frame: value
+
+        # A \let definition, which is only compiled when it is first used as it
+        # may refer to itself
+        compiled = []
+
+        def definition(frame):
+            if not compiled:
+                compiled.append(self.compile(value))
+            return compiled[0](())
+
+        return definition
+
+    def __compile_call(self, node, scope):
+        """Compiles applying a function to a parameter
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node
+        """
+        if (node.function.is_identifier() and node.function.name.item == '"'
+                and '"' not in scope
+                and self.executor.globals.get_var('"') is None):
+            # Quoting an identifier gives its name rather than its value
+            if not node.parameter.is_identifier():
+                def quote(frame):
+                    raise ValueError
+                return quote
+            name = evaluator.builtins.types.IdentifierName(node.parameter.name)
+            return lambda frame: name
+
+        series = self.__compile_series(node, scope)
+        if series is not None:
+            return series
+
+        tupled = self.__compile_tuple(node, scope)
+        if tupled is not None:
+            return tupled
+
+        saturated = self.__compile_saturated(node, scope)
+        if saturated is not None:
+            return saturated
+
+        function = self.__compile_node(node.function, scope)
+        parameter = self.__compile_node(node.parameter, scope)
+
+        def call(frame):
+            value = function(frame)
+            argument = parameter(frame)
+            if isinstance(value, evaluator.builtins.types.UserFunction):
+                return value.apply(argument)
+            elif isinstance(value, evaluator.builtins.types.Function):
+                try:
+                    return value.apply(argument)
+                except ValueError:
+                    # Anything that cannot be applied is left unevaluated
+                    return node
+            elif isinstance(value, evaluator.builtins.types.NUMBERS):
+                # Juxtaposed numbers are multiplied
+                if isinstance(argument, evaluator.builtins.types.NUMBERS):
+                    return value * argument
+                return None
+            raise ValueError
+
+        return call
+
+    def __compile_saturated(self, node, scope):
+        """Compiles a call giving a builtin all of its arguments
+
+        Builtins taking several arguments are curried, so ((+ a) b) would
+        otherwise make a partially applied builtin for every evaluation.
+        Instead, the builtin is given every argument at once.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any] | None
+                -- The compiled node, or None if it is not a call of a
+                   builtin with exactly as many arguments as it takes
+        """
+        calls = [node]
+        head = node.function
+        while head.is_function_call():
+            calls.append(head)
+            head = head.function
+        if not head.is_identifier() or head.name.item in scope:
+            return None
+        builtin = self.executor.globals.get_var(head.name.item)
+        if (not isinstance(builtin, evaluator.builtins.types.Builtin)
+                or builtin.arity < 2 or builtin.arity != len(calls)):
+            return None
+
+        if builtin.arity == 2:
+            return self.__compile_chain(node, scope)
+
+        function = builtin.func
+        arguments = [self.__compile_node(call.parameter, scope)
+                     for call in reversed(calls)]
+
+        def call(frame):
+            values = [argument(frame) for argument in arguments]
+            try:
+                return function(*values)
+            except ValueError:
+                # Anything that cannot be applied is left unevaluated
+                return node
+
+        return call
+
+    def __compile_chain(self, node, scope):
+        """Compiles a chain of calls of builtins taking two arguments
+
+        Operators such as + chain to the left, so a + b + c is
+        ((+ ((+ a) b)) c). Rather than compiling and evaluating the chain
+        recursively, which reaches the recursion limit on long lines, its
+        first arguments are followed down to the start of the chain, and
+        the calls are evaluated in a loop from there.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile, giving a builtin both of its
+                   arguments
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node
+        """
+        # Each call in the chain with the builtin it calls, outermost first
+        calls = []
+        while True:
+            builtin = self.executor.globals.get_var(
+                node.function.function.name.item)
+            calls.append((node, builtin.func))
+            node = node.function.parameter
+            # Tuples and constants are compiled as they would be anywhere
+            # else, and end the chain
+            if not (node.is_function_call()
+                    and node.function.is_function_call()
+                    and node.function.function.is_identifier()
+                    and node.function.function.name.item not in scope
+                    and not self.executor.optimiser.is_constant(node, scope)):
+                break
+            builtin = self.executor.globals.get_var(
+                node.function.function.name.item)
+            if (not isinstance(builtin, evaluator.builtins.types.Builtin)
+                    or builtin.arity != 2
+                    or builtin is evaluator.builtins.functions.tuple_):
+                break
+
+        first = self.__compile_node(node, scope)
+        steps = [(call, function, self.__compile_node(call.parameter, scope))
+                 for call, function in reversed(calls)]
+        if len(steps) == 1:
+            (node, function, second), = steps
+
+            def call(frame):
+                x = first(frame)
+                y = second(frame)
+                try:
+                    return function(x, y)
+                except ValueError:
+                    # Anything that cannot be applied is left unevaluated
+                    return node
+
+            return call
+
+        def chain(frame):
+            value = first(frame)
+            for node, function, second in steps:
+                y = second(frame)
+                try:
+                    value = function(value, y)
+                except ValueError:
+                    value = node
+            return value
+
+        return chain
+
+    def __compile_series(self, node, scope):
+        """Compiles a sum or product of an expression in a quoted variable
+
+        In \\sum(f, \\"n, a, b), where f is an expression rather than a
+        function, f is made into a function of n which captures the frame,
+        so f can use the variables around the series as well as n.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any] | None
+                -- The compiled node, or None if it is not a series of an
+                   expression in a quoted variable
+        """
+        if (not node.function.is_identifier()
+                or node.function.name.item in scope):
+            return None
+        series = self.executor.globals.get_var(node.function.name.item)
+        if (not isinstance(series, evaluator.builtins.types.Builtin)
+                or series not in evaluator.builtins.functions.SERIES):
+            return None
+
+        items = []
+        chain = node.parameter
+        while (chain.is_function_call() and chain.function.is_function_call()
+               and chain.function.function.is_identifier()
+               and chain.function.function.name.item not in scope
+               and self.executor.globals.get_var(
+                   chain.function.function.name.item)
+               is evaluator.builtins.functions.tuple_):
+            items.append(chain.parameter)
+            chain = chain.function.parameter
+        items.append(chain)
+        if len(items) != 4:
+            return None
+        summand, quote, low, high = reversed(items)
+        if not (quote.is_function_call() and quote.function.is_identifier()
+                and quote.function.name.item == '"' and '"' not in scope
+                and self.executor.globals.get_var('"') is None
+                and quote.parameter.is_identifier()):
+            return None
+        name = quote.parameter.name.item
+        if (summand.is_funcdef() or name in scope or name not in
+                self.executor.optimiser.get_free_variables(summand)):
+            return None
+
+        # The summand is not given the definition as its parent, as it is
+        # still part of the tree
+        definition = evaluator.execution_tree.ExecutionTree() \
+            .create_function_def(quote.parameter)
+        definition.expr = summand
+        function = self.__compile_definition(definition, scope)
+        variable = evaluator.builtins.types.IdentifierName(
+            quote.parameter.name)
+        low = self.__compile_node(low, scope)
+        high = self.__compile_node(high, scope)
+
+        def call(frame):
+            parameters = evaluator.builtins.types.Tuple(
+                function(frame), variable, low(frame), high(frame))
+            try:
+                return series.apply(parameters)
+            except ValueError:
+                # Anything that cannot be applied is left unevaluated
+                return node
+
+        return call
+
+    def __compile_tuple(self, node, scope):
+        """Compiles a chain of the , operator into one tuple
+
+        The , operator chains to the left, so (a, b, c) is ((, ((, a) b)) c).
+        Rather than making a tuple for each operator and copying it into the
+        next, every item is evaluated and the tuple is made once.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any] | None
+                -- The compiled node, or None if it is not a call of the ,
+                   operator with both of its arguments
+        """
+        items = []
+        while (node.is_function_call() and node.function.is_function_call()
+               and node.function.function.is_identifier()
+               and node.function.function.name.item not in scope
+               and self.executor.globals.get_var(
+                   node.function.function.name.item)
+               is evaluator.builtins.functions.tuple_):
+            items.append(node.parameter)
+            node = node.function.parameter
+        if not items:
+            return None
+        items.append(node)
+        items = [self.__compile_node(item, scope) for item in reversed(items)]
+        first, rest = items[0], items[1:]
+
+        def build(frame):
+            value = first(frame)
+            values = [item(frame) for item in rest]
+            if isinstance(value, evaluator.builtins.types.Tuple):
+                # A tuple on the left is added to, as by the , operator
+                return evaluator.builtins.types.Tuple(*value.items, *values)
+            return evaluator.builtins.types.Tuple(value, *values)
+
+        return build
+
+    def __compile_definition(self, node, scope):
+        """Compiles an anonymous function
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionDef
+                -- The node to compile
+            scope: tuple[str, ...]
+                -- The variables in each slot of the frame
+
+        Returns:
+            compiled: Callable[[tuple], Any]
+                -- The compiled node, which returns a function value
+        """
+        if not node.identifier.is_identifier():
+            raise ValueError('Functions must take one parameter')
+        body = self.__compile_node(node.expr,
+                                   scope + (node.identifier.name.item,))
+        return lambda frame: evaluator.builtins.types.UserFunction(
+            node, body, frame, scope)
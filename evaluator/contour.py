@@ -0,0 +1,335 @@
+"""Finds the curves where a function of two variables is zero
+
+Marching squares is used. Each edge of a cell whose ends have values of
+opposite signs is crossed by the curve. Each cell joins the edges it crosses
+with one segment, or two if it is a saddle, and the segments are joined into
+polylines through the edges they share. The cells are either a uniform grid,
+or the leaves of a quadtree which is only subdivided near the curve, so the
+number of evaluations grows with the length of the curve rather than the
+area of the canvas. Everything but the final walk along the polylines is
+done over every cell at once.
+
+Functions:
+    march_cells(corners: np.ndarray) -> tuple[np.ndarray, np.ndarray]
+        -- Finds the segments of the curve in each cell
+    march(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray,
+                                       np.ndarray, np.ndarray]
+        -- Finds the edges of a grid crossed by the curve and the segments
+           joining them
+    quadtree(function: Callable, rows: int, columns: int, budget: int,
+             size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray,
+                                 np.ndarray, np.ndarray]
+        -- Finds the edges crossed by the curve and the segments joining
+           them, subdividing cells only near the curve
+    join(segments: np.ndarray, count: int) -> list[np.ndarray]
+        -- Joins segments into polylines through the edges they share
+
+Global variables:
+    BOTTOM: int
+        -- The index of a cell's bottom edge, from its first corner to its
+           second
+    LEFT: int
+        -- The index of a cell's left edge, from its first corner to its
+           third
+    TOP: int
+        -- The index of a cell's top edge, from its third corner to its
+           fourth
+    RIGHT: int
+        -- The index of a cell's right edge, from its second corner to its
+           fourth
+    SIDES: np.ndarray
+        -- The corners at the ends of each edge of a cell
+"""
+
+import numpy as np
+
+
+# A cell's corners are its bottom left, bottom right, top left and top right
+BOTTOM = 0
+LEFT = 1
+TOP = 2
+RIGHT = 3
+SIDES = np.array([[0, 1], [0, 2], [2, 3], [1, 3]])
+
+
+def march_cells(corners):
+    """Finds the segments of the curve in each cell
+
+    Values of zero count as negative, so the curve never passes exactly
+    through a corner. Cells with a corner which is not finite are left out.
+
+    Arguments:
+        corners: np.ndarray
+            -- The values at the four corners of each cell
+
+    Returns:
+        cells: np.ndarray
+            -- The cell each segment is in
+        sides: np.ndarray
+            -- The two edges of its cell each segment joins
+    """
+    positive = corners > 0
+    cut = positive[:, SIDES[:, 0]] != positive[:, SIDES[:, 1]]
+    cut &= np.isfinite(corners).all(axis=-1)[:, None]
+    count = cut.sum(axis=-1)
+
+    # A cell crossed twice has one segment between the two edges
+    cells = [np.nonzero(count == 2)[0]]
+    first = np.argmax(cut[cells[0]], axis=-1)
+    second = 3 - np.argmax(cut[cells[0]][:, ::-1], axis=-1)
+    sides = [np.stack((first, second), axis=-1)]
+
+    # A saddle is crossed on every edge. Its centre decides which pairs of
+    # corners with the same sign are connected through it.
+    saddles = np.nonzero(count == 4)[0]
+    joined = ((corners[saddles].mean(axis=-1) > 0)
+              == positive[saddles, 0])[:, None]
+    for pair, other in (((BOTTOM, RIGHT), (BOTTOM, LEFT)),
+                        ((LEFT, TOP), (TOP, RIGHT))):
+        cells.append(saddles)
+        sides.append(np.where(joined, pair, other))
+
+    return np.concatenate(cells), np.concatenate(sides)
+
+
+def march(values):
+    """Finds the edges of a grid crossed by the curve and the segments
+    joining them
+
+    Arguments:
+        values: np.ndarray
+            -- The values at each point of the grid, with rows going up and
+               columns going right
+
+    Returns:
+        starts: np.ndarray
+            -- The row and column of the first end of each crossed edge
+        ends: np.ndarray
+            -- The row and column of the second end of each crossed edge,
+               one row or column on from the first
+        start_values: np.ndarray
+            -- The value at the first end of each crossed edge
+        end_values: np.ndarray
+            -- The value at the second end of each crossed edge
+        segments: np.ndarray
+            -- The indices of the two edges joined by each segment
+    """
+    rows, columns = values.shape
+    row, column = np.mgrid[:rows - 1, :columns - 1]
+    corners = np.stack((values[:-1, :-1], values[:-1, 1:],
+                        values[1:, :-1], values[1:, 1:]), axis=-1)
+    cells, sides = march_cells(corners.reshape(-1, 4))
+
+    # The corners of the cells, in the same order as their values
+    points = np.stack((row.ravel(), column.ravel()), axis=-1)[:, None, :] \
+        + np.array([[0, 0], [0, 1], [1, 0], [1, 1]])
+    return _get_edges(points, corners.reshape(-1, 4), cells, sides,
+                      columns + 1)
+
+
+def quadtree(function, rows, columns, budget, size):
+    """Finds the edges crossed by the curve and the segments joining them,
+    subdividing cells only near the curve
+
+    The canvas starts as a grid of cells size points across. Every cell
+    which may contain part of the curve is split into four, level by level,
+    until the cells are one point across. A cell may contain part of the
+    curve if the signs of the values at its corners and centre differ, if
+    the smallest of them is no further from zero than they are from each
+    other, or if only some of them are finite. If splitting every such cell
+    would take the number of cells past the budget, those most likely to
+    contain the curve are split first.
+
+    Arguments:
+        function: Callable[[np.ndarray, np.ndarray], np.ndarray]
+            -- The function, taking arrays of rows and columns which may be
+               past the last row or column
+        rows: int
+            -- The number of points up the canvas
+        columns: int
+            -- The number of points across the canvas
+        budget: int
+            -- The most cells to evaluate
+        size: int
+            -- How many points across the first cells are, which must be a
+               power of two
+
+    Returns:
+        starts: np.ndarray
+            -- The row and column of the first end of each crossed edge
+        ends: np.ndarray
+            -- The row and column of the second end of each crossed edge
+        start_values: np.ndarray
+            -- The value at the first end of each crossed edge
+        end_values: np.ndarray
+            -- The value at the second end of each crossed edge
+        segments: np.ndarray
+            -- The indices of the two edges joined by each segment
+    """
+    row, column = np.mgrid[:-(-rows // size), :-(-columns // size)]
+    row = row.ravel() * size
+    column = column.ravel() * size
+    # The values found so far, sorted by the index of their point
+    known = np.zeros(0, dtype=np.int64)
+    found = np.zeros(0)
+    width = columns + 2 * size + 1
+    leaves = []
+    used = 0
+
+    while row.size:
+        # The corners and the centre of every cell
+        offsets = np.array([[0, 0], [0, size], [size, 0], [size, size],
+                            [size // 2, size // 2]])
+        points_row = row[:, None] + offsets[:, 0]
+        points_column = column[:, None] + offsets[:, 1]
+        keys = points_row * width + points_column
+
+        unique = np.unique(keys)
+        missing = unique[~np.isin(unique, known, assume_unique=True)]
+        if missing.size:
+            values = np.real(function(missing // width, missing % width))
+            known = np.concatenate((known, missing))
+            found = np.concatenate((found, values))
+            order = np.argsort(known, kind='stable')
+            known, found = known[order], found[order]
+        values = found[np.searchsorted(known, keys)]
+        used += row.size
+
+        finite = np.isfinite(values)
+        positive = (values > 0) & finite
+        negative = (values <= 0) & finite
+        crossed = positive.any(axis=-1) & negative.any(axis=-1)
+        with np.errstate(all='ignore'):
+            magnitude = np.where(finite, np.abs(values), np.inf).min(axis=-1)
+            spread = (np.where(finite, values, -np.inf).max(axis=-1)
+                      - np.where(finite, values, np.inf).min(axis=-1))
+        near = magnitude <= spread
+        partial = finite.any(axis=-1) & ~finite.all(axis=-1)
+
+        split = (crossed | near | partial) if size > 1 \
+            else np.zeros(row.shape, dtype=bool)
+        allowed = max(0, (budget - used) // 4)
+        if split.sum() > allowed:
+            # Cells crossed by the curve first, then those closest to zero
+            with np.errstate(all='ignore'):
+                priority = np.where(crossed, -1.0, magnitude / spread)
+            chosen = np.argsort(np.where(split, priority, np.inf),
+                                kind='stable')[:allowed]
+            split = np.zeros(row.shape, dtype=bool)
+            split[chosen] = True
+
+        kept = crossed & ~split
+        leaves.append((row[kept], column[kept], size, values[kept, :4]))
+
+        half = size // 2
+        row = (row[split][:, None] + np.array([0, 0, half, half])).ravel()
+        column = (column[split][:, None] + np.array([0, half, 0, half])).ravel()
+        size = half
+
+    points = np.concatenate([
+        np.stack((row, column), axis=-1)[:, None, :]
+        + np.array([[0, 0], [0, size], [size, 0], [size, size]])
+        for row, column, size, _ in leaves])
+    corners = np.concatenate([corners for *_, corners in leaves])
+    cells, sides = march_cells(corners)
+    return _get_edges(points, corners, cells, sides, width)
+
+
+def _get_edges(points, corners, cells, sides, width):
+    """Finds the edges crossed by segments and which edges each joins
+
+    Edges with the same ends are the same edge, so the segments of cells
+    next to each other are joined through the edges they share.
+
+    Arguments:
+        points: np.ndarray
+            -- The row and column of each corner of each cell
+        corners: np.ndarray
+            -- The value at each corner of each cell
+        cells: np.ndarray
+            -- The cell each segment is in
+        sides: np.ndarray
+            -- The two edges of its cell each segment joins
+        width: int
+            -- More than the largest column of any point
+
+    Returns:
+        starts: np.ndarray
+            -- The row and column of the first end of each crossed edge
+        ends: np.ndarray
+            -- The row and column of the second end of each crossed edge
+        start_values: np.ndarray
+            -- The value at the first end of each crossed edge
+        end_values: np.ndarray
+            -- The value at the second end of each crossed edge
+        segments: np.ndarray
+            -- The indices of the two edges joined by each segment
+    """
+    cells = np.repeat(cells, 2)
+    sides = sides.ravel()
+    first = SIDES[sides, 0]
+    second = SIDES[sides, 1]
+    starts = points[cells, first]
+    ends = points[cells, second]
+    keys = np.stack((starts[:, 0] * width + starts[:, 1],
+                     ends[:, 0] * width + ends[:, 1]), axis=-1)
+    keys, edges, segments = np.unique(keys, axis=0, return_index=True,
+                                      return_inverse=True)
+    segments = segments.reshape(-1, 2)
+    return (starts[edges], ends[edges], corners[cells[edges], first[edges]],
+            corners[cells[edges], second[edges]], segments)
+
+
+def join(segments, count):
+    """Joins segments into polylines through the edges they share
+
+    An edge is shared by at most two cells, so each edge is joined to at
+    most two others and the segments form separate paths and loops.
+
+    Arguments:
+        segments: np.ndarray
+            -- The indices of the two edges joined by each segment
+        count: int
+            -- The number of edges
+
+    Returns:
+        polylines: list[np.ndarray]
+            -- The indices of the edges along each polyline. Loops end with
+               the edge they start with.
+    """
+    ends = np.concatenate((segments[:, 0], segments[:, 1]))
+    others = np.concatenate((segments[:, 1], segments[:, 0]))
+    order = np.argsort(ends, kind='stable')
+    ends = ends[order]
+    others = others[order]
+    # The second neighbour of an edge follows its first after sorting
+    second = np.zeros(ends.shape, dtype=bool)
+    second[1:] = ends[1:] == ends[:-1]
+    neighbours = np.full((count, 2), -1)
+    neighbours[ends, second.astype(int)] = others
+    degree = (neighbours >= 0).sum(axis=-1)
+
+    neighbours = neighbours.tolist()
+    visited = [False] * count
+    polylines = []
+    # Paths are walked from their ends first, so only loops are left after
+    for start in np.concatenate((np.nonzero(degree == 1)[0],
+                                 np.nonzero(degree == 2)[0])).tolist():
+        if visited[start]:
+            continue
+        visited[start] = True
+        polyline = [start]
+        previous, current = -1, start
+        while True:
+            first, second = neighbours[current]
+            following = second if first == previous else first
+            if following == start:
+                polyline.append(start)
+                break
+            if following < 0 or visited[following]:
+                break
+            visited[following] = True
+            polyline.append(following)
+            previous, current = current, following
+        polylines.append(np.array(polyline))
+    return polylines
@@ -0,0 +1,226 @@
+"""Samples curves adaptively, more closely where they bend on the screen
+
+A curve starts as evenly spaced samples of its parameter. In each round the
+midpoint of every interval still being refined is evaluated, all in one
+call, and the interval is split if the curve there is further than a
+tolerance from the chord between the ends, measured in pixels. Straight
+parts of a curve are left with few samples, while tight bends and narrow
+features get as many as they need, up to a budget. Chords may also be
+limited to a length in pixels, so a curve is sampled by its length on the
+screen however quickly its parameter moves along it. Intervals with both
+ends past the same edge of the view may also be left unsplit, for curves
+which cannot come back into view within a short interval.
+
+An interval which still needs splitting once it is as short as allowed has
+a jump or a pole in it, so the polyline is broken there rather than drawing
+a line across it.
+
+Functions:
+    sample(function: Callable, low: float, high: float, view: tuple,
+           count: int, budget: int, resolution: float, tolerance: float,
+           length: float, cull: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray,
+                                   np.ndarray]
+        -- Samples a curve adaptively
+    to_screen(x: np.ndarray, y: np.ndarray, view: tuple) -> np.ndarray
+        -- Gets the position of points in pixels, clipped near the view
+    polyline(x: np.ndarray, y: np.ndarray, breaks: np.ndarray)
+            -> tuple[np.ndarray, np.ndarray]
+        -- Joins samples into one line, separated by nan where it breaks
+
+Global variables:
+    TOLERANCE: float
+        -- How far in pixels a curve may be from its chord
+    MARGIN: float
+        -- How far beyond the view points are clipped, as a fraction of it
+"""
+
+import numpy as np
+
+
+TOLERANCE = 0.5
+MARGIN = 1.0
+
+
+def sample(function, low, high, view, count, budget, resolution,
+           tolerance=TOLERANCE, length=None, cull=False):
+    """Samples a curve adaptively
+
+    Arguments:
+        function: Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]
+            -- Gives the x and y of the curve at an array of values of its
+               parameter
+        low: float
+            -- The first value of the parameter
+        high: float
+            -- The last value of the parameter
+        view: tuple[tuple[float, float], tuple[float, float], int, int]
+            -- The x range, y range, width and height of the view
+        count: int
+            -- The number of evenly spaced samples to start with
+        budget: int
+            -- The most samples to take
+        resolution: float
+            -- The shortest interval of the parameter to split
+        tolerance: float (default TOLERANCE)
+            -- How far in pixels the curve may be from a chord
+        length: float | None (default None)
+            -- The longest a chord may be in pixels, if it is limited
+        cull: bool (default False)
+            -- Whether intervals with both ends past the same edge of the
+               view are left unsplit. A narrow feature of the curve between
+               them would be missed, so it is only worth it when the curve
+               spends long stretches of its parameter off the view.
+
+    Returns:
+        t: np.ndarray
+            -- The values of the parameter sampled, in order
+        x: np.ndarray
+            -- The x of the curve at each sample
+        y: np.ndarray
+            -- The y of the curve at each sample
+        breaks: np.ndarray
+            -- Whether the curve jumps between each sample and the next
+    """
+    t = np.linspace(low, high, max(2, min(count, budget)))
+    x, y = (np.real(values) for values in function(t))
+    screen = to_screen(x, y, view)
+    used = t.size
+    # Whether each interval is still being split, and how far the curve was
+    # from the chord of the interval it was split from
+    splitting = np.ones(t.size - 1, dtype=bool)
+    if cull:
+        splitting &= ~_is_off_screen(screen, view)
+    errors = np.full(t.size - 1, np.inf)
+    breaks = np.zeros(t.size - 1, dtype=bool)
+
+    while splitting.any() and used < budget:
+        intervals = np.nonzero(splitting)[0]
+        if intervals.size > budget - used:
+            # The intervals furthest from their chords first
+            order = np.argsort(-errors[intervals], kind='stable')
+            intervals = np.sort(intervals[order[:budget - used]])
+        middle = (t[intervals] + t[intervals + 1]) / 2
+        middle_x, middle_y = (np.real(values) for values in function(middle))
+        middle_screen = to_screen(middle_x, middle_y, view)
+        used += middle.size
+
+        chord = (screen[intervals] + screen[intervals + 1]) / 2
+        with np.errstate(invalid='ignore'):
+            error = np.hypot(*(middle_screen - chord).T)
+        finite = np.isfinite(np.stack((screen[intervals],
+                                       screen[intervals + 1],
+                                       middle_screen))).all(axis=-1)
+        # Where only some of the points are defined, the edge of where the
+        # curve is defined is found as closely as a jump
+        error = np.where(finite.all(axis=0), error,
+                         np.where(finite.any(axis=0), np.inf, 0))
+        split = error > tolerance
+        short = (t[intervals + 1] - t[intervals]) / 2 < resolution
+
+        splitting[intervals] = split & ~short
+        errors[intervals] = error
+        breaks[intervals] = split & short & finite.all(axis=0)
+        positions = intervals + 1
+        t = np.insert(t, positions, middle)
+        x = np.insert(x, positions, middle_x)
+        y = np.insert(y, positions, middle_y)
+        screen = np.insert(screen, positions, middle_screen, axis=0)
+        splitting = np.insert(splitting, positions, splitting[intervals])
+        errors = np.insert(errors, positions, error)
+        breaks = np.insert(breaks, positions, breaks[intervals])
+
+        # A midpoint can happen to lie on the chord, such as at a point of
+        # inflection, so the halves of an interval which was close enough
+        # are split anyway if the curve bends sharply at their other ends,
+        # or if they are longer than allowed
+        bends = np.zeros(t.size)
+        with np.errstate(invalid='ignore'):
+            bends[1:-1] = np.hypot(*(screen[1:-1]
+                                     - (screen[:-2] + screen[2:]) / 2).T)
+        bends = np.nan_to_num(bends) / 4
+        halves = (intervals + np.arange(intervals.size))[~split & ~short]
+        halves = np.concatenate((halves, halves + 1))
+        error = np.maximum(bends[halves], bends[halves + 1])
+        if length is not None:
+            chords = np.nan_to_num(np.hypot(*(screen[halves + 1]
+                                              - screen[halves]).T))
+            error = np.maximum(error, chords * (tolerance / length))
+        bent = error > tolerance
+        splitting[halves[bent]] = True
+        errors[halves[bent]] = error[bent]
+        if cull:
+            splitting &= ~_is_off_screen(screen, view)
+
+    return t, x, y, breaks
+
+
+def _is_off_screen(screen, view):
+    """Finds the intervals with both ends past the same edge of the view
+
+    Arguments:
+        screen: np.ndarray
+            -- The position of each sample in pixels
+        view: tuple[tuple[float, float], tuple[float, float], int, int]
+            -- The x range, y range, width and height of the view
+
+    Returns:
+        off_screen: np.ndarray
+            -- Whether each interval between samples is off the view
+    """
+    size = np.array(view[2:])
+    with np.errstate(invalid='ignore'):
+        before = (screen < 0)
+        after = (screen > size)
+    return ((before[:-1] & before[1:]) | (after[:-1] & after[1:])).any(axis=-1)
+
+
+def to_screen(x, y, view):
+    """Gets the position of points in pixels, clipped near the view
+
+    Points far off the view are clipped, so they still count as being off
+    the view without their distance from it deciding where to sample.
+
+    Arguments:
+        x: np.ndarray
+            -- The x of each point
+        y: np.ndarray
+            -- The y of each point
+        view: tuple[tuple[float, float], tuple[float, float], int, int]
+            -- The x range, y range, width and height of the view
+
+    Returns:
+        screen: np.ndarray
+            -- The position of each point in pixels, nan if it is not
+               finite
+    """
+    xrange, yrange, width, height = view
+    screen = np.stack(((x - xrange[0]) * (width / (xrange[1] - xrange[0])),
+                       (y - yrange[0]) * (height / (yrange[1] - yrange[0]))),
+                      axis=-1)
+    with np.errstate(invalid='ignore'):
+        screen = np.clip(screen, -MARGIN * np.array([width, height]),
+                         (1 + MARGIN) * np.array([width, height]))
+    return np.where(np.isfinite(np.stack((x, y), axis=-1)), screen, np.nan)
+
+
+def polyline(x, y, breaks):
+    """Joins samples into one line, separated by nan where it breaks
+
+    Arguments:
+        x: np.ndarray
+            -- The x of each sample
+        y: np.ndarray
+            -- The y of each sample
+        breaks: np.ndarray
+            -- Whether the curve jumps between each sample and the next
+
+    Returns:
+        x: np.ndarray
+            -- The x of each point of the line
+        y: np.ndarray
+            -- The y of each point of the line
+    """
+    positions = np.nonzero(breaks)[0] + 1
+    x = np.where(np.isfinite(x), x, np.nan)
+    y = np.where(np.isfinite(y), y, np.nan)
+    return np.insert(x, positions, np.nan), np.insert(y, positions, np.nan)
@@ -0,0 +1,237 @@
+"""Dual numbers for forward mode automatic differentiation
+
+A dual number carries a value and its derivative. Each NumPy function used
+by the builtins has a rule giving the derivative of its result, so
+evaluating a tree with a dual number in place of a variable gives the value
+and its derivative in a single pass. Values and derivatives may be arrays.
+The derivative may have an extra leading axis, one entry per variable, to
+get a whole gradient at once.
+
+Classes:
+    Dual(object)
+        -- A value together with its derivative
+
+Functions:
+    seed(values: np.ndarray, index: int, count: int) -> Dual
+        -- Makes the dual number for one of several variables
+    split(value: Any, shape: tuple, count: int)
+            -> tuple[np.ndarray, np.ndarray]
+        -- Splits a result into its values and derivatives
+
+Global variables:
+    UNARY_RULES: dict[np.ufunc, Callable]
+        -- The derivatives of the functions of one argument
+    LINEAR: set[np.ufunc]
+        -- The functions whose derivative is the function of the derivative
+"""
+
+import numpy as np
+
+
+class Dual:
+    """A value together with its derivative
+
+    Arithmetic and NumPy's functions work on dual numbers as they would on
+    the value, also working out the derivative of the result.
+
+    Attributes:
+        value: np.ndarray | complex
+            -- The value
+        derivative: np.ndarray | complex
+            -- The derivative of the value, with a leading axis for each
+               variable if there are several
+
+    Methods:
+        __init__(value: np.ndarray | complex,
+                 derivative: np.ndarray | complex)
+            -- The initialiser for the class
+
+        __array_ufunc__(ufunc: np.ufunc, method: str, *inputs, **kwargs)
+                -> Dual
+            -- Applies a NumPy function, working out the derivative
+
+        real -> Dual
+            -- The real part and its derivative
+
+        imag -> Dual
+            -- The imaginary part and its derivative
+    """
+    def __init__(self, value, derivative):
+        """The initialiser for the class
+
+        Arguments:
+            value: np.ndarray | complex
+                -- The value
+            derivative: np.ndarray | complex
+                -- The derivative of the value
+        """
+        self.value = value
+        self.derivative = derivative
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Applies a NumPy function, working out the derivative
+
+        Arguments:
+            ufunc: np.ufunc
+                -- The function
+            method: str
+                -- How it is applied, only '__call__' is supported
+            inputs: tuple
+                -- The arguments, any of which may be dual numbers
+
+        Returns:
+            result: Dual
+                -- The result and its derivative
+        """
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        values = [x.value if isinstance(x, Dual) else x for x in inputs]
+        derivatives = [x.derivative if isinstance(x, Dual) else 0
+                       for x in inputs]
+        value = ufunc(*values)
+
+        if ufunc in LINEAR:
+            return Dual(value, ufunc(*derivatives))
+        elif ufunc in UNARY_RULES:
+            u, = values
+            du, = derivatives
+            return Dual(value, UNARY_RULES[ufunc](u) * du)
+
+        u, v = values
+        du, dv = derivatives
+        if ufunc is np.add:
+            derivative = du + dv
+        elif ufunc is np.subtract:
+            derivative = du - dv
+        elif ufunc is np.multiply:
+            derivative = du * v + u * dv
+        elif ufunc is np.true_divide:
+            derivative = (du * v - u * dv) / v**2
+        elif ufunc is np.power:
+            derivative = v * u**(v - 1) * du
+            # The exponent usually has no derivative, and the log of a
+            # negative base would make the whole derivative nan
+            if isinstance(inputs[1], Dual):
+                derivative = derivative + value * np.log(u) * dv
+        else:
+            return NotImplemented
+        return Dual(value, derivative)
+
+    @property
+    def real(self):
+        # Used by np.real, as it is not a ufunc
+        return Dual(np.real(self.value), np.real(self.derivative))
+
+    @property
+    def imag(self):
+        return Dual(np.imag(self.value), np.imag(self.derivative))
+
+    def __add__(self, other):
+        return np.add(self, other)
+
+    def __radd__(self, other):
+        return np.add(other, self)
+
+    def __sub__(self, other):
+        return np.subtract(self, other)
+
+    def __rsub__(self, other):
+        return np.subtract(other, self)
+
+    def __mul__(self, other):
+        return np.multiply(self, other)
+
+    def __rmul__(self, other):
+        return np.multiply(other, self)
+
+    def __truediv__(self, other):
+        return np.true_divide(self, other)
+
+    def __rtruediv__(self, other):
+        return np.true_divide(other, self)
+
+    def __pow__(self, other):
+        return np.power(self, other)
+
+    def __rpow__(self, other):
+        return np.power(other, self)
+
+    def __neg__(self):
+        return np.negative(self)
+
+    def __pos__(self):
+        return self
+
+    def __repr__(self):
+        return f"Dual({self.value!r}, {self.derivative!r})"
+
+
+UNARY_RULES = {
+    np.sin: np.cos,
+    np.cos: lambda u: -np.sin(u),
+    np.tan: lambda u: 1 / np.cos(u)**2,
+    np.arcsin: lambda u: 1 / np.sqrt(1 - u**2),
+    np.arccos: lambda u: -1 / np.sqrt(1 - u**2),
+    np.arctan: lambda u: 1 / (1 + u**2),
+    np.sinh: np.cosh,
+    np.cosh: np.sinh,
+    np.tanh: lambda u: 1 / np.cosh(u)**2,
+    np.arcsinh: lambda u: 1 / np.sqrt(u**2 + 1),
+    np.arccosh: lambda u: 1 / (np.sqrt(u - 1) * np.sqrt(u + 1)),
+    np.arctanh: lambda u: 1 / (1 - u**2),
+    np.exp: np.exp,
+    np.log: lambda u: 1 / u,
+    np.log10: lambda u: 1 / (u * np.log(10)),
+    np.sqrt: lambda u: 1 / (2 * np.sqrt(u)),
+}
+
+LINEAR = {np.negative, np.positive, np.conjugate}
+
+
+def seed(values, index=0, count=1):
+    """Makes the dual number for one of several variables
+
+    Arguments:
+        values: np.ndarray
+            -- The values of the variable
+        index: int (default 0)
+            -- Which of the variables it is
+        count: int (default 1)
+            -- How many variables are being differentiated with respect to
+
+    Returns:
+        dual: Dual
+            -- The values with a derivative of 1 with respect to this
+               variable and 0 with respect to the others
+    """
+    values = np.asarray(values)
+    if count == 1:
+        return Dual(values, np.ones(values.shape))
+    derivative = np.zeros((count,) + values.shape)
+    derivative[index] = 1
+    return Dual(values, derivative)
+
+
+def split(value, shape=(), count=1):
+    """Splits a result into its values and derivatives
+
+    Arguments:
+        value: Any
+            -- The result, a dual number or anything without a derivative
+        shape: tuple (default ())
+            -- The shape of the values
+        count: int (default 1)
+            -- How many variables it was differentiated with respect to
+
+    Returns:
+        values: np.ndarray
+            -- The values, broadcast to shape
+        derivatives: np.ndarray
+            -- The derivatives, broadcast to shape with a leading axis if
+               there are several variables
+    """
+    derivative_shape = shape if count == 1 else (count,) + shape
+    if isinstance(value, Dual):
+        return (np.array(np.broadcast_to(value.value, shape)),
+                np.array(np.broadcast_to(value.derivative, derivative_shape)))
+    return np.array(np.broadcast_to(value, shape)), np.zeros(derivative_shape)
@@ -1,49 +1,62 @@
-import evaluator.local
-
-
 class ExecutionTree:
+    # Parsed trees are kept in the parse cache, so nodes use __slots__ and
+    # only store their fields and parent
+    __slots__ = ('__root',)
+
     def __init__(self):
         self.__root = None
-        self.nodes = set()
 
     def __repr__(self):
         return f"<Tree {self.__root}>"
 
     class __Node:
+        __slots__ = ('parent',)
+
         def __init__(self):
             self.parent = None
-            self.children = set()
-            self.locals = None
-
-        def set_locals(self, local_):
-            self.locals = local_
-
-        def get_var(self, identifier):
-            return self.locals.get_var(identifier)
-
-        def del_var(self, identifier):
-            self.locals.del_var(identifier)
-
-        def set_var(self, identifier, value):
-            self.locals.set_var(identifier, value)
 
         def get_parent(self):
             return self.parent
 
+        def get_children(self):
+            return ()
+
         def add_child(self, child):
             if child is not None:
-                self.children.add(child)
                 child.set_parent(self)
 
         def remove_child(self, child):
-            self.children.remove(child)
             child.set_parent(None)
 
         def set_parent(self, parent):
             self.parent = parent
 
         def __iter__(self):
-            yield self
+            # Pre-order, using a stack rather than recursion so long lines do
+            # not reach the recursion limit. Children are read after the node
+            # is yielded, so the node can be replaced while iterating.
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                yield node
+                stack.extend(reversed(node.get_children()))
+
+        def __repr__(self):
+            parts = []
+            stack = [self]
+            while stack:
+                item = stack.pop()
+                if isinstance(item, str):
+                    parts.append(item)
+                elif item is None:
+                    parts.append('None')
+                elif item.is_identifier():
+                    parts.append(str(item.name))
+                elif item.is_function_call():
+                    stack.extend((')', item.parameter, ' ', item.function, '('))
+                else:
+                    stack.extend((item.expr, '.', item.identifier, 'λ'))
+            return ''.join(parts)
 
         def is_function_call(self):
             return False
@@ -58,27 +71,31 @@ class ExecutionTree:
             return self.parent is None
 
     class __Identifier(__Node):
+        __slots__ = ('name',)
+
         def __init__(self, name):
             self.name = name
 
             super().__init__()
 
-        def __repr__(self):
-            return f"{self.name}"
-
-        def __iter__(self):
-            yield self
-
         def is_identifier(self):
             return True
 
     class __FunctionCall(__Node):
+        __slots__ = ('function', 'parameter')
+
         def __init__(self):
             self.function = None
             self.parameter = None
 
             super().__init__()
 
+        def get_children(self):
+            if self.function is None or self.parameter is None:
+                return tuple(child for child in (self.function, self.parameter)
+                             if child is not None)
+            return self.function, self.parameter
+
         def add_function(self, function):
             self.function = function
             self.add_child(function)
@@ -101,81 +118,52 @@ class ExecutionTree:
                 del old_function
             self.add_function(function)
 
-        def __repr__(self):
-            return f"({self.function} {self.parameter})"
-
-        def __iter__(self):
-            yield self
-            if self.function is not None:
-                yield from self.function
-            if self.parameter is not None:
-                yield from self.parameter
-
         def is_function_call(self):
             return True
 
     class __FunctionDef(__Node):
+        __slots__ = ('identifier', 'expr')
+
         def __init__(self, identifier):
             self.identifier = identifier
             self.expr = None
             super().__init__()
 
+        def get_children(self):
+            return self.expr,
+
         def set_expr(self, expr):
             self.expr = expr
             self.add_child(self.expr)
 
-        def __repr__(self):
-            return f"λ{self.identifier}.{self.expr}"
-
-        def __iter__(self):
-            yield self
-            yield from self.expr
-
-        def set_locals(self, locals_):
-            super().set_locals(locals_)
-            self.locals.set_var(self.identifier.name.item, None)
-
-        def apply(self, value):
-            self.locals.set_var(self.identifier.name.item, value)
-            return self.expr
-
         def is_funcdef(self):
             return True
 
     def __set_root(self, root):
         self.__root = root
 
-    def set_locals(self, globals_):
-        for node in self.nodes:
-            if node.is_root():
-                node.set_locals(globals_)
-            else:
-                locals_ = evaluator.local.Locals()
-                locals_.set_node(node)
+    def set_root(self, root):
+        self.__set_root(root)
 
     def get_root(self):
         return self.__root
 
     def create_identifier(self, name):
         node = ExecutionTree.__Identifier(name)
-        self.nodes.add(node)
         if self.__root is None:
             self.__set_root(node)
         return node
 
     def create_function_call(self):
         node = ExecutionTree.__FunctionCall()
-        self.nodes.add(node)
         if self.__root is None:
             self.__set_root(node)
         return node
 
     def create_function_def(self, identifier):
         node = ExecutionTree.__FunctionDef(identifier)
-        self.nodes.add(node)
         return node
 
-
     def print_tree(self, node=None):
         print(self.__root)
 
@@ -1,27 +1,39 @@
-import evaluator.operators
 import evaluator.builtins.functions
 import evaluator.builtins.types
+import evaluator.compiler
+import evaluator.dual
+import evaluator.optimiser
 import evaluator.local
+import evaluator.symbolic
 import evaluator.graphical_processor
-import re
+import evaluator.vector_executor
+import hashlib
+import numpy as np
 
 class Executor:
     def __init__(self, trees):
         self.trees = trees
         self.globals = evaluator.local.Globals()
 
-        for tree in self.trees:
-            tree.set_locals(self.globals)
-
         for operator in evaluator.builtins.functions.OPERATORS:
             self.globals.set_var(operator, evaluator.builtins.functions.OPERATORS[operator])
 
+        # The \let definitions by name and the names each tree refers to
+        self.definitions = {}
+        self.dependencies = {}
+        self.__texts = {}
+
         self.set_globals()
+        self.set_dependencies()
         self.grapher = None
+        self.optimiser = evaluator.optimiser.Optimiser()
+        self.compiler = evaluator.compiler.Compiler(self)
+        self.differentiator = evaluator.symbolic.Differentiator(self)
+        self.vector_executor = evaluator.vector_executor.VectorExecutor(self)
 
-    def graph(self, width, height, xrange, yrange):
+    def graph(self, width, height, xrange, yrange, trange=None, buffer=None):
         self.grapher = evaluator.graphical_processor.Grapher(self, width, height)
-        return self.grapher.graph(xrange, yrange)
+        return self.grapher.graph(xrange, yrange, trange, buffer)
 
     def set_globals(self):
         for tree in self.trees:
@@ -32,90 +44,216 @@ class Executor:
                         assert root.function.parameter.is_identifier()
                         identifier = root.function.parameter.name.item
                         self.globals.set_var(identifier, root.parameter)
+                        self.definitions[identifier] = tree
+
+    def set_dependencies(self):
+        for tree in self.trees:
+            self.dependencies[tree] = {
+                node.name.item for node in tree
+                if node.is_identifier() and node.name.item in self.definitions}
+
+    def get_all_dependencies(self, tree):
+        # Every definition the tree uses, directly or through other definitions
+        found = set()
+        stack = [tree]
+        while stack:
+            for name in self.dependencies[stack.pop()]:
+                if name not in found:
+                    found.add(name)
+                    stack.append(self.definitions[name])
+        return found
+
+    def get_fingerprint(self, tree):
+        # Changes whenever the tree or any definition it depends on changes, so
+        # anything computed from an unchanged fingerprint can be reused
+        hasher = hashlib.sha1(self.__get_text(tree).encode())
+        for name in sorted(self.get_all_dependencies(tree)):
+            hasher.update(f"\n{name}: {self.__get_text(self.definitions[name])}"
+                          .encode())
+        return hasher.hexdigest()
+
+    def __get_text(self, tree):
+        if tree not in self.__texts:
+            self.__texts[tree] = repr(tree.get_root())
+        return self.__texts[tree]
 
     def evaluate_tree(self, tree):
-        root = tree.get_root()
-        return self.__evaluate_node(root)
+        token = evaluator.builtins.functions.EXECUTOR.set(self)
+        try:
+            return self.compiler.compile(tree.get_root())(())
+        finally:
+            evaluator.builtins.functions.EXECUTOR.reset(token)
+
+    def evaluate_constant(self, node):
+        # The node must not use any of the variables bound around it
+        token = evaluator.builtins.functions.EXECUTOR.set(self)
+        try:
+            return self.compiler.evaluate_constant(node)
+        finally:
+            evaluator.builtins.functions.EXECUTOR.reset(token)
+
+    def evaluate_array(self, node, values, identifier='x'):
+        # Evaluates the node at every value, returning the results and which
+        # engine was used. Anything that cannot be vectorised is evaluated
+        # point by point instead.
+        try:
+            return self.vector_executor.evaluate(node, values, identifier), 'vector'
+        except evaluator.vector_executor.NotVectorisable:
+            pass
+
+        if isinstance(identifier, tuple):
+            values = np.broadcast_arrays(*values)
+            results = [self.evaluate_function(node, point, identifier)
+                       for point in zip(*(v.flat for v in values))]
+            return np.array(results).reshape(values[0].shape), 'scalar'
+        results = [self.evaluate_function(node, value, identifier)
+                   for value in values]
+        return np.array(results), 'scalar'
 
     def evaluate_function(self, node, value, identifier='x'):
-        if isinstance(value, float) or isinstance(value, int):
-            parameter = evaluator.builtins.types.Number(value)
-
-            if not isinstance(node, evaluator.builtins.types.Function):
-                if node.is_funcdef():
-                    result = self.__evaluate_node(node.apply(parameter))
-                    if isinstance(result, evaluator.builtins.types.Number):
-                        return result.value
-                    else:
-                        raise ValueError
-                else:
-                    node.set_var(identifier, parameter)
-                    out = self.__evaluate_node(node)
-                    node.del_var(identifier)
-                    if isinstance(out, evaluator.builtins.types.Number):
-                        return out.value
-                    else:
+        # Builtins such as integrate evaluate with whichever executor is
+        # current in this thread, so executors can be used concurrently
+        token = evaluator.builtins.functions.EXECUTOR.set(self)
+        try:
+            return self.__evaluate_function(node, value, identifier)
+        finally:
+            evaluator.builtins.functions.EXECUTOR.reset(token)
+
+    def evaluate_derivative(self, node, values, identifier='x', variable=None):
+        # Evaluates the node and its derivative with respect to variable at
+        # every value in a single pass with dual numbers, returning both. A
+        # tuple of variables gives the gradient, with a leading axis for each
+        # variable. Anything dual numbers cannot get through is differentiated
+        # with central differences instead.
+        if variable is None:
+            variable = identifier
+        variables = variable if isinstance(variable, tuple) else (variable,)
+        count = len(variable) if isinstance(variable, tuple) else 1
+        names = identifier if isinstance(identifier, tuple) else (identifier,)
+        arrays = values if isinstance(identifier, tuple) else (values,)
+        arrays = [np.asarray(array) for array in arrays]
+        shape = np.broadcast_shapes(*(array.shape for array in arrays))
+        arrays = [np.broadcast_to(array, shape) for array in arrays]
+
+        token = evaluator.builtins.functions.EXECUTOR.set(self)
+        try:
+            seeded = tuple(
+                evaluator.dual.seed(array, variables.index(name), count)
+                if name in variables else array
+                for name, array in zip(names, arrays))
+            try:
+                result = self.vector_executor.evaluate(
+                    node, seeded if isinstance(identifier, tuple) else seeded[0],
+                    identifier)
+                return evaluator.dual.split(result, shape, count)
+            except (evaluator.vector_executor.NotVectorisable, ValueError,
+                    TypeError):
+                pass
+
+            # Point by point, still with dual numbers
+            try:
+                results = []
+                for point in zip(*(array.flat for array in arrays)):
+                    parameters = tuple(
+                        evaluator.dual.seed(value, variables.index(name), count)
+                        if name in variables else value
+                        for name, value in zip(names, point))
+                    result = self.__evaluate_numbers(node, parameters,
+                                                     identifier)
+                    if not isinstance(result, evaluator.builtins.types.NUMBERS):
                         raise ValueError
-            result = node.apply(parameter)
-            if isinstance(result, evaluator.builtins.types.Number):
-                return result.value
+                    results.append(evaluator.dual.split(result, (), count))
+                values = np.array([value for value, _ in results])
+                derivatives = np.array([derivative
+                                        for _, derivative in results])
+                if count == 1:
+                    return values.reshape(shape), derivatives.reshape(shape)
+                return (values.reshape(shape),
+                        derivatives.T.reshape((count,) + shape))
+            except (ValueError, TypeError):
+                pass
+        finally:
+            evaluator.builtins.functions.EXECUTOR.reset(token)
+
+        results, _ = self.evaluate_array(
+            node, tuple(arrays) if isinstance(identifier, tuple) else arrays[0],
+            identifier)
+        return results, self.__difference(node, arrays, identifier, variables,
+                                          count)
+
+    def __difference(self, node, arrays, identifier, variables, count):
+        # Central differences, with a step balancing rounding and truncation
+        derivatives = []
+        names = identifier if isinstance(identifier, tuple) else (identifier,)
+        for name in variables:
+            index = names.index(name)
+            step = np.cbrt(np.finfo(float).eps) * np.maximum(
+                1, np.abs(arrays[index]))
+            differences = []
+            for sign in (1, -1):
+                shifted = list(arrays)
+                shifted[index] = arrays[index] + sign * step
+                results, _ = self.evaluate_array(
+                    node, tuple(shifted) if isinstance(identifier, tuple)
+                    else shifted[0], identifier)
+                differences.append(results)
+            derivatives.append((differences[0] - differences[1]) / (2 * step))
+        return derivatives[0] if count == 1 else np.array(derivatives)
+
+    def __evaluate_function(self, node, value, identifier):
+        if isinstance(value, float) or isinstance(value, int):
+            result = self.__evaluate_numbers(node, (value,), identifier)
+            if isinstance(result, evaluator.builtins.types.NUMBERS):
+                return result
+            elif self.__is_numbers(result):
+                # Several numbers from the one evaluation
+                return result.items
             else:
                 raise ValueError
         if isinstance(value, tuple):
             if len(value) != len(identifier):
                 raise ValueError
-            for v, i in zip(value, identifier):
+            for v in value:
                 if not (isinstance(v, float) or isinstance(v, int)):
                     raise ValueError
-                node.set_var(i, evaluator.builtins.types.Number(v))
-            out = self.__evaluate_node(node)
-            for i in identifier:
-                node.del_var(i)
-            if isinstance(out, evaluator.builtins.types.Number):
-                return out.value
-            else:
-                return out
+            out = self.__evaluate_numbers(node, tuple(value), identifier)
+            if self.__is_numbers(out):
+                return out.items
+            return out
         else:
             raise ValueError
 
-    def __evaluate_node(self, node):
-        if node.is_function_call():
-            function = self.__evaluate_node(node.function)
-
-            if not isinstance(function, evaluator.builtins.types.Function) \
-                    and function.is_identifier():
-                if function.name.item == '"':
-                    if node.parameter.is_identifier():
-                        return evaluator.builtins.types.IdentifierName(
-                            node.parameter.name)
-                    else:
-                        raise ValueError
+    @staticmethod
+    def __is_numbers(value):
+        return (isinstance(value, evaluator.builtins.types.Tuple)
+                and all(isinstance(item, evaluator.builtins.types.NUMBERS)
+                        for item in value.items))
 
-            parameter = self.__evaluate_node(node.parameter)
+    def __evaluate_numbers(self, node, parameters, identifier):
+        # Chains of operators are compiled into loops, but anything else
+        # nested deeply enough still reaches the recursion limit
+        try:
+            return self.__evaluate_compiled(node, parameters, identifier)
+        except RecursionError:
+            raise ValueError('The expression is nested too deeply to '
+                             'evaluate point by point')
 
-            if not isinstance(function, evaluator.builtins.types.Function) \
-                    and function.is_funcdef():
-                return self.__evaluate_node(function.apply(parameter))
-            try:
-                return function.apply(parameter)
-            except ValueError:
-                return node
-
-        elif node.is_identifier():
-            if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX,
-                            node.name.item):
-                return evaluator.builtins.types.Number(float(node.name.item))
-            else:
-                value = node.get_var(node.name.item)
-                if isinstance(value, evaluator.builtins.types.Function):
-                    return value
-                elif value is None:
-                    return node
-                else:
-                    return self.__evaluate_node(value)
-        else:
-            return node
+    def __evaluate_compiled(self, node, parameters, identifier):
+        if isinstance(identifier, tuple):
+            return self.compiler.compile(node, identifier)(parameters)
 
+        parameter, = parameters
+        if isinstance(node, evaluator.builtins.types.Function):
+            return node.apply(parameter)
+        elif isinstance(node, evaluator.builtins.types.NUMBERS):
+            # Juxtaposed numbers are multiplied
+            return node * parameter
+        elif node.is_funcdef():
+            # A function is applied to the value whatever its parameter is
+            # called
+            return self.compiler.compile(node)(()).apply(parameter)
+        else:
+            return self.compiler.compile(node, (identifier,))((parameter,))
 
 if __name__ == '__main__':
     import parser
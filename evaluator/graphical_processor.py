@@ -1,12 +1,41 @@
-import matplotlib.pyplot as plt
-from matplotlib.path import Path
-import matplotlib.patches as patches
+import matplotlib.backends.backend_agg
+import matplotlib.figure
 import numpy as np
 import evaluator.builtins.functions
 import evaluator.builtins.types
+import evaluator.cache
+import evaluator.contour
+import evaluator.curves
 
 DPI = 96
 
+# The width in pixels of each cell of the grid implicit curves are found on,
+# or of the first cells of the quadtree, which must be a power of two. Then
+# the most cells of the quadtree evaluated, and how far along an edge of a
+# cell the curve is found to if it is refined.
+IMPLICIT_CELL_SIZE = 4
+IMPLICIT_CELL_SIZE_ADAPTIVE = 16
+IMPLICIT_CELL_BUDGET = 1 << 17
+IMPLICIT_TOLERANCE = 1e-6
+
+# How many pixels apart curves are first sampled, the fraction of a pixel
+# they are sampled to at the closest, and the most samples taken of each
+CURVE_INITIAL_SPACING = 8
+CURVE_RESOLUTION = 1 / 64
+CURVE_SAMPLE_BUDGET = 1 << 14
+
+# The range of t parametric curves are plotted over unless another is given,
+# how many samples they start with, how many times the intervals between
+# those may be halved, and the longest a chord between samples may be in
+# pixels
+PARAMETRIC_RANGE = (-10, 10)
+PARAMETRIC_INITIAL_SAMPLES = 256
+PARAMETRIC_DEPTH = 12
+CURVE_SEGMENT_LENGTH = 16
+
+# Samples for each statement, keyed by the statement's fingerprint and the view
+SAMPLES = evaluator.cache.LRUCache(256)
+
 
 class Grapher:
     def __init__(self, executor, width, height):
@@ -15,56 +44,134 @@ class Grapher:
         self.height = height
         self.xrange = (-5, 5)
         self.yrange = (-5, 5)
-
-    def graph(self, xrange, yrange):
-        evaluator.builtins.functions.executor = self.executor
-        plt.figure(figsize=(self.width/DPI, self.height/DPI), dpi=DPI)
-
+        self.trange = PARAMETRIC_RANGE
+        # Whether implicit curves are found on a quadtree rather than a grid,
+        # the most cells of the quadtree to evaluate, and whether they are
+        # moved onto the curve along the edges of the cells rather than
+        # interpolated linearly
+        self.adaptive_implicit = True
+        self.implicit_cell_budget = IMPLICIT_CELL_BUDGET
+        self.refine_implicit = True
+        # Whether curves are sampled adaptively rather than once a pixel, and
+        # the most samples to take of each
+        self.adaptive_curves = True
+        self.curve_sample_budget = CURVE_SAMPLE_BUDGET
+        # The engine used for each statement, or 'cached' if it was not
+        # evaluated again
+        self.engines = []
+        # The axes being drawn on, which only exist during a render
+        self.axes = None
+
+    def graph(self, xrange, yrange, trange=None, buffer=None):
+        # Each render has its own figure rather than one held by pyplot, so
+        # it is freed once the render is done and renders do not share state
+        figure = matplotlib.figure.Figure(
+            figsize=(self.width/DPI, self.height/DPI), dpi=DPI)
+        matplotlib.backends.backend_agg.FigureCanvasAgg(figure)
+        self.axes = figure.add_subplot()
+        try:
+            return self.render(xrange, yrange, trange, buffer)
+        finally:
+            self.axes = None
+            figure.clear()
+
+    def render(self, xrange, yrange, trange, buffer):
         error_message = ""
 
         self.xrange = xrange
         self.yrange = yrange
-        for tree in self.executor.trees:
+        self.trange = PARAMETRIC_RANGE if trange is None else trange
+        self.engines = [None] * len(self.executor.trees)
+        for index, tree in enumerate(self.executor.trees):
             try:
-                if self.is_y_fx(tree):
-                    function = self.get_function(tree)
-                    self.y_fx(function)
-                elif self.is_parametric(tree):
-                    root = tree.get_root()
-                    x_function = root.function.parameter
-                    y_function = root.parameter
-                    self.parametric(x_function, y_function, np.arange(-10, 10, 0.01))
-                elif self.is_intersect(tree):
-                    root = tree.get_root()
-                    function1 = root.parameter.function.parameter
-                    function2 = root.parameter.parameter
-                    self.intersect(function1, function2)
-                elif self.is_implicit(tree):
-                    root = tree.get_root()
-                    left_func = root.function.parameter
-                    right_func = root.parameter
-                    self.implicit(right_func, left_func)
+                # Statements whose definitions have not changed since an
+                # earlier render with the same view and the same way of
+                # sampling reuse that render's samples
+                key = (self.executor.get_fingerprint(tree), self.width,
+                       self.height, tuple(xrange), tuple(yrange),
+                       tuple(self.trange), self.adaptive_curves,
+                       self.curve_sample_budget, self.adaptive_implicit,
+                       self.implicit_cell_budget, self.refine_implicit)
+                cached = SAMPLES.get(key)
+                if cached is None:
+                    samples, engine = self.sample(tree)
+                    SAMPLES.put(key, (samples, engine))
+                    self.engines[index] = engine
+                else:
+                    samples, _ = cached
+                    self.engines[index] = 'cached'
+                self.draw(samples)
             except Exception as err:
-                error_message += f"Something went wrong when plotting statement {self.executor.trees.index(tree)+1}. "
-        return self.plot(), error_message
-
-    def plot(self):
-        plt.xlim(self.xrange[0], self.xrange[1])
-        plt.ylim(self.yrange[0], self.yrange[1])
-        plt.grid(visible=True, which="both")
-        plt.tight_layout()
+                error_message += f"Something went wrong when plotting statement {index+1}. "
+        return self.plot(buffer), error_message
+
+    def sample(self, tree):
+        if self.is_y_fx(tree):
+            function = self.get_function(tree)
+            return self.y_fx(function)
+        elif self.is_parametric(tree):
+            return self.parametric(tree.get_root())
+        elif self.is_intersect(tree):
+            root = tree.get_root()
+            function1 = root.parameter.function.parameter
+            function2 = root.parameter.parameter
+            return self.intersect(function1, function2)
+        elif self.is_implicit(tree):
+            root = tree.get_root()
+            left_func = root.function.parameter
+            right_func = root.parameter
+            return self.implicit(right_func, left_func)
+        return [], None
+
+    def draw(self, samples):
+        for kind, *data in samples:
+            if kind == 'line':
+                x_values, y_values = data
+                self.axes.plot(x_values, y_values)
+            elif kind == 'point':
+                x, y = data
+                self.axes.scatter([x], [y])
+                self.axes.annotate(f"({x:f}, {y:f})", (x, y))
+
+    def plot(self, buffer=None):
+        self.axes.set_xlim(self.xrange[0], self.xrange[1])
+        self.axes.set_ylim(self.yrange[0], self.yrange[1])
+        self.axes.grid(visible=True, which="both")
+        self.axes.figure.tight_layout()
+        if buffer is not None:
+            # The PNG is written to the buffer rather than a file
+            self.axes.figure.savefig(buffer, format='png', dpi=DPI)
+            return None
         name = ''.join([hex(i)[2:] for i in np.random.bytes(4)])
         name += '.png'
         name = 'static/images/' + name
-        plt.savefig('./'+name, dpi=DPI)
+        self.axes.figure.savefig('./'+name, dpi=DPI)
         return name
 
     def y_fx(self, function):
-        x_values = np.linspace(self.xrange[0], self.xrange[1], self.width)
-        y_values = []
-        for x in x_values:
-            y_values.append(self.executor.evaluate_function(function, x))
-        plt.plot(x_values, y_values)
+        engines = []
+
+        def curve(x_values):
+            y_values, engine = self.executor.evaluate_array(function, x_values)
+            engines.append(engine)
+            return x_values, np.broadcast_to(np.real(y_values), x_values.shape)
+
+        if self.adaptive_curves:
+            # Coarse samples are split where the curve bends or jumps on the
+            # screen, each round of new samples evaluated at once
+            step = (self.xrange[1] - self.xrange[0]) / self.width
+            _, x_values, y_values, breaks = evaluator.curves.sample(
+                curve, self.xrange[0], self.xrange[1],
+                (self.xrange, self.yrange, self.width, self.height),
+                max(2, self.width // CURVE_INITIAL_SPACING + 1),
+                self.curve_sample_budget, step * CURVE_RESOLUTION)
+            x_values, y_values = evaluator.curves.polyline(x_values, y_values,
+                                                           breaks)
+        else:
+            x_values, y_values = curve(np.linspace(self.xrange[0],
+                                                   self.xrange[1], self.width))
+        engine = 'scalar' if 'scalar' in engines else engines[0]
+        return [('line', x_values, y_values)], engine
 
     def is_y_fx(self, tree):
         root = tree.get_root()
@@ -85,83 +192,72 @@ class Grapher:
         return False
 
     def implicit(self, right_func, left_func):
-        xs = np.linspace(self.xrange[0], self.xrange[1], self.width//10)
-        ys = np.linspace(self.yrange[0], self.yrange[1], self.height//10)
-        X, Y = np.meshgrid(xs, ys)
-        Z = np.zeros(X.shape)
-        for i in range(self.width//10):
-            for j in range(self.height//10):
-                Z[j, i] = (self.executor.evaluate_function(right_func, (X[j, i], Y[j, i]), ('x', 'y')) -
-                           self.executor.evaluate_function(left_func, (X[j, i], Y[j, i]), ('x', 'y')))
-
-        border_points = [[],[]]
-
-        dx = 0.000001
-
-        for i in range(1, self.width//10-1):
-            for j in range(1, self.height//10-1):
-                if Z[j-1, i] < 0 < Z[j+1, i] or Z[j+1, i] < 0 < Z[j-1, i] or Z[j, i-1] < 0 < Z[j, i+1] or Z[j, i+1] < 0 < Z[j, i-1]:
-                    x = X[j, i]
-                    y = Y[j, i]
-
-                    counter = 0
-                    height = Z[j-1, i]
-                    while height**2 > 0.00001 and counter < 50 :
-                        height = self.executor.evaluate_function(right_func, (x, y),
-                                                                 ('x', 'y')) - self.executor.evaluate_function(
-                            left_func, (x, y), ('x', 'y'))
-                        x_derivative = (height -
-                                        self.executor.evaluate_function(right_func, (x - dx, y), ('x', 'y')) +
-                                        self.executor.evaluate_function(left_func, (x - dx, y), ('x', 'y'))) / dx
-                        x -= height/x_derivative
-                        counter += 1
-
-                    if counter < 50:
-                        border_points[0].append(x)
-                        border_points[1].append(y)
-
-        verts = []
-        codes = []
-
-        for i in range(len(border_points[0])):
-            for direction in [-1, 1]:
-                x = border_points[0][i]
-                y = border_points[1][i]
-
-                verts.append((x, y))
-                codes.append(Path.MOVETO)
-
-                for _ in range(100):
-                    height = self.executor.evaluate_function(right_func, (x, y),
-                                                             ('x', 'y')) - self.executor.evaluate_function(
-                        left_func, (x, y), ('x', 'y'))
-                    x_derivative = (height -
-                                    self.executor.evaluate_function(right_func, (x - dx, y), ('x', 'y')) +
-                                    self.executor.evaluate_function(left_func, (x - dx, y), ('x', 'y'))) / dx
-                    y_derivative = (height -
-                                    self.executor.evaluate_function(right_func, (x, y - dx), ('x', 'y')) +
-                                    self.executor.evaluate_function(left_func, (x, y - dx), ('x', 'y'))) / dx
-
-                    x -= height/x_derivative
-                    verts.append((x,y))
-                    codes.append(Path.MOVETO)
-
-
-                    normal = np.sqrt(x_derivative**2 + y_derivative**2)
-                    normal *= direction
-                    normal *= 100
-                    x_derivative /= normal
-                    y_derivative /= normal
-                    x_derivative, y_derivative = -x_derivative, y_derivative
-                    x += x_derivative
-                    y += y_derivative
-
-                    verts.append((x, y))
-                    codes.append(Path.LINETO)
-
-        path = Path(verts, codes)
-        patch = patches.PathPatch(path)
-        plt.gca().add_patch(patch)
+        # Marching squares over a quadtree of cells split only near the curve
+        # down to a pixel across, or over a grid evaluated in one pass
+        engines = set()
+
+        def height(x, y):
+            right, right_engine = self.executor.evaluate_array(
+                right_func, (x, y), ('x', 'y'))
+            left, left_engine = self.executor.evaluate_array(
+                left_func, (x, y), ('x', 'y'))
+            engines.update((right_engine, left_engine))
+            return np.real(right - left)
+
+        if self.adaptive_implicit:
+            x_step = (self.xrange[1] - self.xrange[0]) / self.width
+            y_step = (self.yrange[1] - self.yrange[0]) / self.height
+            starts, ends, low, high, segments = evaluator.contour.quadtree(
+                lambda rows, columns: height(
+                    self.xrange[0] + columns * x_step,
+                    self.yrange[0] + rows * y_step),
+                self.height, self.width, self.implicit_cell_budget,
+                IMPLICIT_CELL_SIZE_ADAPTIVE)
+            start_x = self.xrange[0] + starts[:, 1] * x_step
+            start_y = self.yrange[0] + starts[:, 0] * y_step
+            end_x = self.xrange[0] + ends[:, 1] * x_step
+            end_y = self.yrange[0] + ends[:, 0] * y_step
+        else:
+            xs = np.linspace(self.xrange[0], self.xrange[1],
+                             max(2, self.width // IMPLICIT_CELL_SIZE))
+            ys = np.linspace(self.yrange[0], self.yrange[1],
+                             max(2, self.height // IMPLICIT_CELL_SIZE))
+            X, Y = np.meshgrid(xs, ys)
+            starts, ends, low, high, segments = evaluator.contour.march(
+                height(X, Y))
+            start_x, start_y = xs[starts[:, 1]], ys[starts[:, 0]]
+            end_x, end_y = xs[ends[:, 1]], ys[ends[:, 0]]
+        fractions = low / (low - high)
+
+        if self.refine_implicit and fractions.size:
+            # Each crossing is moved onto the curve along its edge, leaving
+            # out those which turn out to be poles rather than the curve
+            def along(fraction, indices):
+                return height(
+                    start_x[indices] + fraction * (end_x[indices]
+                                                   - start_x[indices]),
+                    start_y[indices] + fraction * (end_y[indices]
+                                                   - start_y[indices]))
+
+            fractions, found = evaluator.builtins.functions.brent(
+                along, np.zeros(fractions.shape), np.ones(fractions.shape),
+                IMPLICIT_TOLERANCE, (low, high))
+            poles = ~(np.abs(found) <= np.maximum(np.abs(low), np.abs(high)))
+            segments = segments[~(poles[segments[:, 0]]
+                                  | poles[segments[:, 1]])]
+
+        x = start_x + fractions * (end_x - start_x)
+        y = start_y + fractions * (end_y - start_y)
+        # The polylines are drawn as one line, separated by nan
+        polylines = evaluator.contour.join(segments, fractions.size)
+        indices = np.concatenate(
+            [np.append(polyline, -1) for polyline in polylines]
+            or [np.zeros(0, dtype=int)])
+        x = np.where(indices >= 0, x[indices], np.nan)
+        y = np.where(indices >= 0, y[indices], np.nan)
+
+        engine = 'vector' if engines == {'vector'} else 'scalar'
+        return [('line', x, y)], engine
 
     def is_parametric(self, tree):
         root = tree.get_root()
@@ -171,13 +267,33 @@ class Grapher:
                     return True
         return False
 
-    def parametric(self, x_function, y_function, t_values):
-        x_values = []
-        y_values = []
-        for t in t_values:
-            x_values.append(self.executor.evaluate_function(x_function, t, identifier='t'))
-            y_values.append(self.executor.evaluate_function(y_function, t, identifier='t'))
-        plt.plot(x_values, y_values)
+    def parametric(self, function):
+        engines = []
+
+        def curve(t_values):
+            # Both coordinates are evaluated together as a tuple, giving a
+            # column for each
+            points, engine = self.executor.evaluate_array(function, t_values,
+                                                          identifier='t')
+            engines.append(engine)
+            points = np.asarray(points)
+            if points.shape != t_values.shape + (2,):
+                raise ValueError
+            return points[:, 0], points[:, 1]
+
+        # Samples are spread by their distance along the curve on the screen,
+        # and parts of it off the view are not refined
+        low, high = self.trange
+        _, x_values, y_values, breaks = evaluator.curves.sample(
+            curve, low, high,
+            (self.xrange, self.yrange, self.width, self.height),
+            PARAMETRIC_INITIAL_SAMPLES, self.curve_sample_budget,
+            (high - low) / PARAMETRIC_INITIAL_SAMPLES / 2 ** PARAMETRIC_DEPTH,
+            length=CURVE_SEGMENT_LENGTH, cull=True)
+        x_values, y_values = evaluator.curves.polyline(x_values, y_values,
+                                                       breaks)
+        engine = 'scalar' if 'scalar' in engines else engines[0]
+        return [('line', x_values, y_values)], engine
 
     def is_intersect(self, tree):
         root = tree.get_root()
@@ -191,20 +307,23 @@ class Grapher:
         return False
 
     def intersect(self, function1, function2):
-        x = 0
-        dx = 0.0001
-        height = 1
-
-        for _ in range(100):
-            height = self.executor.evaluate_function(function1, x) - \
-                     self.executor.evaluate_function(function2, x)
-            slope = (height - self.executor.evaluate_function(function1, x - dx)
-                     + self.executor.evaluate_function(function2, x - dx)) / dx
-            x -= height/slope
-        if height**2 < 0.001:
-            y = self.executor.evaluate_function(function1, x)
-            plt.scatter([x], [y])
-            plt.gca().annotate(f"({x:f}, {y:f})", (x, y))
+        # Every intersection in view, from the sign changes of the difference
+        # across the pixels, each refined with Brent's method
+        engines = set()
+
+        def height(x_values):
+            value1, engine1 = self.executor.evaluate_array(function1, x_values)
+            value2, engine2 = self.executor.evaluate_array(function2, x_values)
+            engines.update((engine1, engine2))
+            return value1 - value2
+
+        x_values = evaluator.builtins.functions.find_roots(
+            height, self.xrange[0], self.xrange[1], self.width)
+        y_values, engine = self.executor.evaluate_array(function1, x_values)
+        engines.add(engine)
+        engine = 'vector' if engines == {'vector'} else 'scalar'
+        points = [('point', x, y) for x, y in zip(x_values, np.real(y_values))]
+        return points, engine
 
     def get_function(self, tree):
         root = tree.get_root()
@@ -16,5 +16,6 @@ START_BRACKETS = '([{'
 END_BRACKETS = ')]}'
 BRACKETS = START_BRACKETS + END_BRACKETS
 LINE_BREAK = [r'\\']
+MULTI_CHAR_OPERATORS = ['=>', '<=', '>=', '->', '!=']
 
 VALID_NUMBER_REGEX = r"[-+]?([0-9]+|[0-9]+\.[0-9]*|[0-9]*\.[0-9]+)([eE]-?[0-9]+)?"
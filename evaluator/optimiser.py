@@ -0,0 +1,167 @@
+"""Finds the subexpressions that can be computed once and shared
+
+Identical subtrees, whether in the same statement or in different ones, are
+hash-consed to the same key, and the free variables of each subtree are
+found. A subtree using none of the variables bound around it has the same
+value wherever it is evaluated, as the globals never change once an executor
+is made, so it only needs to be computed once.
+
+Classes:
+    Optimiser(object)
+        -- Hash-conses the subtrees of an executor's trees
+"""
+
+import re
+import threading
+
+import evaluator.operators
+
+
+class Optimiser:
+    """Hash-conses the subtrees of an executor's trees
+
+    Each node is given an integer key which is the same for every node with
+    the same structure. The keys and free variables are found for a whole
+    subtree at once, without recursion, the first time any node in it is
+    looked up.
+
+    Attributes:
+        __keys: dict[evaluator.execution_tree.ExecutionTree.__Node, int]
+            -- The key of each node seen so far
+        __free_variables: dict[evaluator.execution_tree.ExecutionTree.__Node,
+                               frozenset[str]]
+            -- The variables used but not bound within each node
+        __structures: dict[tuple, int]
+            -- The key given to each distinct structure
+        __lock: threading.Lock
+            -- Held while new keys are given out
+
+    Methods:
+        __init__()
+            -- The initialiser for the class
+
+        get_key(node: evaluator.execution_tree.ExecutionTree.__Node) -> int
+            -- Gets the key shared by every subtree identical to node
+
+        get_free_variables(node: evaluator.execution_tree.ExecutionTree.__Node)
+                -> frozenset[str]
+            -- Gets the variables used but not bound within node
+
+        is_constant(node: evaluator.execution_tree.ExecutionTree.__Node,
+                    scope: Iterable[str]) -> bool
+            -- Checks if node uses none of the variables in scope
+
+        __analyse(node: evaluator.execution_tree.ExecutionTree.__Node) -> None
+            -- Finds the key and free variables of every node under node
+    """
+    def __init__(self):
+        """The initialiser for the class"""
+        self.__keys = {}
+        self.__free_variables = {}
+        self.__structures = {}
+        self.__lock = threading.Lock()
+
+    def get_key(self, node):
+        """Gets the key shared by every subtree identical to node
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The root of the subtree
+
+        Returns:
+            key: int
+                -- The key of the subtree
+        """
+        if node not in self.__keys:
+            self.__analyse(node)
+        return self.__keys[node]
+
+    def get_free_variables(self, node):
+        """Gets the variables used but not bound within node
+
+        Literals and quoted names are not variables. Globals are included,
+        as a function's parameter may shadow them.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The root of the subtree
+
+        Returns:
+            variables: frozenset[str]
+                -- The names of the free variables
+        """
+        if node not in self.__free_variables:
+            self.__analyse(node)
+        return self.__free_variables[node]
+
+    def is_constant(self, node, scope):
+        """Checks if node uses none of the variables in scope
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The root of the subtree
+            scope: Iterable[str]
+                -- The variables bound around the node
+
+        Returns:
+            is_constant: bool
+                -- Whether the node has the same value in any scope
+        """
+        return self.get_free_variables(node).isdisjoint(scope)
+
+    def __analyse(self, node):
+        """Finds the key and free variables of every node under node
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The root of the subtree
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            # Nodes are visited twice, expanding them the first time and
+            # combining their children's results the second
+            stack = [(node, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if node in self.__keys:
+                    continue
+
+                if node.is_identifier():
+                    name = node.name.item
+                    structure = ('identifier', name)
+                    if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX,
+                                    name):
+                        variables = frozenset()
+                    else:
+                        variables = frozenset((name,))
+
+                elif not expanded:
+                    stack.append((node, True))
+                    stack.extend((child, False)
+                                 for child in node.get_children())
+                    if node.is_funcdef():
+                        stack.append((node.identifier, False))
+                    continue
+
+                elif node.is_function_call():
+                    structure = ('call', self.__keys[node.function],
+                                 self.__keys[node.parameter])
+                    if (node.function.is_identifier()
+                            and node.function.name.item == '"'):
+                        # Quoting gives the name rather than the variable
+                        variables = frozenset()
+                    else:
+                        variables = (self.__free_variables[node.function]
+                                     | self.__free_variables[node.parameter])
+
+                else:
+                    structure = ('function', self.__keys[node.identifier],
+                                 self.__keys[node.expr])
+                    variables = (self.__free_variables[node.expr]
+                                 - self.__free_variables[node.identifier])
+
+                self.__keys[node] = self.__structures.setdefault(
+                    structure, len(self.__structures))
+                self.__free_variables[node] = variables
@@ -0,0 +1,99 @@
+"""A cache of parsed lines so unchanged statements are not parsed again
+
+Classes:
+    ParseCache(evaluator.cache.LRUCache)
+        -- A bounded least recently used cache of parsed lines
+
+Functions:
+    split_lines(raw_text: str) -> list[str]
+        -- Splits raw text into the text of each line
+
+Global variables:
+    CACHE: ParseCache
+        -- The cache used by evaluator.evaluate
+"""
+
+import evaluator.cache
+import evaluator.parser
+
+
+class ParseCache(evaluator.cache.LRUCache):
+    """A bounded least recently used cache of parsed lines
+
+    Lines are keyed by their text with runs of whitespace collapsed, which
+    never changes how a line is tokenised. Evaluating a tree never changes
+    it, so the cached trees are shared by every executor that uses them.
+
+    Methods:
+        __init__(max_size: int)
+            -- The initialiser for the class
+
+        parse(raw_text: str) -> list[evaluator.execution_tree.ExecutionTree]
+            -- Parses raw text, using the cache for any lines seen before
+
+        parse_line(line: str) -> evaluator.execution_tree.ExecutionTree
+            -- Parses a single line, using the cache if it has been seen
+    """
+    def __init__(self, max_size=512):
+        """The initialiser for the class
+
+        Arguments:
+            max_size: int (default 512)
+                -- The maximum number of lines stored
+        """
+        super().__init__(max_size)
+
+    def parse(self, raw_text):
+        """Parses raw text, using the cache for any lines seen before
+
+        Arguments:
+            raw_text: str
+                -- The raw text to be parsed
+
+        Returns:
+            trees: list[evaluator.execution_tree.ExecutionTree]
+                -- The parsed trees for each line
+        """
+        return [self.parse_line(line) for line in split_lines(raw_text)]
+
+    def parse_line(self, line):
+        """Parses a single line, using the cache if it has been seen
+
+        Arguments:
+            line: str
+                -- The text of the line, without any line breaks
+
+        Returns:
+            tree: evaluator.execution_tree.ExecutionTree
+                -- The parsed tree, which must not be modified
+        """
+        key = ' '.join(line.split())
+        tree = self.get(key)
+        if tree is None:
+            tree, = evaluator.parser.Parser(key).parse()
+            self.put(key, tree)
+        return tree
+
+
+def split_lines(raw_text):
+    """Splits raw text into the text of each line
+
+    Arguments:
+        raw_text: str
+            -- The raw text to be split
+
+    Returns:
+        lines: list[str]
+            -- The text between each line break
+    """
+    lines = []
+    start = 0
+    for kind, _, token_start, token_end in evaluator.parser.tokenise(raw_text):
+        if kind == 'line_break':
+            lines.append(raw_text[start:token_start])
+            start = token_end
+    lines.append(raw_text[start:])
+    return lines
+
+
+CACHE = ParseCache()
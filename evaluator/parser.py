@@ -3,24 +3,44 @@
 Classes:
     Parser(object)
         -- The parser class that is used to parse text into execution trees
-    PriorityQueue(object)
-        -- A priority queue implemented using a heap
 
 Functions:
+    tokenise(raw_text: str) -> Iterator[tuple[str, str, int, int]]
+        -- Lazily splits raw text into (kind, text, start, end) tokens
     test() -> None
         -- Used to test if the parser is working
-    swap(arr: list, i: int, j: int) -> None
-        -- Swaps two items in an array
 
+Global variables:
+    TOKEN_REGEX: re.Pattern
+        -- The master regex matching any single token
 """
 
-# For checking if something is a number
+# For splitting the raw text into tokens
 import re
+import sys
 
 # Importing the internal modules
 import evaluator.operators
 import evaluator.execution_tree
 
+# Each alternative is tried in order, so line breaks are found before
+# identifiers and two character operators before single characters. A number
+# never ends in an 'e' as the exponent needs digits, so 'e' is left to be
+# matched as a letter.
+TOKEN_REGEX = re.compile(r"""
+    (?P<line_break>\\\\)
+    | \\(?P<name>(?:[^\W_]{identifiers})*)
+    | (?P<number>(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE]-?[0-9]+)?)
+    | (?P<letter>[^\W\d_])
+    | (?P<whitespace>\s+)
+    | (?P<operator>{operators}|.)
+    """.format(
+    identifiers=''.join('|' + re.escape(char)
+                        for char in evaluator.operators.NON_ALPHA_IDENTIFIERS),
+    operators='|'.join(re.escape(operator) for operator
+                       in evaluator.operators.MULTI_CHAR_OPERATORS)),
+    re.VERBOSE | re.DOTALL)
+
 
 class Parser:
     """The parser class used to parse text into expression trees
@@ -36,10 +56,12 @@ class Parser:
             -- The tokens that have been parsed
         __lines: list[list[Parser.__Token]] (default [])
             -- The tokens after they have been split into multiple lines
-        __curr_token: str (default "")
-            -- The current token in the process of being tokenised
         __trees: list[evaluator.execution_tree.ExecutionTree]
             -- The parsed trees for each line
+        __line: list[Parser.__Token] (default [])
+            -- The line currently being parsed into a tree
+        __index: int (default 0)
+            -- The index of the next token to parse in __line
 
     Methods:
         __init__(raw_text: str)
@@ -51,20 +73,6 @@ class Parser:
         __tokenise() -> None
             -- Tokenises the raw text and puts the tokens into __tokens
 
-        __add_token() -> None
-            -- Adds the current token into __tokens
-
-        __is_number(string: str) -> bool
-            -- Checks if the string is a valid number
-
-        __maintains_tokens_numericness(char: str) -> bool
-            -- Checks if adding char onto the end of the token keeps it a
-               valid number
-
-        __get_operator_queue(tokens: list[Parser.__Tokens]) -> PriorityQueue
-            -- Returns a queue of all the tokens in order of when to re-arange
-               them
-
         __negate() -> None
             -- Converts the subtraction/addition operators into negation/ignore
                operators in the right conditions resepctively.
@@ -72,27 +80,30 @@ class Parser:
         __break_lines() -> None
             -- Breaks __tokens up into separate lines and puts them in __lines
 
-        __get_preblock(index: int, tokens: list[Parser.__Token]) -> int
-            -- Gets the index of the start of the preceding block
+        __create_expression_trees() -> None
+            -- Creates the expression trees from the lines of tokens
 
-        __get_postblock(index: int, tokens: list[Parser.__Token]) -> int
-            -- Gets the index of the end of the succeeding block
+        __peek() -> Parser.__Token | None
+            -- Gets the next token in the current line without consuming it
 
-        __reformat() -> None
-            -- Reformats the tokens into prefix notation
+        __advance() -> Parser.__Token
+            -- Consumes the next token in the current line
 
-        __create_expression_trees() -> None
-            -- Creates the expression trees from the lines of tokens
+        __parse_expression(
+                tree: evaluator.execution_tree.ExecutionTree
+                min_score: float)
+                -> evaluator.execution_tree.ExecutionTree.__Node | None
+            -- Parses operators binding more tightly than min_score
 
-        __recurse_create_tree(
-                tree: evaluator.expression_tree.ExpressionTree
-                parent: evaluator.expression_tree.ExpressionTree.__Node
-                iterator: Iterator)
-            -- Creates the expression tree using a recursive algorithm
+        __parse_block(tree: evaluator.execution_tree.ExecutionTree)
+                -> list[evaluator.execution_tree.ExecutionTree.__Node]
+            -- Parses the block of juxtaposed items up to the next operator
 
-        __compress_tree() -> None
-            -- Makes sure that every node in the tree has either 2 children or
-               is a leaf.
+        __apply_all(
+                tree: evaluator.execution_tree.ExecutionTree
+                items: list[evaluator.execution_tree.ExecutionTree.__Node])
+                -> evaluator.execution_tree.ExecutionTree.__Node | None
+            -- Applies each item to the result of the previous ones
 
         __equality_to_definition() -> None
             -- Converts Statements in the form ((= (let ...)) ...) into the
@@ -120,6 +131,8 @@ class Parser:
             __str__() -> str
                 -- Used for the string representation of the class
         """
+        __slots__ = ('item',)
+
         def __init__(self, item):
             """The initiliser
 
@@ -162,8 +175,9 @@ class Parser:
         self.__raw_text = raw_text
         self.__tokens = []
         self.__lines = []
-        self.__curr_token = ""
         self.__trees = []
+        self.__line = []
+        self.__index = 0
 
     def parse(self):
         """Parses the statements and returns the parsed trees for each line
@@ -181,7 +195,6 @@ class Parser:
         self.__tokenise()
         self.__negate()
         self.__break_lines()
-        self.__reformat()
         self.__create_expression_trees()
         self.__equality_to_definition()
         self.__function_definition_to_lambda()
@@ -197,204 +210,10 @@ class Parser:
         Returns:
             None
         """
-
-        self.__curr_token = ""  # Resets the current token
-
-        # The pointer is treated as initially in whitespace as that indicates
-        # that the tokeniser should look out for the next item and ignore any
-        # initial whitepace.
-        in_whitespace = True  # Is the pointer currently in whitespace?
-        in_number = False  # Is the pointer currently in a literal number?
-        in_identifier = False  # Is the pointer currently in an identifier?
-
-        # Iterate through __raw_text characterwise
-        for char in self.__raw_text:
-
-            # If the character is a '\', it is either the start of an
-            # identifier, or the end of a line break
-            if char == '\\':
-                # If it is a line break
-                if in_identifier and self.__curr_token == "":
-                    self.__curr_token = "\\\\"
-                    self.__add_token()
-                    in_identifier = False
-                    in_whitespace = True
-                    in_number = False
-                # Otherwise, it is the start of a token
-                else:
-                    self.__add_token()
-                    in_identifier = True
-                    in_whitespace = False
-                    in_number = False
-            # If the character is whitespace, it must be the end of a token or
-            # already in whitespace
-            elif char.isspace():
-                if in_whitespace:
-                    continue
-                self.__add_token()
-                in_identifier = False
-                in_whitespace = True
-                in_number = False
-
-            # If the token is a number so far
-            elif in_number:
-                # Check if it still is a number after adding the current char
-                if (self.__maintains_tokens_numericness(char)
-                        or self.__maintains_tokens_numericness(char + '0')):
-                    self.__curr_token += char
-                else:
-                    # Make sure to remove any dangling 'e's which are valid in
-                    # the middle of a number but not at the start or end of one
-                    if self.__curr_token[-1] in 'eE':
-                        suffix = self.__curr_token[-1]
-                        self.__curr_token = self.__curr_token[:-1]
-                        self.__add_token()
-                        self.__curr_token = suffix
-                    self.__add_token()
-                    self.__curr_token += char  # As this is not whitespace,
-                    # the char should be acknowledged
-                    in_number = False
-
-            # If the token is currently an identifier
-            elif in_identifier:
-                # Add the character to the identifier if it can
-                if char.isalnum() or char in evaluator.operators.NON_ALPHA_IDENTIFIERS:
-                    self.__curr_token += char
-                # Otherwise, end the identifier
-                else:
-                    self.__add_token()
-                    self.__curr_token += char  # As this is not whitespace, the
-                    # char should be acknowledged
-                    in_identifier = False
-
-            # If it is a single letter identifier
-            elif char.isalpha():
-                self.__add_token()
-                self.__curr_token += char
-                in_whitespace = False
-
-            # If the token can start a number, make it start one
-            elif char.isnumeric() or char in '.':
-                self.__add_token()
-                self.__curr_token += char
-                in_whitespace = False
-                in_number = True
-
-            else:  # Otherwise, treat it as a single operator
-                self.__add_token()
-                self.__curr_token += char
-                self.__add_token()
-                in_whitespace = False
-
-        # Add the remaining token to the list
-        self.__add_token()
-
-        # This makes sure that arrows/le/ge/ne are treated as a single string
-        new_tokens = []
-        for i in self.__tokens:
-            if len(new_tokens) == 0:
-                new_tokens.append(i)
-            else:
-                if (new_tokens[-1], i.item) in [('=', '>'), ('<', '='),
-                                                ('>', '='), ('-', '>'),
-                                                ('!', '=')]:
-                    new_tokens[-1].item += i.item
-                else:
-                    new_tokens.append(i)
-
-        # set __tokens to the new tokens created
-        self.__tokens = new_tokens
-
-    def __add_token(self):
-        """Adds the current token to __tokens
-
-        Arguments:
-            None
-
-        Returns:
-            None
-        """
-        # If the current token is not an empty string
-        if self.__curr_token:
-            # Add it to tokens
-            self.__tokens.append(self.__Token(self.__curr_token))
-            # And reset it
-            self.__curr_token = ""
-
-    @staticmethod
-    def __is_number(string):
-        """Checks if a string is a valid number
-
-        Arguments:
-            string: str -- The string to check
-
-        Returns:
-            is_number: bool -- Whether that string is a number
-        """
-        if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX, string):
-            return True
-        else:
-            return False
-
-    def __maintains_tokens_numericness(self, char):
-        """Checks if the token will remain a valid number after adding char
-
-        Arguments:
-            char: str -- The character
-
-        Returns:
-            is_still_number: bool -- Whether the token would remain a number
-        """
-        if self.__is_number(self.__curr_token + char):
-            return True
-        else:
-            return False
-
-    @staticmethod
-    def __get_operator_queue(tokens):
-        """Creates a queue of operators from a list of tokens
-
-        The scoring is in the order:
-        (bracket_level, operator_precedence, right-to-left)
-
-        Arguments:
-            tokens: list[Parser.__Token] -- The tokens
-
-        Returns:
-            queue: PriorityQueue -- The queue of tokens
-        """
-
-        # Create an empty queue
-        queue = PriorityQueue()
-
-        # How many brackets deep is the current token?
-        bracket_level = 0
-        for i in range(len(tokens)):
-            token = tokens[i].item  # Get the value of the token
-            score = (bracket_level, -1, -i)  # The default score
-
-            # Deal with entering or leaving brackets
-            if token in evaluator.operators.START_BRACKETS:
-                bracket_level += 1
-            elif token in evaluator.operators.END_BRACKETS:
-                bracket_level -= 1
-
-            # Deal with the scoring of the token
-            elif token in evaluator.operators.INFIX_BINARY_SCORE:
-                score = (bracket_level,
-                         evaluator.operators.INFIX_BINARY_SCORE[token], -i)
-            elif token in evaluator.operators.POSTFIX_UNARY_SCORE:
-                score = (bracket_level,
-                         evaluator.operators.POSTFIX_UNARY_SCORE[token], -i)
-            elif token in evaluator.operators.PREFIX_UNARY_SCORE:
-                score = (bracket_level,
-                         evaluator.operators.PREFIX_UNARY_SCORE[token], -i)
-            else:
-                # A standard identifier
-                score = (bracket_level, 0, -i)
-
-            queue.insert(tokens[i], score)
-        return queue
+        # The text of each token is interned so every occurrence of a name
+        # across the cached trees shares one string
+        self.__tokens = [self.__Token(sys.intern(text))
+                         for _, text, _, _ in tokenise(self.__raw_text)]
 
     def __negate(self):
         """Turns binary addition/subtraction operators into unary ignore/negate
@@ -434,150 +253,193 @@ class Parser:
             else:
                 self.__lines[-1].append(token)
 
-    @staticmethod
-    def __get_preblock(index, tokens):
-        """Gets the index of the block preceding the current token
+    def __create_expression_trees(self):
+        """Creates the expression trees from the lines of tokens
+
+        Each line is parsed in a single pass by precedence climbing. The
+        scores in evaluator.operators decide how tightly each operator binds
+        and operators with equal scores associate to the left.
 
         Arguments:
-            index: int -- The index of the current token
+            None
 
         Returns:
-            pre_block_index: int -- The index of the start of the block
+            None
         """
-        pre_block_index = index - 1
-        bracket_level = 0
+        for tokens in self.__lines:
+            tree = evaluator.execution_tree.ExecutionTree()
+            self.__line = tokens
+            self.__index = 0
 
-        while (bracket_level > 0 or (
-                tokens[pre_block_index].item not in evaluator.operators.INFIX_BINARY_SCORE
-                and tokens[pre_block_index].item not in evaluator.operators.START_BRACKETS)
-        ):
-            if tokens[pre_block_index].item in evaluator.operators.END_BRACKETS:
-                bracket_level += 1
-            elif tokens[pre_block_index].item in evaluator.operators.START_BRACKETS:
-                bracket_level -= 1
-            pre_block_index -= 1
+            root = self.__parse_expression(tree, -1)
+            if self.__index < len(tokens):
+                raise ValueError('Unmatched closing bracket')
+            if root is None or not root.is_function_call():
+                raise ValueError('Line is not a statement')
 
-        pre_block_index += 1
+            tree.set_root(root)
+            self.__trees.append(tree)
 
-        return pre_block_index
+    def __peek(self):
+        """Gets the next token in the current line without consuming it
 
-    @staticmethod
-    def __get_postblock(index, tokens):
-        """Gets the index of the block succeeding the current token
+        Arguments:
+            None
+
+        Returns:
+            token: Parser.__Token | None
+                -- The next token, or None at the end of the line
+        """
+        if self.__index < len(self.__line):
+            return self.__line[self.__index]
+        return None
+
+    def __advance(self):
+        """Consumes the next token in the current line
 
         Arguments:
-            index: int -- The index of the current token
+            None
 
         Returns:
-            post_block_index: int -- The index of the end of the block
+            token: Parser.__Token -- The token consumed
         """
-        bracket_level = 0
-        post_block_index = index + 1
-        while post_block_index < len(tokens) and (bracket_level > 0 or (
-                tokens[post_block_index].item not in evaluator.operators.INFIX_BINARY_SCORE
-                and (tokens[post_block_index].item not in evaluator.operators.END_BRACKETS
-                     or tokens[index].item in evaluator.operators.INFIX_BINARY_SCORE))
-        ):
-            if tokens[post_block_index].item in evaluator.operators.END_BRACKETS:
-                bracket_level -= 1
-            elif tokens[post_block_index].item in evaluator.operators.START_BRACKETS:
-                bracket_level += 1
-            post_block_index += 1
-
-        return post_block_index
-
-    # noinspection PyUnresolvedReferences
-    def __reformat(self):
-        for tokens in self.__lines:
-            queue = self.__get_operator_queue(tokens)
-            tokens.insert(0, self.__Token('('))
-            tokens.append(self.__Token(')'))
-            while not queue.is_empty():
-                token = queue.extract_max()
-                index = tokens.index(token)
-                if token.item in evaluator.operators.INFIX_BINARY_SCORE:
-                    pre_block_index = self.__get_preblock(index, tokens)
-                    post_block_index = self.__get_postblock(index, tokens)
-                    # End of partial application
-                    tokens[index] = self.__Token(')')
-                    # End of full application
-                    tokens.insert(post_block_index, self.__Token(')'))
-
-                    tokens.insert(pre_block_index, token)
-                    # Start of partial application
-                    tokens.insert(pre_block_index, self.__Token('('))
-                    # Start of full application
-                    tokens.insert(pre_block_index, self.__Token('('))
-                elif token.item in evaluator.operators.POSTFIX_UNARY_SCORE:
-                    pre_block_index = self.__get_preblock(index, tokens)
-                    tokens.insert(index, self.__Token(')'))  # Application end
-
-                    tokens.insert(pre_block_index, token)
-                    # Application start
-                    tokens.insert(pre_block_index, self.__Token('('))
-                elif token.item not in evaluator.operators.BRACKETS:
-                    post_block_index = self.__get_postblock(index, tokens)
-                    # End of application
-                    tokens.insert(post_block_index, self.__Token(')'))
-                    # Start of application
-                    tokens.insert(index, self.__Token('('))
+        token = self.__line[self.__index]
+        self.__index += 1
+        return token
 
-    def __create_expression_trees(self):
-        for tokens in self.__lines:
-            tree = evaluator.execution_tree.ExecutionTree()
-            root = tree.create_function_call()
-            assert root is tree.get_root()
-            self.__recurse_create_tree(tree, root, iter(tokens))
-            self.__compress_tree(tree)
-            self.__trees.append(tree)
+    def __parse_expression(self, tree, min_score):
+        """Parses operators binding more tightly than min_score
+
+        Operands may be empty (e.g. in 'a = > b'), in which case the operator
+        is only partially applied to the operand that is present.
+
+        Arguments:
+            tree: evaluator.execution_tree.ExecutionTree
+                -- The tree the nodes are created in
+            min_score: float
+                -- The score of the operator to the left of the expression
+
+        Returns:
+            node: evaluator.execution_tree.ExecutionTree.__Node | None
+                -- The parsed expression, or None if it is empty
+        """
+        left = self.__apply_all(tree, self.__parse_block(tree))
+
+        while True:
+            token = self.__peek()
+            if token is None or token.item in evaluator.operators.END_BRACKETS:
+                break
+
+            if token.item in evaluator.operators.INFIX_BINARY_SCORE:
+                score = evaluator.operators.INFIX_BINARY_SCORE[token.item]
+                if score <= min_score:
+                    break
+                self.__advance()
+                right = self.__parse_expression(tree, score)
+                operator = tree.create_identifier(token)
+                if left is not None:
+                    operator = self.__apply_all(tree, [operator, left])
+                if right is not None:
+                    operator = self.__apply_all(tree, [operator, right])
+                left = operator
+
+            elif token.item in evaluator.operators.POSTFIX_UNARY_SCORE:
+                score = evaluator.operators.POSTFIX_UNARY_SCORE[token.item]
+                if score <= min_score:
+                    break
+                self.__advance()
+                operator = tree.create_identifier(token)
+                if left is not None:
+                    operator = self.__apply_all(tree, [operator, left])
+                # Anything juxtaposed after it is applied to the result
+                left = self.__apply_all(tree,
+                                        [operator] + self.__parse_block(tree))
+
+            else:
+                raise ValueError(f'Unexpected token {token}')
+
+        return left
+
+    def __parse_block(self, tree):
+        """Parses the block of juxtaposed items up to the next operator
+
+        Bracketed items are applied to each other from the left. An
+        identifier is applied to the rest of the block, so the block is
+        split at each identifier and folded from the right. A prefix
+        operator is applied to the rest of the block along with any
+        operators after it whose scores are higher than its own.
 
-    def __recurse_create_tree(self, tree, parent, iterator):
-        children = []
-        for token in iterator:
-            if token.item in evaluator.operators.START_BRACKETS:
-                child = tree.create_function_call()
-                self.__recurse_create_tree(tree, child, iterator)
-                children.append(child)
-            elif token.item in evaluator.operators.END_BRACKETS:
+        Arguments:
+            tree: evaluator.execution_tree.ExecutionTree
+                -- The tree the nodes are created in
+
+        Returns:
+            items: list[evaluator.execution_tree.ExecutionTree.__Node]
+                -- The items in the block, to be applied in order
+        """
+        # The items before the first identifier and after each identifier
+        segments = [[]]
+        identifiers = []
+        while True:
+            token = self.__peek()
+            if (token is None
+                    or token.item in evaluator.operators.END_BRACKETS
+                    or token.item in evaluator.operators.INFIX_BINARY_SCORE
+                    or token.item in evaluator.operators.POSTFIX_UNARY_SCORE):
                 break
+
+            self.__advance()
+            if token.item in evaluator.operators.PREFIX_UNARY_SCORE:
+                # The operand is the rest of the block and any operators
+                # binding more tightly than the prefix operator
+                score = evaluator.operators.PREFIX_UNARY_SCORE[token.item]
+                operand = self.__parse_expression(tree, score)
+                operator = tree.create_identifier(token)
+                if operand is not None:
+                    operator = self.__apply_all(tree, [operator, operand])
+                segments[-1].append(operator)
+            elif token.item in evaluator.operators.START_BRACKETS:
+                item = self.__parse_expression(tree, -1)
+                if item is None:
+                    raise ValueError('Empty brackets')
+                # A missing end bracket is closed by the end of the line
+                if self.__peek() is not None:
+                    self.__advance()
+                segments[-1].append(item)
             else:
-                child = tree.create_identifier(token)
-                children.append(child)
-        match len(children):
-            case 0:
-                raise ValueError('Empty brackets')
-            case 1:
-                parent.add_parameter(children[0])
-            case 2:
-                parent.add_function(children[0])
-                parent.add_parameter(children[1])
-            case n:
-                function = children[0]
-                parameter = children[1]
-                for i in range(2, n):
-                    node = tree.create_function_call()
-                    node.add_function(function)
-                    node.add_parameter(parameter)
-                    function = node
-                    parameter = children[i]
-                parent.add_function(function)
-                parent.add_parameter(parameter)
+                identifiers.append(tree.create_identifier(token))
+                segments.append([])
+
+        items = segments.pop()
+        while identifiers:
+            identifier = identifiers.pop()
+            items = segments.pop() + [
+                self.__apply_all(tree, [identifier] + items)]
+        return items
 
     @staticmethod
-    def __compress_tree(tree):
-        for node in tree:
-            if node.is_function_call():
-                while node.parameter.is_function_call() \
-                        and node.parameter.function is None:
-                    node.set_parameter(node.parameter.parameter)
-                while node.function is not None \
-                        and node.function.is_function_call() \
-                        and node.function.function is None:
-                    node.set_function(node.function.parameter)
-        root = tree.get_root()
-        if root.function is None:
-            root.set_function(root.parameter.function)
-            root.set_parameter(root.parameter.parameter)
+    def __apply_all(tree, items):
+        """Applies each item to the result of the previous ones
+
+        Arguments:
+            tree: evaluator.execution_tree.ExecutionTree
+                -- The tree the nodes are created in
+            items: list[evaluator.execution_tree.ExecutionTree.__Node]
+                -- The items to apply
+
+        Returns:
+            node: evaluator.execution_tree.ExecutionTree.__Node | None
+                -- The resulting node, or None if there were no items
+        """
+        if not items:
+            return None
+        function = items[0]
+        for parameter in items[1:]:
+            node = tree.create_function_call()
+            node.add_function(function)
+            node.add_parameter(parameter)
+            function = node
+        return function
 
     def __equality_to_definition(self):
         for tree in self.__trees:
@@ -636,51 +498,48 @@ class Parser:
                                     node.parent.set_expr(function_def)
 
 
-class PriorityQueue:
-    def __init__(self):
-        # Heaps are best implemented using 1-indexed arrays
-        self.__heap = [(-1, None)]
-        self.n = 0
+def tokenise(raw_text):
+    """Lazily splits raw text into tokens
 
-    def insert(self, item, priority):
-        self.__heap.append((priority, item))
-        self.n += 1
-        i = self.n
-        while i > 1 and self.__heap[i >> 1][0] < self.__heap[i][0]:
-            swap(self.__heap, i, i >> 1)
-            i >>= 1
+    Identifiers are either a single letter or a '\\' followed by letters and
+    digits, and '\\\\' is a line break. A '.' directly after a number or
+    identifier is always an operator, so '1.2.3' is '1.2', '.' and '3'.
 
-    def extract_max(self):
-        if self.n <= 0:
-            return None
+    Arguments:
+        raw_text: str
+            -- The raw text to be tokenised
+
+    Yields:
+        token: tuple[str, str, int, int]
+            -- The kind, text, start and end of each token. The kind is one of
+               'line_break', 'identifier', 'number' or 'operator'
+    """
+    position = 0
+    previous = None  # The kind of the token directly before this one
+    while position < len(raw_text):
+        match = TOKEN_REGEX.match(raw_text, position)
+        kind = match.lastgroup
+        text = match.group(kind)
+        start, end = match.span()
+
+        if (kind == 'number' and text[0] == '.'
+                and previous in ('number', 'name', 'exponent')):
+            kind, text, end = 'operator', '.', start + 1
+        position = end
+
+        if kind == 'whitespace' or (kind == 'name' and not text):
+            previous = kind
+            continue
+
+        # An 'e' split off the end of a number still counts as part of it
+        if kind == 'letter' and text in 'eE' and previous == 'number':
+            previous = 'exponent'
         else:
-            value = self.__heap[1][1]
-            self.__heap[1] = self.__heap[self.n]
-            del self.__heap[self.n]
-            self.n -= 1
-            i = 1
-            while (i << 1) | 1 <= self.n and (self.__heap[i][0] <
-                                              self.__heap[i << 1][0]
-                                              or self.__heap[i][0] <
-                                              self.__heap[(i << 1) | 1][0]):
-                if self.__heap[i << 1][0] > self.__heap[(i << 1) | 1][0]:
-                    swap(self.__heap, i, i << 1)
-                    i <<= 1
-                else:
-                    swap(self.__heap, i, (i << 1) | 1)
-                    i <<= 1
-                    i |= 1
-
-        return value
-
-    def debug_print(self):
-        print(self.__heap)
-
-    def is_empty(self):
-        return self.n <= 0
-
-    def __len__(self):
-        return self.n
+            previous = kind
+
+        if kind in ('name', 'letter'):
+            kind = 'identifier'
+        yield kind, text, start, end
 
 
 def test():
@@ -689,9 +548,5 @@ def test():
     print(trees[0].get_root())
 
 
-def swap(arr, i, j):
-    arr[i], arr[j] = arr[j], arr[i]
-
-
 if __name__ == '__main__':
     test()
@@ -0,0 +1,421 @@
+"""A bounded cache of rendered graphs on disk which survives restarts
+
+Graphs are kept in static/images, named by a hash of the tokens of the
+source, the size and the ranges, so a graph which has been rendered before
+is found without parsing or evaluating anything. The cache is limited to a
+number of bytes, removing the least recently used graphs first, and graphs
+older than a time to live are removed too. Its entries are kept in an index
+file in the same directory, so they are still there after the server
+restarts.
+
+Classes:
+    RenderCache(evaluator.cache.LRUCache)
+        -- A bounded least recently used cache of rendered graphs on disk
+
+Functions:
+    get_key(raw_text: str, width: int, height: int, x_range: tuple,
+            y_range: tuple, t_range: tuple) -> str
+        -- Gets the name of a graph from everything that decides how it looks
+
+Global variables:
+    DIRECTORY: str
+        -- The directory graphs are kept in
+    INDEX: str
+        -- The name of the index file in that directory
+    QUOTA: int
+        -- The most bytes of graphs kept
+    TTL: float
+        -- How long in seconds a graph is kept after it is rendered
+    RENDER_VERSION: str
+        -- A hash of the source of the evaluator, which changes whenever
+           graphs may look different
+    SAVE_INTERVAL: float
+        -- The longest in seconds the counters go unwritten while graphs
+           are looked up
+    CACHE: RenderCache
+        -- The cache used by evaluator.render
+"""
+
+import atexit
+import glob
+import hashlib
+import json
+import os
+import time
+
+import evaluator.cache
+import evaluator.graphical_processor
+import evaluator.parser
+
+
+DIRECTORY = 'static/images'
+INDEX = 'index.json'
+QUOTA = 64 << 20
+TTL = 7 * 24 * 60 * 60
+SAVE_INTERVAL = 10
+
+
+class RenderCache(evaluator.cache.LRUCache):
+    """A bounded least recently used cache of rendered graphs on disk
+
+    Each item is the path of a graph, its size in bytes, when it was
+    rendered and the error message from rendering it. The index is read the
+    first time the cache is used rather than when it is made, so importing
+    the evaluator does not touch the disk. Any PNG in the directory which
+    is not in the index is removed then, as nothing else would remove it.
+
+    Attributes:
+        directory: str
+            -- The directory graphs are kept in
+        quota: int
+            -- The most bytes of graphs kept
+        ttl: float
+            -- How long in seconds a graph is kept after it is rendered
+        size: int
+            -- The bytes of graphs kept
+        bytes_saved: int
+            -- The bytes of graphs found rather than rendered again
+        _loaded: bool
+            -- Whether the index has been read
+        _unsaved: bool
+            -- Whether anything has changed since the index was written
+        _saved: float
+            -- When the index was last written, from time.monotonic
+
+    Methods:
+        __init__(directory: str, quota: int, ttl: float)
+            -- The initialiser for the class
+
+        get(key: str) -> tuple[bytes, str] | None
+            -- Gets the PNG and error message of a graph, or None if it is
+               not in the cache or has expired
+
+        put(key: str, value: tuple[bytes, str]) -> None
+            -- Writes a graph to the directory and adds it to the cache
+
+        get_hit_rate() -> float
+            -- Gets the fraction of lookups that found a graph
+
+        load() -> None
+            -- Reads the index if it has not been read yet
+
+        save() -> None
+            -- Writes the index if anything has changed since it was last
+               written
+
+        clear() -> None
+            -- Removes every graph from the cache and resets the counters
+    """
+    def __init__(self, directory=DIRECTORY, quota=QUOTA, ttl=TTL):
+        """The initialiser for the class
+
+        Arguments:
+            directory: str (default DIRECTORY)
+                -- The directory graphs are kept in
+            quota: int (default QUOTA)
+                -- The most bytes of graphs kept
+            ttl: float (default TTL)
+                -- How long in seconds a graph is kept after it is rendered
+        """
+        # Graphs are limited by their size rather than their number
+        super().__init__(float('inf'))
+        self.directory = directory
+        self.quota = quota
+        self.ttl = ttl
+        self.size = 0
+        self.bytes_saved = 0
+        self._loaded = False
+        self._unsaved = False
+        self._saved = time.monotonic()
+
+    def get(self, key):
+        """Gets the PNG and error message of a graph, or None if it is not in
+        the cache or has expired
+
+        Arguments:
+            key: str
+                -- The name of the graph
+
+        Returns:
+            graph: tuple[bytes, str] | None
+                -- The PNG of the graph and the error message from
+                   rendering it, or None
+        """
+        with self._lock:
+            self.load()
+            removed = self.__expire()
+            item = self._items.get(key)
+            image = None
+            if item is not None:
+                try:
+                    with open(item['path'], 'rb') as file:
+                        image = file.read()
+                except OSError:
+                    self.__remove(key)
+                    removed = True
+            if image is None:
+                self.misses += 1
+            else:
+                self._items.move_to_end(key)
+                self.hits += 1
+                self.bytes_saved += item['size']
+            self._unsaved = True
+            # Unless a graph was removed, only the counters and the order of
+            # the graphs have changed, which are written at most once every
+            # SAVE_INTERVAL seconds
+            if removed or time.monotonic() - self._saved >= SAVE_INTERVAL:
+                self.__save()
+            return None if image is None else (image, item['error_message'])
+
+    def put(self, key, value):
+        """Writes a graph to the directory and adds it to the cache
+
+        Arguments:
+            key: str
+                -- The name of the graph
+            value: tuple[bytes, str]
+                -- The PNG of the graph and the error message from
+                   rendering it
+
+        Returns:
+            None
+        """
+        image, error_message = value
+        with self._lock:
+            self.load()
+            path = os.path.join(self.directory, f'{key}.png')
+            with open(path, 'wb') as file:
+                file.write(image)
+            self.__add(key, path, error_message)
+
+    def get_hit_rate(self):
+        """Gets the fraction of lookups that found a graph
+
+        Arguments:
+            None
+
+        Returns:
+            hit_rate: float
+                -- The fraction of lookups that found a graph, or 0 if there
+                   have been none
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Removes every graph from the cache and resets the counters
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.load()
+            for key in list(self._items):
+                self.__remove(key)
+            super().clear()
+            self.bytes_saved = 0
+            self.__save()
+
+    def __add(self, key, path, error_message):
+        """Adds a graph already in the directory, evicting others to keep
+        within the quota
+
+        Arguments:
+            key: str
+                -- The name of the graph
+            path: str
+                -- The path of the graph
+            error_message: str
+                -- The error message from rendering it
+
+        Returns:
+            None
+        """
+        if key in self._items:
+            self.size -= self._items.pop(key)['size']
+        size = os.path.getsize(path)
+        self._items[key] = {'path': path, 'size': size, 'created': time.time(),
+                            'error_message': error_message}
+        self.size += size
+        self.__expire()
+        # The graph just added is kept even if it is bigger than the quota
+        while self.size > self.quota and len(self._items) > 1:
+            self.__remove(next(iter(self._items)))
+            self.evictions += 1
+        self.__save()
+
+    def save(self):
+        """Writes the index if anything has changed since it was last written
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._unsaved:
+                self.__save()
+
+    def __remove(self, key):
+        """Removes a graph from the cache and the directory
+
+        Arguments:
+            key: str
+                -- The name of the graph
+
+        Returns:
+            None
+        """
+        item = self._items.pop(key)
+        self.size -= item['size']
+        try:
+            os.remove(item['path'])
+        except FileNotFoundError:
+            pass
+
+    def __expire(self):
+        """Removes every graph older than the time to live
+
+        Arguments:
+            None
+
+        Returns:
+            removed: bool
+                -- Whether any graphs were removed
+        """
+        oldest = time.time() - self.ttl
+        expired = [key for key, item in self._items.items()
+                   if item['created'] < oldest]
+        for key in expired:
+            self.__remove(key)
+            self.evictions += 1
+        return bool(expired)
+
+    def load(self):
+        """Reads the index if it has not been read yet
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, INDEX)) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = {}
+        self.hits = index.get('hits', 0)
+        self.misses = index.get('misses', 0)
+        self.evictions = index.get('evictions', 0)
+        self.bytes_saved = index.get('bytes_saved', 0)
+        # The items are stored from least to most recently used
+        for key, item in index.get('items', []):
+            if os.path.exists(item['path']):
+                self._items[key] = item
+                self.size += item['size']
+        kept = {os.path.basename(item['path'])
+                for item in self._items.values()}
+        for name in os.listdir(self.directory):
+            if name.endswith('.png') and name not in kept:
+                os.remove(os.path.join(self.directory, name))
+
+    def __save(self):
+        """Writes the index, replacing the old one all at once so it is
+        never left half written
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.directory, INDEX)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'hits': self.hits, 'misses': self.misses,
+                       'evictions': self.evictions,
+                       'bytes_saved': self.bytes_saved,
+                       'items': list(self._items.items())}, file)
+        os.replace(path + '.tmp', path)
+        self._unsaved = False
+        self._saved = time.monotonic()
+
+
+def get_key(raw_text, width, height, x_range, y_range, t_range=None):
+    """Gets the name of a graph from everything that decides how it looks
+
+    The source is parsed from its tokens alone, so sources with the same
+    tokens give the same graph however they are spaced, and a graph is
+    found again without being parsed. The version of the evaluator is
+    included, so graphs rendered before it changed are not used.
+
+    Arguments:
+        raw_text: str
+            -- The raw text to be parsed
+        width: int
+            -- The width of the graph in pixels
+        height: int
+            -- The height of the graph in pixels
+        x_range: tuple[float, float]
+            -- The range of x-values plotted
+        y_range: tuple[float, float]
+            -- The range of y-values plotted
+        t_range: tuple[float, float] | None (default None)
+            -- The range of t-values parametric curves are plotted over, or
+               None for the default
+
+    Returns:
+        key: str
+            -- The name of the graph
+    """
+    if t_range is None:
+        t_range = evaluator.graphical_processor.PARAMETRIC_RANGE
+    ranges = [tuple(float(value) for value in bounds)
+              for bounds in (x_range, y_range, t_range)]
+    try:
+        text = [token[:2] for token in evaluator.parser.tokenise(raw_text)]
+    except Exception:
+        # It will not parse either, so only its spacing is ignored
+        text = ' '.join(raw_text.split())
+    return hashlib.sha1(repr((RENDER_VERSION, text, int(width), int(height),
+                              *ranges)).encode()).hexdigest()
+
+
+def _get_render_version():
+    """Gets a hash of the source of the evaluator, which decides how every
+    graph looks
+
+    Arguments:
+        None
+
+    Returns:
+        version: str
+            -- The hash of the source
+    """
+    source = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    # Every module of the package, including the builtins, by its path from
+    # the package so the hash does not depend on where it is installed
+    paths = sorted(os.path.relpath(path, directory) for path in glob.glob(
+        os.path.join(directory, '**', '*.py'), recursive=True))
+    for path in paths:
+        source.update(path.replace(os.sep, '/').encode())
+        with open(os.path.join(directory, path), 'rb') as file:
+            source.update(file.read())
+    return source.hexdigest()
+
+
+# Graphs rendered by a different version of the evaluator are not found
+RENDER_VERSION = _get_render_version()
+CACHE = RenderCache()
+# Whatever lookups changed since the index was last written are kept too
+atexit.register(CACHE.save)
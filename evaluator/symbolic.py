@@ -0,0 +1,694 @@
+"""Differentiates execution trees symbolically
+
+The derivative of an expression is built as a new execution tree using the
+sum, product, quotient and chain rules, with a rule for each builtin which
+has a derivative. Subtrees of the expression are shared with the derivative
+rather than copied. The derivative is simplified as it is built, so terms
+multiplied by zero are dropped and arithmetic on literals is done at once.
+
+The derivative is a tree like any other, so it can be compiled or evaluated
+over arrays by the vector engine rather than differentiated numerically at
+every point.
+
+Classes:
+    Name(object)
+        -- The name of an identifier made for a derivative
+    Builder(object)
+        -- Makes the nodes of a derivative, simplifying them as they are made
+    Differentiator(object)
+        -- Builds and caches the derivatives of an executor's trees
+
+Global variables:
+    NUMBER: object
+        -- Marks a value known to be a number
+    OPERATOR_NAMES: dict[str, str]
+        -- The global name of each builtin, by the builtin's own name
+    FOLDS: dict[str, Callable]
+        -- The builtins worked out at once when applied to literals
+    LINEAR: set[str]
+        -- The builtins whose derivative is the builtin of the derivative
+    UNARY_RULES: dict[str, Callable[[Builder, Node], Node]]
+        -- The derivatives of the builtins of one argument at an argument
+    BINARY_RULES: dict[str, Callable[[Builder, Node, Node, Node, Node], Node]]
+        -- The derivatives of the builtins of two arguments, given the
+           arguments and their derivatives
+"""
+
+import operator
+import re
+
+import evaluator.execution_tree
+import evaluator.operators
+import evaluator.builtins.functions
+import evaluator.builtins.types
+
+
+# The kind of a value known to be a number rather than a function
+NUMBER = object()
+
+
+class Name:
+    """The name of an identifier made for a derivative
+
+    Attributes:
+        item: str
+            -- The name
+
+    Methods:
+        __init__(item: str)
+            -- The initialiser for the class
+        __str__() -> str
+            -- Used for the string representation of the class
+    """
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        """The initialiser for the class
+
+        Arguments:
+            item: str
+                -- The name
+        """
+        self.item = item
+
+    def __str__(self):
+        """Used for the string representation of the class
+
+        Returns:
+            item: str
+                -- The name
+        """
+        return self.item
+
+
+class Builder:
+    """Makes the nodes of a derivative, simplifying them as they are made
+
+    Builtins are called by their global names, which must not be shadowed
+    where the nodes are used.
+
+    Attributes:
+        executor: evaluator.executor.Executor
+            -- The executor whose globals are used
+        tree: evaluator.execution_tree.ExecutionTree
+            -- The tree the nodes are made for
+        bound: dict[str, Any]
+            -- The kind of each variable bound where the nodes are used
+
+    Methods:
+        __init__(executor: evaluator.executor.Executor,
+                 tree: evaluator.execution_tree.ExecutionTree,
+                 bound: dict[str, Any])
+            -- The initialiser for the class
+
+        within(bound: dict[str, Any]) -> Builder
+            -- Gets a builder for nodes used where other variables are bound
+
+        number(value: float) -> Node
+            -- Makes a literal
+
+        literal(node: Node) -> float | None
+            -- Gets the value of a literal
+
+        call(function: Node, *arguments: Node) -> Node
+            -- Makes a node applying a function to each argument in turn
+
+        apply(name: str, *arguments: Node) -> Node
+            -- Makes a node calling a builtin by its own name
+
+        add(a: Node, b: Node) -> Node
+        sub(a: Node, b: Node) -> Node
+        mul(a: Node, b: Node) -> Node
+        div(a: Node, b: Node) -> Node
+        pow(a: Node, b: Node) -> Node
+        neg(a: Node) -> Node
+            -- Make the arithmetic builtins, dropping zeros and ones
+    """
+    def __init__(self, executor, tree, bound):
+        """The initialiser for the class
+
+        Arguments:
+            executor: evaluator.executor.Executor
+                -- The executor whose globals are used
+            tree: evaluator.execution_tree.ExecutionTree
+                -- The tree the nodes are made for
+            bound: dict[str, Any]
+                -- The kind of each variable bound where the nodes are used
+        """
+        self.executor = executor
+        self.tree = tree
+        self.bound = bound
+
+    def within(self, bound):
+        """Gets a builder for nodes used where other variables are bound
+
+        Arguments:
+            bound: dict[str, Any]
+                -- The kind of each variable bound there
+
+        Returns:
+            builder: Builder
+                -- The builder, making nodes for the same tree
+        """
+        return Builder(self.executor, self.tree, bound)
+
+    def number(self, value):
+        """Makes a literal
+
+        Arguments:
+            value: float
+                -- The value of the literal
+
+        Returns:
+            literal: evaluator.execution_tree.ExecutionTree.__Identifier
+                -- The node, or None if the value cannot be written as one
+        """
+        text = repr(float(value))
+        if not re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX, text):
+            return None
+        return self.tree.create_identifier(Name(text))
+
+    @staticmethod
+    def literal(node):
+        """Gets the value of a literal
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node
+
+        Returns:
+            value: float | None
+                -- The value, or None if the node is not a literal
+        """
+        if node.is_identifier() and re.fullmatch(
+                evaluator.operators.VALID_NUMBER_REGEX, node.name.item):
+            return float(node.name.item)
+        return None
+
+    def call(self, function, *arguments):
+        """Makes a node applying a function to each argument in turn
+
+        The nodes of the expression are shared with the derivative, so the
+        children are set without changing their parents.
+
+        Arguments:
+            function: evaluator.execution_tree.ExecutionTree.__Node
+                -- The function
+            arguments: tuple[evaluator.execution_tree.ExecutionTree.__Node]
+                -- The arguments
+
+        Returns:
+            call: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node
+        """
+        for argument in arguments:
+            node = self.tree.create_function_call()
+            node.function = function
+            node.parameter = argument
+            function = node
+        return function
+
+    def apply(self, name, *arguments):
+        """Makes a node calling a builtin by its own name
+
+        Arguments:
+            name: str
+                -- The builtin's own name, such as 'mul'
+            arguments: tuple[evaluator.execution_tree.ExecutionTree.__Node]
+                -- The arguments
+
+        Returns:
+            call: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node, or a literal if every argument is a literal and
+                   the builtin is one of FOLDS
+
+        Raises:
+            ValueError
+                -- If the builtin's global name is shadowed
+        """
+        values = [self.literal(argument) for argument in arguments]
+        if name in FOLDS and None not in values:
+            try:
+                literal = self.number(FOLDS[name](*values))
+            except (ArithmeticError, TypeError, ValueError):
+                # Such as a fractional power of a negative number
+                literal = None
+            if literal is not None:
+                return literal
+
+        key = OPERATOR_NAMES[name]
+        if (key in self.bound or self.executor.globals.get_var(key)
+                is not evaluator.builtins.functions.OPERATORS[key]):
+            raise ValueError(f'{key} is shadowed')
+        return self.call(self.tree.create_identifier(Name(key)), *arguments)
+
+    def add(self, a, b):
+        if self.literal(a) == 0:
+            return b
+        if self.literal(b) == 0:
+            return a
+        return self.apply('add', a, b)
+
+    def sub(self, a, b):
+        if self.literal(b) == 0:
+            return a
+        if self.literal(a) == 0:
+            return self.neg(b)
+        return self.apply('sub', a, b)
+
+    def mul(self, a, b):
+        if self.literal(a) == 0 or self.literal(b) == 0:
+            return self.number(0)
+        if self.literal(a) == 1:
+            return b
+        if self.literal(b) == 1:
+            return a
+        if self.literal(a) == -1:
+            return self.neg(b)
+        if self.literal(b) == -1:
+            return self.neg(a)
+        return self.apply('mul', a, b)
+
+    def div(self, a, b):
+        if self.literal(a) == 0:
+            return self.number(0)
+        if self.literal(b) == 1:
+            return a
+        return self.apply('div', a, b)
+
+    def pow(self, a, b):
+        if self.literal(b) == 0:
+            return self.number(1)
+        if self.literal(b) == 1:
+            return a
+        return self.apply('pow', a, b)
+
+    def neg(self, a):
+        key = OPERATOR_NAMES['neg']
+        if (a.is_function_call() and a.function.is_identifier()
+                and a.function.name.item == key and key not in self.bound):
+            return a.parameter
+        return self.apply('neg', a)
+
+
+class Differentiator:
+    """Builds and caches the derivatives of an executor's trees
+
+    An expression can only be differentiated if every call in it which
+    depends on the variable is of a builtin with a rule, a number, or a
+    function whose definition is known. Anything else raises ValueError.
+
+    Attributes:
+        executor: evaluator.executor.Executor
+            -- The executor whose globals are used
+        __derivatives: dict[tuple, evaluator.execution_tree.ExecutionTree]
+            -- The derivatives built so far, by the optimiser key of the
+               expression, the variable and the kinds of the variables in
+               scope
+
+    Methods:
+        __init__(executor: evaluator.executor.Executor)
+            -- The initialiser for the class
+
+        differentiate(node: evaluator.execution_tree.ExecutionTree.__Node,
+                      variable: str,
+                      scope: tuple[str, ...],
+                      frame: tuple) -> evaluator.execution_tree.ExecutionTree
+            -- Gets the derivative of node as a function of variable
+
+        __derive(node: evaluator.execution_tree.ExecutionTree.__Node,
+                 variable: str,
+                 build: Builder,
+                 active: frozenset)
+                -> evaluator.execution_tree.ExecutionTree.__Node
+            -- Builds the derivative of node with respect to variable
+
+        __derive_application(
+                definition: evaluator.execution_tree.ExecutionTree.__FunctionDef,
+                argument: evaluator.execution_tree.ExecutionTree.__Node,
+                variable: str,
+                build: Builder,
+                active: frozenset)
+                -> evaluator.execution_tree.ExecutionTree.__Node
+            -- Builds the derivative of a function applied to an argument
+
+        __resolve(node: evaluator.execution_tree.ExecutionTree.__Node,
+                  bound: dict[str, Any]) -> Any
+            -- Finds what kind of value a node has, if it can be known
+
+        __check_global(
+                definition: evaluator.execution_tree.ExecutionTree.__FunctionDef,
+                bound: dict[str, Any])
+                -> evaluator.execution_tree.ExecutionTree.__FunctionDef | None
+            -- Checks a global function can be used where variables are bound
+
+        __get_kind(value: Any) -> Any
+            -- Finds what kind of value a runtime value is
+    """
+    def __init__(self, executor):
+        """The initialiser for the class
+
+        Arguments:
+            executor: evaluator.executor.Executor
+                -- The executor whose globals are used
+        """
+        self.executor = executor
+        self.__derivatives = {}
+
+    def differentiate(self, node, variable, scope=(), frame=()):
+        """Gets the derivative of node as a function of variable
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The expression to differentiate
+            variable: str
+                -- The name of the variable
+            scope: tuple[str, ...] (default ())
+                -- The variables bound around the expression
+            frame: tuple (default ())
+                -- The values of the variables in scope
+
+        Returns:
+            derivative: evaluator.execution_tree.ExecutionTree
+                -- A tree whose root is a function of variable giving the
+                   derivative, to be compiled with the same scope
+
+        Raises:
+            ValueError
+                -- If the expression cannot be differentiated symbolically
+        """
+        bound = {name: self.__get_kind(value)
+                 for name, value in zip(scope, frame)}
+        bound[variable] = NUMBER
+        key = (self.executor.optimiser.get_key(node), variable,
+               tuple(bound.items()))
+        if key in self.__derivatives:
+            return self.__derivatives[key]
+
+        tree = evaluator.execution_tree.ExecutionTree()
+        derivative = self.__derive(node, variable,
+                                   Builder(self.executor, tree, bound),
+                                   frozenset())
+        root = tree.create_function_def(tree.create_identifier(Name(variable)))
+        root.expr = derivative
+        tree.set_root(root)
+        self.__derivatives[key] = tree
+        return tree
+
+    def __derive(self, node, variable, build, active):
+        """Builds the derivative of node with respect to variable
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The expression to differentiate
+            variable: str
+                -- The name of the variable
+            build: Builder
+                -- Makes the nodes, knowing the variables bound around node
+            active: frozenset
+                -- The function definitions being differentiated, to
+                   detect recursion
+
+        Returns:
+            derivative: evaluator.execution_tree.ExecutionTree.__Node
+                -- The derivative
+        """
+        if variable not in self.executor.optimiser.get_free_variables(node):
+            return build.number(0)
+        if node.is_identifier():
+            return build.number(1)
+        if node.is_funcdef():
+            raise ValueError('Functions of the variable have no derivative')
+
+        # The calls applying the head to each argument in turn
+        calls = []
+        while node.is_function_call():
+            calls.append(node)
+            node = node.function
+        calls.reverse()
+        head = self.__resolve(node, build.bound)
+
+        if isinstance(head, evaluator.builtins.types.Builtin):
+            arity = 2 if head.name in BINARY_RULES else 1
+            if (head.name not in BINARY_RULES and head.name not in UNARY_RULES
+                    and head.name not in LINEAR):
+                raise ValueError(f'{head.name} has no derivative')
+            if len(calls) < arity:
+                raise ValueError('Functions of the variable have no derivative')
+            arguments = [call.parameter for call in calls[:arity]]
+            derivatives = [self.__derive(argument, variable, build, active)
+                           for argument in arguments]
+            if head.name in BINARY_RULES:
+                derivative = BINARY_RULES[head.name](build, *arguments,
+                                                     *derivatives)
+            elif head.name in LINEAR:
+                derivative = build.apply(head.name, *derivatives)
+            else:
+                derivative = build.mul(UNARY_RULES[head.name](build,
+                                                              *arguments),
+                                       *derivatives)
+            calls = calls[arity - 1:]
+        elif head is NUMBER:
+            derivative = self.__derive(node, variable, build, active)
+            calls.insert(0, node)
+        elif head is not None:
+            derivative = self.__derive_application(
+                head, calls[0].parameter, variable, build, active)
+        else:
+            raise ValueError('The function being applied is not known')
+
+        # Anything further applied to a number multiplies it
+        for value, call in zip(calls, calls[1:]):
+            derivative = build.add(
+                build.mul(derivative, call.parameter),
+                build.mul(value, self.__derive(call.parameter, variable,
+                                               build, active)))
+        return derivative
+
+    def __derive_application(self, definition, argument, variable, build,
+                             active):
+        """Builds the derivative of a function applied to an argument
+
+        By the chain rule, this is the derivative of the function with
+        respect to its parameter at the argument times the derivative of the
+        argument, plus the function's own derivative with respect to the
+        variable if it uses it.
+
+        Arguments:
+            definition: evaluator.execution_tree.ExecutionTree.__FunctionDef
+                -- The function definition
+            argument: evaluator.execution_tree.ExecutionTree.__Node
+                -- The argument it is applied to
+            variable: str
+                -- The name of the variable
+            build: Builder
+                -- Makes the nodes, knowing the variables bound around the
+                   call
+            active: frozenset
+                -- The function definitions being differentiated
+
+        Returns:
+            derivative: evaluator.execution_tree.ExecutionTree.__Node
+                -- The derivative
+        """
+        if not definition.identifier.is_identifier():
+            raise ValueError('Functions must take one parameter')
+        if definition in active:
+            raise ValueError('Recursive functions are not differentiated')
+        active = active | {definition}
+        parameter = definition.identifier.name.item
+        bound = dict(build.bound)
+        bound[parameter] = self.__resolve(argument, build.bound)
+        inner = build.within(bound)
+
+        function = build.tree.create_function_def(definition.identifier)
+        function.expr = self.__derive(definition.expr, parameter, inner,
+                                      active)
+        derivative = build.mul(build.call(function, argument),
+                               self.__derive(argument, variable, build,
+                                             active))
+
+        if parameter != variable:
+            partial = self.__derive(definition.expr, variable, inner, active)
+            if build.literal(partial) != 0:
+                function = build.tree.create_function_def(
+                    definition.identifier)
+                function.expr = partial
+                derivative = build.add(derivative,
+                                       build.call(function, argument))
+        return derivative
+
+    def __resolve(self, node, bound):
+        """Finds what kind of value a node has, if it can be known
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node
+            bound: dict[str, Any]
+                -- The kind of each variable bound around the node
+
+        Returns:
+            kind: Any
+                -- NUMBER, a builtin, a function definition, or None if it
+                   is not known
+        """
+        if node.is_funcdef():
+            return node
+        if node.is_function_call():
+            calls = 0
+            while node.is_function_call():
+                calls += 1
+                node = node.function
+            head = self.__resolve(node, bound)
+            if head is NUMBER:
+                return NUMBER
+            if isinstance(head, evaluator.builtins.types.Builtin):
+                arity = 2 if head.name in BINARY_RULES else 1
+                if calls >= arity and (head.name in BINARY_RULES
+                                       or head.name in UNARY_RULES
+                                       or head.name in LINEAR):
+                    return NUMBER
+            return None
+
+        name = node.name.item
+        if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX, name):
+            return NUMBER
+        if name in bound:
+            return bound[name]
+        value = self.executor.globals.get_var(name)
+        if value is None or isinstance(value,
+                                       evaluator.builtins.types.VALUES):
+            return self.__get_kind(value)
+
+        if not value.is_funcdef():
+            # A \let definition, whose value may still be a function
+            try:
+                value = self.__get_kind(self.executor.evaluate_constant(node))
+            except Exception:
+                return None
+            if value is None or value is NUMBER or isinstance(
+                    value, evaluator.builtins.types.Builtin):
+                return value
+        return self.__check_global(value, bound)
+
+    def __check_global(self, definition, bound):
+        """Checks a global function can be used where variables are bound
+
+        The derivative of a global function is put where it is called, so
+        none of the globals it uses may be shadowed there.
+
+        Arguments:
+            definition: evaluator.execution_tree.ExecutionTree.__FunctionDef
+                -- The definition of the global function
+            bound: dict[str, Any]
+                -- The kind of each variable bound where it is called
+
+        Returns:
+            kind: evaluator.execution_tree.ExecutionTree.__FunctionDef | None
+                -- The definition, or None if it cannot be used there
+        """
+        if self.executor.optimiser.get_free_variables(definition).isdisjoint(
+                bound):
+            return definition
+        return None
+
+    @staticmethod
+    def __get_kind(value):
+        """Finds what kind of value a runtime value is
+
+        Arguments:
+            value: Any
+                -- The value
+
+        Returns:
+            kind: Any
+                -- NUMBER, a builtin, a function definition, or None if it
+                   is not known
+        """
+        if isinstance(value, evaluator.builtins.types.NUMBERS):
+            return NUMBER
+        if isinstance(value, evaluator.builtins.types.Builtin):
+            return value
+        if (isinstance(value, evaluator.builtins.types.UserFunction)
+                and not value.frame):
+            return value.definition
+        return None
+
+
+OPERATOR_NAMES = {
+    value.name: key
+    for key, value in evaluator.builtins.functions.OPERATORS.items()
+    if isinstance(value, evaluator.builtins.types.Builtin)}
+
+FOLDS = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul,
+         'div': operator.truediv, 'pow': operator.pow, 'neg': operator.neg,
+         'ignore': lambda x: x}
+
+LINEAR = {'neg', 'ignore', 're', 'im', 'conj'}
+
+
+def _square(build, u):
+    return build.pow(u, build.number(2))
+
+
+def _log_rule(build, a, x, da, dx):
+    # log_a x is ln x / ln a
+    return BINARY_RULES['div'](build, build.apply('ln', x),
+                               build.apply('ln', a), build.div(dx, x),
+                               build.div(da, a))
+
+
+def _pow_rule(build, u, v, du, dv):
+    if build.literal(dv) == 0:
+        # The exponent is constant, so the log of a negative base is avoided
+        return build.mul(build.mul(v, build.pow(u, build.sub(
+            v, build.number(1)))), du)
+    return build.mul(build.pow(u, v), build.add(
+        build.mul(dv, build.apply('ln', u)), build.div(build.mul(v, du), u)))
+
+
+def _div_rule(build, u, v, du, dv):
+    if build.literal(dv) == 0:
+        return build.div(du, v)
+    return build.div(build.sub(build.mul(du, v), build.mul(u, dv)),
+                     _square(build, v))
+
+
+UNARY_RULES = {
+    'sin': lambda build, u: build.apply('cos', u),
+    'cos': lambda build, u: build.neg(build.apply('sin', u)),
+    'tan': lambda build, u: build.div(
+        build.number(1), _square(build, build.apply('cos', u))),
+    'asin': lambda build, u: build.div(build.number(1), build.apply(
+        'sqrt', build.sub(build.number(1), _square(build, u)))),
+    'acos': lambda build, u: build.div(build.number(-1), build.apply(
+        'sqrt', build.sub(build.number(1), _square(build, u)))),
+    'atan': lambda build, u: build.div(build.number(1), build.add(
+        build.number(1), _square(build, u))),
+    'sinh': lambda build, u: build.apply('cosh', u),
+    'cosh': lambda build, u: build.apply('sinh', u),
+    'tanh': lambda build, u: build.div(
+        build.number(1), _square(build, build.apply('cosh', u))),
+    'asinh': lambda build, u: build.div(build.number(1), build.apply(
+        'sqrt', build.add(_square(build, u), build.number(1)))),
+    'acosh': lambda build, u: build.div(build.number(1), build.mul(
+        build.apply('sqrt', build.sub(u, build.number(1))),
+        build.apply('sqrt', build.add(u, build.number(1))))),
+    'atanh': lambda build, u: build.div(build.number(1), build.sub(
+        build.number(1), _square(build, u))),
+    'ln': lambda build, u: build.div(build.number(1), u),
+    'log10': lambda build, u: build.div(build.number(1), build.mul(
+        u, build.apply('ln', build.number(10)))),
+    'sqrt': lambda build, u: build.div(build.number(1), build.mul(
+        build.number(2), build.apply('sqrt', u))),
+}
+
+BINARY_RULES = {
+    'add': lambda build, u, v, du, dv: build.add(du, dv),
+    'sub': lambda build, u, v, du, dv: build.sub(du, dv),
+    'mul': lambda build, u, v, du, dv: build.add(build.mul(du, v),
+                                                 build.mul(u, dv)),
+    'div': _div_rule,
+    'pow': _pow_rule,
+    'log': _log_rule,
+}
@@ -0,0 +1,709 @@
+"""Evaluates execution trees over whole arrays of values at once
+
+Rather than walking the tree once per point, each node is evaluated once
+with NumPy arrays in place of numbers. Builtins are replaced by their NumPy
+equivalents, so anything without one cannot be vectorised and has to be
+evaluated point by point instead.
+
+Classes:
+    NotVectorisable(Exception)
+        -- Raised when a tree uses something with no array equivalent
+    VectorFunction(object)
+        -- A NumPy function and the arguments applied to it so far
+    Closure(object)
+        -- A function definition and the variables bound where it was made
+    Evaluation(object)
+        -- The state of a single call to VectorExecutor.evaluate
+    VectorExecutor(object)
+        -- Evaluates execution trees over arrays of values
+
+Functions:
+    get_arity(function: Callable) -> int
+        -- Gets the number of arguments a NumPy function takes
+    get_shape(values: np.ndarray | evaluator.dual.Dual) -> tuple[int, ...]
+        -- Gets the shape of an array of values, which may be dual numbers
+    is_numeric(value: Any) -> bool
+        -- Checks if a value is a number or an array of numbers
+    is_vector(value: Any) -> bool
+        -- Checks if a value is a tuple of numbers or arrays of numbers
+
+Global variables:
+    EVALUATE: str
+        -- The task evaluating a node
+    APPLY: str
+        -- The task applying a function to its parameter
+    RETURN: str
+        -- The task marking the end of applying a function
+"""
+
+import inspect
+import re
+
+import numpy as np
+
+import evaluator.dual
+import evaluator.operators
+import evaluator.builtins.functions
+import evaluator.builtins.types
+
+
+# The tasks used by VectorExecutor to walk a tree without recursion
+EVALUATE = 'evaluate'
+APPLY = 'apply'
+RETURN = 'return'
+
+
+class NotVectorisable(Exception):
+    """Raised when a tree uses something with no array equivalent"""
+
+
+class VectorFunction:
+    """A NumPy function and the arguments applied to it so far
+
+    Builtins are curried, so a function of two arguments is only called once
+    the second argument has been applied.
+
+    Attributes:
+        function: Callable
+            -- The NumPy function
+        arity: int
+            -- The number of arguments the function takes
+        arguments: tuple
+            -- The arguments applied so far
+
+    Methods:
+        __init__(function: Callable, arity: int, arguments: tuple)
+            -- The initialiser for the class
+
+        apply(argument: np.ndarray | complex) -> VectorFunction | np.ndarray
+            -- Applies the next argument to the function
+    """
+    def __init__(self, function, arity, arguments=()):
+        """The initialiser for the class
+
+        Arguments:
+            function: Callable
+                -- The NumPy function
+            arity: int
+                -- The number of arguments the function takes
+            arguments: tuple (default ())
+                -- The arguments applied so far
+        """
+        self.function = function
+        self.arity = arity
+        self.arguments = arguments
+
+    def apply(self, argument):
+        """Applies the next argument to the function
+
+        Arguments:
+            argument: np.ndarray | complex
+                -- The argument
+
+        Returns:
+            result: VectorFunction | np.ndarray | complex
+                -- The result once every argument is applied, otherwise the
+                   partially applied function
+        """
+        if not is_numeric(argument) and not (
+                self.function is evaluator.builtins.types.join
+                and is_vector(argument)):
+            # Only the , operator can be given a tuple, to add to it
+            raise NotVectorisable('Builtins can only be applied to numbers')
+        arguments = self.arguments + (argument,)
+        if len(arguments) == self.arity:
+            return self.function(*arguments)
+        return VectorFunction(self.function, self.arity, arguments)
+
+
+class Closure:
+    """A function definition and the variables bound where it was made
+
+    Attributes:
+        definition: evaluator.execution_tree.ExecutionTree.__FunctionDef
+            -- The function definition
+        environment: dict[str, Any]
+            -- The variables bound where the function was defined
+    """
+    def __init__(self, definition, environment):
+        """The initialiser for the class
+
+        Arguments:
+            definition: evaluator.execution_tree.ExecutionTree.__FunctionDef
+                -- The function definition
+            environment: dict[str, Any]
+                -- The variables bound where the function was defined
+        """
+        self.definition = definition
+        self.environment = environment
+
+
+class Evaluation:
+    """The state of a single call to VectorExecutor.evaluate
+
+    A series is evaluated in its own evaluations, one for each chunk of its
+    terms, so the values of one chunk are freed before the next. They share
+    the definitions and functions being applied of the evaluation the
+    series is part of.
+
+    Attributes:
+        definitions: dict[str, Any]
+            -- The values of global definitions evaluated so far
+        applying: set[evaluator.execution_tree.ExecutionTree.__FunctionDef]
+            -- The functions currently being applied, to detect recursion
+        values: dict[tuple[int, int], tuple[dict[str, Any], Any]]
+            -- The value of each call evaluated so far, by the optimiser key
+               of the call and the id of its environment. The environment is
+               kept with the value so its id cannot be reused.
+    """
+    def __init__(self, parent=None):
+        """The initialiser for the class
+
+        Arguments:
+            parent: Evaluation | None (default None)
+                -- The evaluation this one is part of, if any
+        """
+        if parent is None:
+            self.definitions = {}
+            self.applying = set()
+        else:
+            self.definitions = parent.definitions
+            self.applying = parent.applying
+        self.values = {}
+
+
+class VectorExecutor:
+    """Evaluates execution trees over arrays of values
+
+    Variables are looked up in an environment passed down the tree, falling
+    back on the executor's globals, so the tree itself is never modified.
+    Everything else an evaluation needs is kept in the call's own
+    Evaluation, so one VectorExecutor can be used from many threads at once.
+
+    Attributes:
+        executor: evaluator.executor.Executor
+            -- The executor whose globals are used
+
+    Methods:
+        __init__(executor: evaluator.executor.Executor)
+            -- The initialiser for the class
+
+        evaluate(node: evaluator.execution_tree.ExecutionTree.__Node,
+                 values: np.ndarray | tuple[np.ndarray, ...],
+                 identifier: str | tuple[str, ...]) -> np.ndarray
+            -- Evaluates node with identifier bound to every value at once
+
+        __evaluate_node(node: evaluator.execution_tree.ExecutionTree.__Node,
+                        environment: dict[str, Any],
+                        evaluation: Evaluation) -> Any
+            -- Evaluates a node with the variables bound in environment
+
+        __get_global(name: str, evaluation: Evaluation) -> Any
+            -- Gets the value of a global variable
+
+        __evaluate_constant(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall)
+                -> complex | Closure | None
+            -- Gets the value of a call which uses no variables, if it is a
+               number or a function
+
+        __evaluate_series(
+                node: evaluator.execution_tree.ExecutionTree.__FunctionCall,
+                environment: dict[str, Any], evaluation: Evaluation)
+                -> np.ndarray | evaluator.dual.Dual | None
+            -- Evaluates a sum or product over every value and term at once
+
+        __get_items(node: evaluator.execution_tree.ExecutionTree.__Node,
+                    environment: dict[str, Any])
+                -> list[evaluator.execution_tree.ExecutionTree.__Node]
+            -- Gets the items of a chain of the , operator
+
+        __add_axis(value: Any) -> np.ndarray | complex | evaluator.dual.Dual
+            -- Gives a value an extra last axis, to broadcast with the terms
+               of a series
+
+        __apply(function: Any, parameter: Any) -> Any
+            -- Applies a builtin or number to a parameter
+    """
+    def __init__(self, executor):
+        """The initialiser for the class
+
+        Arguments:
+            executor: evaluator.executor.Executor
+                -- The executor whose globals are used
+        """
+        self.executor = executor
+
+    def evaluate(self, node, values, identifier='x'):
+        """Evaluates node with identifier bound to every value at once
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                  | evaluator.builtins.types.UserFunction
+                -- The node to evaluate, or a function to apply to the values
+            values: np.ndarray | tuple[np.ndarray, ...]
+                -- The values of the variable, or of each variable
+            identifier: str | tuple[str, ...] (default 'x')
+                -- The name of the variable, or of each variable
+
+        Returns:
+            results: np.ndarray
+                -- The value of the node at each value, with a last axis
+                   holding each item if the node gives a tuple
+
+        Raises:
+            NotVectorisable
+                -- If the node cannot be evaluated over an array
+        """
+        if isinstance(node, evaluator.builtins.types.UserFunction):
+            # A function value from the scalar engine, which can only be
+            # vectorised if the variables it captured are numbers
+            environment = {}
+            for name, value in zip(node.scope, node.frame):
+                if not isinstance(value, evaluator.builtins.types.NUMBERS):
+                    raise NotVectorisable('Only numbers can be captured')
+                environment[name] = value
+            node = node.definition
+            if not node.identifier.is_identifier():
+                raise NotVectorisable('Functions must take one parameter')
+            environment[node.identifier.name.item] = values
+            node = node.expr
+            shape = get_shape(values)
+        elif isinstance(identifier, tuple):
+            environment = dict(zip(identifier, values))
+            shape = np.broadcast_shapes(*(get_shape(v) for v in values))
+        elif node.is_funcdef():
+            # A function is applied to the values whatever its parameter is
+            # called, as in Executor.evaluate_function
+            if not node.identifier.is_identifier():
+                raise NotVectorisable('Functions must take one parameter')
+            environment = {node.identifier.name.item: values}
+            node = node.expr
+            shape = get_shape(values)
+        else:
+            environment = {identifier: values}
+            shape = get_shape(values)
+
+        with np.errstate(all='ignore'):
+            result = self.__evaluate_node(node, environment, Evaluation())
+
+        if is_vector(result) and not any(
+                isinstance(item, evaluator.dual.Dual) for item in result.items):
+            # Several numbers at each point, as the last axis
+            return np.stack([np.broadcast_to(item, shape)
+                             for item in result.items], axis=-1)
+        if not is_numeric(result):
+            raise NotVectorisable('The result is not a number')
+        if isinstance(result, evaluator.dual.Dual):
+            # The derivatives are broadcast by evaluator.dual.split
+            return result
+        # Constant expressions still need a value for every point
+        return np.array(np.broadcast_to(result, shape))
+
+    def __evaluate_node(self, node, environment, evaluation):
+        """Evaluates a node with the variables bound in environment
+
+        The tree is walked with a stack of tasks rather than by recursion, so
+        very long lines do not reach the recursion limit. A task either
+        evaluates a node, pushing its value, applies the top two values to
+        each other, or marks the end of a function's body.
+
+        Calls using none of the variables in the environment are computed
+        once by the executor and shared. Identical calls in the same
+        environment are only evaluated once.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The node to evaluate
+            environment: dict[str, Any]
+                -- The variables bound by enclosing functions
+            evaluation: Evaluation
+                -- The state of the evaluation the node is part of
+
+        Returns:
+            value: Any
+                -- The value of the node
+        """
+        optimiser = self.executor.optimiser
+        values = []
+        tasks = [(EVALUATE, node, environment)]
+        while tasks:
+            task, node, environment = tasks.pop()
+
+            if task is EVALUATE:
+                if node.is_function_call():
+                    key = (optimiser.get_key(node), id(environment))
+                    if key in evaluation.values:
+                        values.append(evaluation.values[key][1])
+                        continue
+                    if optimiser.is_constant(node, environment):
+                        value = self.__evaluate_constant(node)
+                        if value is not None:
+                            values.append(value)
+                            continue
+                    value = self.__evaluate_series(node, environment,
+                                                   evaluation)
+                    if value is not None:
+                        values.append(value)
+                        evaluation.values[key] = (environment, value)
+                        continue
+                    tasks.append((APPLY, node, environment))
+                    tasks.append((EVALUATE, node.parameter, environment))
+                    tasks.append((EVALUATE, node.function, environment))
+
+                elif node.is_identifier():
+                    name = node.name.item
+                    if re.fullmatch(evaluator.operators.VALID_NUMBER_REGEX,
+                                    name):
+                        values.append(float(name))
+                    elif name in environment:
+                        values.append(environment[name])
+                    else:
+                        values.append(self.__get_global(name, evaluation))
+
+                else:
+                    values.append(Closure(node, environment))
+
+            elif task is APPLY:
+                parameter = values.pop()
+                function = values.pop()
+                key = (optimiser.get_key(node), id(environment))
+                if not isinstance(function, Closure):
+                    values.append(self.__apply(function, parameter))
+                    evaluation.values[key] = (environment, values[-1])
+                    continue
+
+                definition = function.definition
+                if not definition.identifier.is_identifier():
+                    raise NotVectorisable('Functions must take one parameter')
+                if definition in evaluation.applying:
+                    raise NotVectorisable(
+                        'Recursive functions are not vectorised')
+                tasks.append((RETURN, definition, (key, environment)))
+                environment = dict(function.environment)
+                environment[definition.identifier.name.item] = parameter
+                evaluation.applying.add(definition)
+                tasks.append((EVALUATE, definition.expr, environment))
+
+            else:
+                evaluation.applying.discard(node)
+                key, environment = environment
+                evaluation.values[key] = (environment, values[-1])
+
+        return values.pop()
+
+    def __get_global(self, name, evaluation):
+        """Gets the value of a global variable
+
+        Arguments:
+            name: str
+                -- The name of the variable
+            evaluation: Evaluation
+                -- The state of the evaluation the variable is used in
+
+        Returns:
+            value: Any
+                -- The value of the variable
+        """
+        definitions = evaluation.definitions
+        if name in definitions:
+            if definitions[name] is None:
+                raise NotVectorisable(f'{name} is defined recursively')
+            return definitions[name]
+
+        value = self.executor.globals.get_var(name)
+        if value is None:
+            raise NotVectorisable(f'{name} is not defined')
+        elif isinstance(value, evaluator.builtins.types.NUMBERS):
+            return value
+        elif isinstance(value, evaluator.builtins.types.Builtin):
+            if value.vectorised is None:
+                raise NotVectorisable(f'{name} has no array equivalent')
+            return VectorFunction(value.vectorised,
+                                  get_arity(value.vectorised))
+        elif isinstance(value, evaluator.builtins.types.Function):
+            raise NotVectorisable(f'{name} has no array equivalent')
+
+        # A \let definition, which does not depend on the variables so is only
+        # evaluated once. It is marked with None while it is being evaluated.
+        definitions[name] = None
+        try:
+            definitions[name] = self.__evaluate_node(value, {}, evaluation)
+        except NotVectorisable:
+            del definitions[name]
+            raise
+        return definitions[name]
+
+    def __evaluate_constant(self, node):
+        """Gets the value of a call which uses no variables, if it is a number
+        or a function
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The call, which must use none of the variables around it
+
+        Returns:
+            value: complex | Closure | None
+                -- The value of the call, or None if it is neither a number
+                   nor a function of numbers and so has to be evaluated over
+                   the arrays instead
+        """
+        try:
+            value = self.executor.evaluate_constant(node)
+        except Exception:
+            return None
+        if isinstance(value, evaluator.builtins.types.NUMBERS):
+            return value
+        if (isinstance(value, evaluator.builtins.types.UserFunction)
+                and all(isinstance(captured, evaluator.builtins.types.NUMBERS)
+                        for captured in value.frame)):
+            # Such as a derivative, which is evaluated over the arrays once
+            # it is applied
+            return Closure(value.definition,
+                           dict(zip(value.scope, value.frame)))
+        return None
+
+    def __evaluate_series(self, node, environment, evaluation):
+        """Evaluates a sum or product over every value and term at once
+
+        The summand is evaluated over a grid with an extra last axis for
+        the terms, which is then reduced. The variables around the series
+        are given the extra axis, so a summand depending on them is still
+        evaluated in one pass for every point of the graph.
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__FunctionCall
+                -- The call, which may not be a series
+            environment: dict[str, Any]
+                -- The variables bound by enclosing functions
+            evaluation: Evaluation
+                -- The state of the evaluation the node is part of
+
+        Returns:
+            value: np.ndarray | evaluator.dual.Dual | None
+                -- The value of the series at each value, or None if the
+                   call is not a series
+
+        Raises:
+            NotVectorisable
+                -- If the series cannot be evaluated over the arrays
+        """
+        function = node.function
+        if not function.is_identifier() or function.name.item in environment:
+            return None
+        series = self.executor.globals.get_var(function.name.item)
+        if (not isinstance(series, evaluator.builtins.types.Builtin)
+                or series not in evaluator.builtins.functions.SERIES):
+            return None
+        ufunc = evaluator.builtins.functions.SERIES[series]
+
+        items = self.__get_items(node.parameter, environment)
+        if len(items) != 4:
+            raise NotVectorisable('A series takes four arguments')
+        summand, quote, low, high = items
+        if not (quote.is_function_call() and quote.function.is_identifier()
+                and quote.function.name.item == '"'
+                and quote.parameter.is_identifier()):
+            raise NotVectorisable('The variable of a series must be quoted')
+        name = quote.parameter.name.item
+        try:
+            low, high = evaluator.builtins.functions.get_range(
+                self.__evaluate_node(low, environment, evaluation),
+                self.__evaluate_node(high, environment, evaluation))
+        except ValueError:
+            raise NotVectorisable('The limits must be the same integers '
+                                  'everywhere')
+        if high - low + 1 > evaluator.builtins.functions.SERIES_MAX_TERMS:
+            raise NotVectorisable('The series has too many terms')
+
+        free_variables = self.executor.optimiser.get_free_variables(summand)
+        if (not summand.is_funcdef() and name in free_variables
+                and name not in environment):
+            # An expression in the variable, which captures whichever of the
+            # variables around it it uses
+            body, parameter = summand, name
+            captured = {variable: environment[variable]
+                        for variable in free_variables
+                        if variable in environment}
+        else:
+            if summand.is_funcdef():
+                summand = Closure(summand, environment)
+            else:
+                summand = self.__evaluate_node(summand, environment,
+                                               evaluation)
+                if not isinstance(summand, Closure):
+                    raise NotVectorisable('The summand must be a function')
+            definition = summand.definition
+            if not definition.identifier.is_identifier():
+                raise NotVectorisable('Functions must take one parameter')
+            body = definition.expr
+            parameter = definition.identifier.name.item
+            captured = summand.environment
+
+        grid = {}
+        size = 1
+        for variable, value in captured.items():
+            grid[variable] = self.__add_axis(value)
+            size = max(size, np.prod(get_shape(value), dtype=int))
+        chunk = max(1, evaluator.builtins.functions.SERIES_CHUNK // size)
+
+        result = float(ufunc.identity)
+        for start in range(low, high + 1, chunk):
+            terms = np.arange(start, min(start + chunk, high + 1), dtype=float)
+            value = self.__evaluate_node(body, {**grid, parameter: terms},
+                                         Evaluation(evaluation))
+            if isinstance(value, evaluator.dual.Dual):
+                if ufunc is not np.add:
+                    raise NotVectorisable('Only sums of dual numbers are '
+                                          'vectorised')
+                value = evaluator.dual.Dual(
+                    *(np.sum(np.broadcast_to(
+                        part, np.broadcast_shapes(np.shape(part),
+                                                  terms.shape)), axis=-1)
+                      for part in (value.value, value.derivative)))
+            elif is_numeric(value):
+                value = ufunc.reduce(np.broadcast_to(
+                    value, np.broadcast_shapes(np.shape(value), terms.shape)),
+                    axis=-1)
+            else:
+                raise NotVectorisable('The summand is not a number')
+            result = ufunc(result, value)
+        return result
+
+    def __get_items(self, node, environment):
+        """Gets the items of a chain of the , operator
+
+        Arguments:
+            node: evaluator.execution_tree.ExecutionTree.__Node
+                -- The chain
+            environment: dict[str, Any]
+                -- The variables bound by enclosing functions
+
+        Returns:
+            items: list[evaluator.execution_tree.ExecutionTree.__Node]
+                -- The items, in order
+        """
+        items = []
+        while (node.is_function_call() and node.function.is_function_call()
+               and node.function.function.is_identifier()
+               and node.function.function.name.item not in environment
+               and self.executor.globals.get_var(
+                   node.function.function.name.item)
+               is evaluator.builtins.functions.tuple_):
+            items.append(node.parameter)
+            node = node.function.parameter
+        items.append(node)
+        return items[::-1]
+
+    @staticmethod
+    def __add_axis(value):
+        """Gives a value an extra last axis, to broadcast with the terms of a
+        series
+
+        Arguments:
+            value: Any
+                -- The value of a variable
+
+        Returns:
+            value: np.ndarray | complex | evaluator.dual.Dual
+                -- The value with the extra axis
+
+        Raises:
+            NotVectorisable
+                -- If the value is not numeric
+        """
+        if isinstance(value, evaluator.dual.Dual):
+            return evaluator.dual.Dual(
+                np.expand_dims(value.value, -1),
+                np.expand_dims(value.derivative, -1))
+        if not is_numeric(value):
+            raise NotVectorisable('A series can only capture numbers')
+        return np.expand_dims(value, -1)
+
+    @staticmethod
+    def __apply(function, parameter):
+        """Applies a builtin or number to a parameter
+
+        Arguments:
+            function: Any
+                -- The builtin, or a number to multiply by
+            parameter: Any
+                -- The parameter
+
+        Returns:
+            result: Any
+                -- The result of the application
+        """
+        if isinstance(function, VectorFunction):
+            return function.apply(parameter)
+
+        elif is_numeric(function) and is_numeric(parameter):
+            # Juxtaposed numbers are multiplied, as in the scalar engine
+            return function * parameter
+
+        raise NotVectorisable('Only functions and numbers can be applied')
+
+
+def get_arity(function):
+    """Gets the number of arguments a NumPy function takes
+
+    Arguments:
+        function: Callable
+            -- A NumPy ufunc or any other function
+
+    Returns:
+        arity: int
+            -- The number of arguments it takes
+    """
+    if isinstance(function, np.ufunc):
+        return function.nin
+    return len(inspect.signature(function).parameters)
+
+
+def get_shape(values):
+    """Gets the shape of an array of values, which may be dual numbers
+
+    Arguments:
+        values: np.ndarray | evaluator.dual.Dual
+            -- The values
+
+    Returns:
+        shape: tuple[int, ...]
+            -- The shape of the values
+    """
+    if isinstance(values, evaluator.dual.Dual):
+        return np.shape(values.value)
+    return np.shape(values)
+
+
+def is_numeric(value):
+    """Checks if a value is a number or an array of numbers
+
+    Arguments:
+        value: Any
+            -- The value to check
+
+    Returns:
+        is_numeric: bool
+            -- Whether the value is numeric
+    """
+    if isinstance(value, evaluator.dual.Dual):
+        return is_numeric(value.value)
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in 'biufc'
+    return isinstance(value, (int, float, complex, np.number))
+
+
+def is_vector(value):
+    """Checks if a value is a tuple of numbers or arrays of numbers
+
+    Arguments:
+        value: Any
+            -- The value to check
+
+    Returns:
+        is_vector: bool
+            -- Whether the value is a tuple of numeric values
+    """
+    return (isinstance(value, evaluator.builtins.types.Tuple)
+            and all(is_numeric(item) for item in value.items))
@@ -1,7 +1,6 @@
 /* This is the file that runs Electron to create a window.
 
-It works by first, deleting all files in the /static/images folder.
-Then it spawns a flask server.
+It works by first, spawning a flask server.
 Then it creates a browser window
 Finally, it tells that browser window to look at the flask server.
  */
@@ -12,22 +11,8 @@ const { app, BrowserWindow } = require('electron')
 // Required to spawn the flask server
 const { spawn } = require('node:child_process');
 
-// Required for clearing all the files in /static/images
-const fs = require("fs");
-const path = require("path");
-
-// Get all the files in ./static/images
-fs.readdir('./static/images', (err, files) => {
-    // Make sure to throw error if received for easier debugging
-    if (err) throw err;
-    // For each of the files in the directory
-    for (const file of files) {
-        // Delete that file. If an error is encountered, throw it for easier
-        // debugging
-        fs.unlink(path.join('./static/images', file), (err) =>
-            {if (err) throw err} );
-    }
-})
+// The files in /static/images are kept between runs. The flask server's
+// render cache keeps them within a size limit and removes any it does not know.
 
 // Spawn the flask server using the local interpreter
 const flaskServer = spawn("./interpreters/Python-3.11.1/python", ["app.py"])